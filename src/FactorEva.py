@@ -1,4 +1,4 @@
-import os, sys, json, json5, tqdm
+import os, sys, json5, tqdm
 import pandas as pd
 import dolphindb as ddb
 from typing import List, Dict
@@ -6,9 +6,11 @@ from typing import List, Dict
 project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 if project_root not in sys.path:
     sys.path.insert(0, project_root)
-from src.entity.Source import Source
-from src.entity.Result import Result, Stats
+from src.entity.Result import Stats
 from src.entity.Eva import Eva
+from src.entity.Runner import BatchRunner
+from src.entity.Planner import BatchPlanner
+from src.entity.Catalog import FactorCatalog
 from src.utils.utils import split_list
 
 class FactorEva(Eva, Stats):
@@ -16,25 +18,42 @@ class FactorEva(Eva, Stats):
         super().__init__(session)
 
     @staticmethod
-    def run(cfg: Dict[str, str], factorList: List[str], dropDB: bool = False):
+    def run(cfg: Dict[str, str], factorList: List[str], dropDB: bool = False, incremental: bool = False,
+            resume: bool = False):
         """
         运行评价函数
+        incremental: 增量评价, 按各因子已评价的水位线只计算并插入新的period
+        resume: 按运行清单(manifestPath)续跑中断的评价, 跳过相同配置下已写库的批次(块)
         """
+        if resume and dropDB:
+            raise ValueError("resume cannot be combined with dropDB")
         EvaObj = FactorEva(session)
         EvaObj.init(factorDict=cfg["factor"],
                     labelDict=cfg["label"],
                     resultDict=cfg["result"])
         EvaObj.initDef()
-        if not factorList:
-            factorList = EvaObj.getFactorList()
-        factorList_nested = split_list(l=factorList, k=10)
         EvaObj.setConfig(config=cfg["config"])
+        EvaObj.initTransfer(cfg.get("session"))
+        if resume and not EvaObj.manifestPath:
+            raise ValueError("resume requires manifestPath in config")
         EvaObj.initResDB(dropDB=dropDB)
-        for factorList in tqdm.tqdm(factorList_nested, desc="Evaluating..."):
-            EvaObj.getData(startDate=EvaObj.startDate, endDate=EvaObj.endDate,
-                           factorList=factorList, symbolList=None,
-                           labelList=[EvaObj.barRetLabelName]+[EvaObj.futRetLabelNames])
-            EvaObj.eva(factorList=factorList)
+        EvaObj.catalog = FactorCatalog(EvaObj)
+        EvaObj.catalog.refresh()
+        if not factorList:
+            factorList = EvaObj.getFactorList()
+        else:
+            factorList = EvaObj.checkFactorList(factorList)
+        if incremental:     # 跳过没有新数据的因子
+            factorList = EvaObj.catalog.pending(factorList)
+        planner = BatchPlanner(memoryBudget=EvaObj.memoryBudget, memoryCopies=EvaObj.memoryCopies,
+                               maxBatchSize=EvaObj.maxBatchSize)
+        factorList_nested = planner.plan(evaObj=EvaObj, factorList=factorList)
+        sessionFactory = None
+        if cfg.get("session"):  # 多session并行需要能够新建session
+            sessionFactory = lambda: ddb.session(**cfg["session"])
+        BatchRunner(evaObj=EvaObj, sessionFactory=sessionFactory, concurrency=EvaObj.concurrency,
+                    planner=planner, manifest=EvaObj.runManifest(resume=resume, incremental=incremental)).run(factorBatches=factorList_nested, incremental=incremental)
+        EvaObj.catalog.refresh()    # 更新评价水位线
 
     @staticmethod
     def summaryPlot(cfg: Dict[str, str]):
@@ -43,6 +62,7 @@ class FactorEva(Eva, Stats):
                     labelDict=cfg["label"],
                     resultDict=cfg["result"])
         EvaObj.setConfig(config=cfg["config"])
+        EvaObj.initTransfer(cfg.get("session"))
         EvaObj.summaryPlot_()
 
     @staticmethod
@@ -52,10 +72,76 @@ class FactorEva(Eva, Stats):
                     labelDict=cfg["label"],
                     resultDict=cfg["result"])
         EvaObj.setConfig(config=cfg["config"])
+        EvaObj.initTransfer(cfg.get("session"))
         if not factorList:
             factorList = EvaObj.getFactorList()
         EvaObj.factorPlot_(factorList=factorList)
 
+    @staticmethod
+    def correlation(cfg: Dict[str, str], factorList: List[str] = None) -> pd.DataFrame:
+        """增量更新因子相关性矩阵(缓存于corrCacheDir), 返回平均相关系数矩阵"""
+        EvaObj = FactorEva(session)
+        EvaObj.init(factorDict=cfg["factor"],
+                    labelDict=cfg["label"],
+                    resultDict=cfg["result"])
+        EvaObj.setConfig(config=cfg["config"])
+        EvaObj.initTransfer(cfg.get("session"))
+        if not factorList:
+            factorList = EvaObj.getFactorList()
+        else:
+            factorList = EvaObj.checkFactorList(factorList)
+        return EvaObj.factorCorrelation().update(factorList=factorList)
+
+    @staticmethod
+    def decay(cfg: Dict[str, str], factorList: List[str] = None, horizons: List[int] = None):
+        """IC衰减分析(持有期默认为decayHorizons), 按maxBatchSize个因子一批读取数据并写入IC衰减汇总表"""
+        EvaObj = FactorEva(session)
+        EvaObj.init(factorDict=cfg["factor"],
+                    labelDict=cfg["label"],
+                    resultDict=cfg["result"])
+        EvaObj.initDef()
+        EvaObj.setConfig(config=cfg["config"])
+        EvaObj.initTransfer(cfg.get("session"))
+        EvaObj.initResDB(dropDB=False)
+        if not factorList:
+            factorList = EvaObj.getFactorList()
+        else:
+            factorList = EvaObj.checkFactorList(factorList)
+        for subList in tqdm.tqdm(split_list(l=factorList, k=EvaObj.maxBatchSize or 10), desc="IC Decay..."):
+            EvaObj.evaDecay(factorList=subList, horizons=horizons)
+
+    @staticmethod
+    def sweep(cfg: Dict[str, str], grid: List[Dict], factorList: List[str] = None) -> pd.DataFrame:
+        """
+        参数扫描: grid为评价参数(callBackPeriod/quantile/dailyPnlLimit)的列表, 可由FactorEva.sweepGrid生成
+        每批因子(maxBatchSize个)只取数一次, 结果按configId写入参数扫描结果表, 通过sweepSummary比较
+        """
+        EvaObj = FactorEva(session)
+        EvaObj.init(factorDict=cfg["factor"],
+                    labelDict=cfg["label"],
+                    resultDict=cfg["result"])
+        EvaObj.initDef()
+        EvaObj.setConfig(config=cfg["config"])
+        EvaObj.initTransfer(cfg.get("session"))
+        EvaObj.initResDB(dropDB=False)
+        if not factorList:
+            factorList = EvaObj.getFactorList()
+        else:
+            factorList = EvaObj.checkFactorList(factorList)
+        configs = None
+        for subList in tqdm.tqdm(split_list(l=factorList, k=EvaObj.maxBatchSize or 10), desc="Sweeping..."):
+            configs = EvaObj.sweep(factorList=subList, grid=grid)
+        return configs
+
+    @staticmethod
+    def correlationPlot(cfg: Dict[str, str]):
+        EvaObj = FactorEva(session)
+        EvaObj.init(factorDict=cfg["factor"],
+                    labelDict=cfg["label"],
+                    resultDict=cfg["result"])
+        EvaObj.setConfig(config=cfg["config"])
+        EvaObj.correlationPlot_()
+
 if __name__ == "__main__":
     session = ddb.session("localhost", 8848, "admin", "123456")
     with open(r"E:\Quant\FactorEva\src\cons\eva.json5", "r", encoding="utf-8") as f:
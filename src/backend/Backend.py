@@ -0,0 +1,83 @@
+import pandas as pd
+import dolphindb as ddb
+from typing import Callable, Dict, List, Tuple
+
+class Backend:
+    """
+    评价后端接口
+    输入: 透视后的面板数据(symbol, tradeDate, labels, factors)
+    输出: summary_res(IC法&回归法长表), quantile_res(分层回测结果表)
+    """
+    name: str = ""
+
+    def singleFactorAnalysis(self, df: pd.DataFrame, factorList: List[str], idCol: str, timeCol: str,
+                             barReturnCol: str, futureReturnCols: List[str], returnIntervals: List[int],
+                             dailyFreq: bool, callBackPeriod: int = 1, quantiles: int = 5,
+                             dailyPnlLimit: float = None, useMinFreqPeriod: bool = True,
+                             periodOffset: int = 0, quantilePeriodOffset: int = None,
+                             sink: Callable[[pd.DataFrame, pd.DataFrame], None] = None) -> Tuple[pd.DataFrame, pd.DataFrame]:
+        """
+        单因子测试(参数含义同DolphinDB端SingleFactorAnalysis)
+        periodOffset: 面板首日之前的period数, 增量评价时使period编号与调仓时刻与全量评价一致
+        quantilePeriodOffset: 面板首个时刻之前的quantilePeriod数(分钟频->日频时与periodOffset不同), 为空时同periodOffset
+        sink: 流式输出, 不为空时每产生一段结果就调用sink(summary_res, quantile_res), 返回空表
+        """
+        raise NotImplementedError
+
+    def singleFactorSweep(self, df: pd.DataFrame, factorList: List[str], idCol: str, timeCol: str,
+                          barReturnCol: str, futureReturnCols: List[str], returnIntervals: List[int],
+                          dailyFreq: bool, grid: Dict[str, Dict], useMinFreqPeriod: bool = True,
+                          periodOffset: int = 0, quantilePeriodOffset: int = None) -> Dict[str, Tuple[pd.DataFrame, pd.DataFrame]]:
+        """
+        参数扫描: grid为configId -> 评价参数(callBackPeriod, quantiles, dailyPnlLimit), 返回configId -> (summary_res, quantile_res)
+        默认逐个配置调用singleFactorAnalysis(共用同一份面板数据), 后端可重写以共用预处理
+        """
+        return {configId: self.singleFactorAnalysis(df, factorList, idCol, timeCol, barReturnCol, futureReturnCols,
+                                                    returnIntervals, dailyFreq, callBackPeriod=int(params.get("callBackPeriod", 1)),
+                                                    quantiles=int(params.get("quantiles", 5)), dailyPnlLimit=params.get("dailyPnlLimit"),
+                                                    useMinFreqPeriod=useMinFreqPeriod, periodOffset=periodOffset,
+                                                    quantilePeriodOffset=quantilePeriodOffset)
+                for configId, params in grid.items()}
+
+
+class DolphinDBBackend(Backend):
+    """
+    DolphinDB服务端后端: 上传面板数据后调用Eva.initDef注册的SingleFactorAnalysis
+    (Eva.eva在该后端下直接使用服务端内存中的dataObj_, 不经过本类)
+    """
+    name: str = "dolphindb"
+
+    def __init__(self, session: ddb.session):
+        self.session: ddb.session = session
+
+    def singleFactorAnalysis(self, df: pd.DataFrame, factorList: List[str], idCol: str, timeCol: str,
+                             barReturnCol: str, futureReturnCols: List[str], returnIntervals: List[int],
+                             dailyFreq: bool, callBackPeriod: int = 1, quantiles: int = 5,
+                             dailyPnlLimit: float = None, useMinFreqPeriod: bool = True,
+                             periodOffset: int = 0, quantilePeriodOffset: int = None,
+                             sink: Callable[[pd.DataFrame, pd.DataFrame], None] = None) -> Tuple[pd.DataFrame, pd.DataFrame]:
+        self.session.upload({"panel_": df, "factorList": factorList,
+                             "futureReturnCols": futureReturnCols, "returnIntervals": returnIntervals})
+        summary_res, quantile_res = self.session.run(f"""
+        pt = select * from panel_ order by {idCol},{timeCol};
+        res = SingleFactorAnalysis(pt, factorList, "{idCol}", "{timeCol}", "{barReturnCol}", futureReturnCols,
+            returnIntervals, {str(bool(dailyFreq)).lower()}, callBackPeriod={int(callBackPeriod)}, quantiles={int(quantiles)},
+            dailyPnlLimit={dailyPnlLimit if dailyPnlLimit is not None else "NULL"}, useMinFreqPeriod={str(bool(useMinFreqPeriod)).lower()},
+            periodOffset={int(periodOffset)}, quantilePeriodOffset={int(quantilePeriodOffset) if quantilePeriodOffset is not None else "NULL"})
+        undef(`panel_`pt);
+        res
+        """)
+        if sink is not None:    # 服务端一次性返回全部结果
+            sink(summary_res, quantile_res)
+            return summary_res.iloc[0:0], quantile_res.iloc[0:0]
+        return summary_res, quantile_res
+
+
+def getBackend(name: str, session: ddb.session = None, nJobs: int = 1) -> Backend:
+    """根据配置项backend获取评价后端"""
+    if name == "dolphindb":
+        return DolphinDBBackend(session)
+    if name == "numpy":
+        from src.backend.NumpyBackend import NumpyBackend
+        return NumpyBackend(nJobs=nJobs)
+    raise ValueError(f"Unknown backend: {name}")
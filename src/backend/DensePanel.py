@@ -0,0 +1,135 @@
+import os, re, json, shutil
+import numpy as np
+import pandas as pd
+from typing import Dict, List
+
+class DensePanel:
+    """
+    稠密面板: 每个因子/标签存为一个(时间 × 标的)的连续矩阵, 可落盘为内存映射文件
+    目录结构: path/meta.json, path/times.npy, path/symbols.npy, path/rowMask.npy, path/<列名>.bin
+    落盘后按列惰性映射, 评价时按因子切片读取(不复制整张面板); 可选float32存储以减半磁盘与内存占用
+    """
+    def __init__(self, times: np.ndarray, symbols: np.ndarray, rowMask: np.ndarray,
+                 cols: Dict[str, np.ndarray] = None, path: str = None, dtype: str = "float64",
+                 files: Dict[str, str] = None):
+        self.times: np.ndarray = times
+        self.symbols: np.ndarray = symbols
+        self.rowMask: np.ndarray = rowMask     # (时间, 标的) 原始面板中是否存在该行
+        self.cols: Dict[str, np.ndarray] = cols if cols is not None else {}
+        self.path: str = path
+        self.dtype: str = dtype
+        self.files: Dict[str, str] = files if files is not None else {}    # 列名 -> 文件名(落盘时)
+        self.owned: bool = False    # path为面板自有的临时目录时, release时删除
+
+    @property
+    def shape(self):
+        return self.rowMask.shape
+
+    @property
+    def columns(self) -> List[str]:
+        return list(dict.fromkeys(list(self.files.keys()) + list(self.cols.keys())))
+
+    def __contains__(self, col: str) -> bool:
+        return col in self.cols or col in self.files
+
+    def __getitem__(self, col: str) -> np.ndarray:
+        if col not in self.cols:
+            if col not in self.files:
+                raise KeyError(col)
+            self.cols[col] = np.memmap(os.path.join(self.path, self.files[col]), dtype=self.dtype,
+                                       mode="r", shape=self.shape)
+        return self.cols[col]
+
+    @classmethod
+    def fromFrame(cls, df: pd.DataFrame, idCol: str, timeCol: str, cols: List[str],
+                  dtype: str = "float64", path: str = None) -> "DensePanel":
+        """
+        将长面板(每行一个symbol×time)展开为稠密矩阵
+        path不为空时逐列直接写入内存映射文件, 峰值内存只多出一列
+        """
+        times, tIdx = np.unique(df[timeCol].values, return_inverse=True)
+        symbols, sIdx = np.unique(df[idCol].to_numpy(dtype=str), return_inverse=True)
+        rowMask = np.zeros((len(times), len(symbols)), dtype=bool)
+        rowMask[tIdx, sIdx] = True
+        panel = cls(times=times, symbols=symbols, rowMask=rowMask, dtype=dtype)
+        if path is not None:
+            panel._saveMeta(path, files={})
+        for col in dict.fromkeys(cols):
+            arr = np.full((len(times), len(symbols)), np.nan, dtype=dtype)
+            arr[tIdx, sIdx] = pd.to_numeric(df[col], errors="coerce").values
+            if path is None:
+                panel.cols[col] = arr
+            else:
+                panel._writeColumn(path, col, arr)
+        if path is not None:
+            panel._saveMeta(path, files=panel.files)
+            return DensePanel.open(path)
+        return panel
+
+    def select(self, cols: List[str]) -> "DensePanel":
+        """只包含部分列的视图(共享底层数组/文件)"""
+        return DensePanel(times=self.times, symbols=self.symbols, rowMask=self.rowMask,
+                          cols={c: self.cols[c] for c in cols if c in self.cols}, path=self.path, dtype=self.dtype,
+                          files={c: self.files[c] for c in cols if c in self.files})
+
+    def release(self) -> None:
+        """解除内存映射并删除面板自有的临时目录(非自有目录/内存面板不做处理)"""
+        if not self.owned or self.path is None:
+            return
+        self.cols, self.files = {}, {}
+        self.rowMask = np.asarray(self.rowMask).copy()
+        shutil.rmtree(self.path, ignore_errors=True)
+        self.path, self.owned = None, False
+
+    def save(self, path: str) -> "DensePanel":
+        """落盘并返回以内存映射方式打开的面板"""
+        target = DensePanel(times=self.times, symbols=self.symbols, rowMask=self.rowMask, dtype=self.dtype)
+        target._saveMeta(path, files={})
+        for col in self.columns:
+            target._writeColumn(path, col, self[col])
+        target._saveMeta(path, files=target.files)
+        return DensePanel.open(path)
+
+    def _saveMeta(self, path: str, files: Dict[str, str]) -> None:
+        os.makedirs(path, exist_ok=True)
+        np.save(os.path.join(path, "times.npy"), self.times)
+        np.save(os.path.join(path, "symbols.npy"), np.asarray(self.symbols, dtype=str))
+        np.save(os.path.join(path, "rowMask.npy"), np.asarray(self.rowMask))
+        with open(os.path.join(path, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump({"dtype": self.dtype, "shape": list(self.shape), "files": files}, f)
+
+    def _writeColumn(self, path: str, col: str, values: np.ndarray) -> str:
+        """单列写入path/<列名>.bin, 返回文件名"""
+        fileName = re.sub(r"[\\/:*?\"<>|]", "_", col) + ".bin"
+        arr = np.memmap(os.path.join(path, fileName), dtype=self.dtype, mode="w+", shape=self.shape)
+        arr[:] = values
+        arr.flush()
+        del arr
+        self.files[col] = fileName
+        return fileName
+
+    @classmethod
+    def open(cls, path: str) -> "DensePanel":
+        """以内存映射方式打开已落盘的面板"""
+        with open(os.path.join(path, "meta.json"), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        return cls(times=np.load(os.path.join(path, "times.npy")),
+                   symbols=np.load(os.path.join(path, "symbols.npy")),
+                   rowMask=np.load(os.path.join(path, "rowMask.npy"), mmap_mode="r"),
+                   path=path, dtype=meta["dtype"], files=meta["files"])
+
+    def __getstate__(self):
+        # 已落盘的面板只传递路径, 子进程重新映射(避免序列化整张面板)
+        if self.path is not None:
+            return {"path": self.path, "files": self.files,
+                    "cols": {c: v for c, v in self.cols.items() if c not in self.files}}
+        return self.__dict__
+
+    def __setstate__(self, state):
+        if "times" in state:
+            self.__dict__.update(state)
+            return
+        panel = DensePanel.open(state["path"])
+        panel.files = state["files"]
+        panel.cols.update(state["cols"])
+        self.__dict__.update(panel.__dict__)
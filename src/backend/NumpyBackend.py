@@ -0,0 +1,258 @@
+import numpy as np
+import pandas as pd
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Callable, Dict, List, Tuple, Union
+from src.backend.Backend import Backend
+from src.backend.DensePanel import DensePanel
+from src.backend.kernel import REG_INDICATORS, QUANTILE_METRICS, regStatsMulti, rollingRegStatsMulti, quantileBuckets, \
+    quantileReturnBatch, quantileTurnover, rankAutoCorr
+from src.utils.utils import split_list
+
+
+class NumpyBackend(Backend):
+    """
+    纯NumPy/pandas评价后端, 与DolphinDB端SingleFactorAnalysis输出相同的长表
+    面板数据以DensePanel(时间 × 标的)的稠密矩阵参与计算, 因子按nJobs切分后多进程并行,
+    每个进程内再按chunkSize个因子一组读取, 内存占用与因子总数无关
+    """
+    name: str = "numpy"
+
+    def __init__(self, nJobs: int = 1, chunkSize: int = 32):
+        self.nJobs: int = max(int(nJobs or 1), 1)
+        self.chunkSize: int = max(int(chunkSize or 1), 1)
+
+    def singleFactorAnalysis(self, df: Union[pd.DataFrame, DensePanel], factorList: List[str], idCol: str, timeCol: str,
+                             barReturnCol: str, futureReturnCols: List[str], returnIntervals: List[int],
+                             dailyFreq: bool, callBackPeriod: int = 1, quantiles: int = 5,
+                             dailyPnlLimit: float = None, useMinFreqPeriod: bool = True,
+                             periodOffset: int = 0, quantilePeriodOffset: int = None,
+                             sink: Callable[[pd.DataFrame, pd.DataFrame], None] = None) -> Tuple[pd.DataFrame, pd.DataFrame]:
+        """
+        单因子测试(参数含义同DolphinDB端SingleFactorAnalysis, df可以是长面板或DensePanel)
+        sink不为空时按(chunkSize个因子, returnInterval)流式输出(多进程时按进程的因子分组输出)
+        """
+        panel, common, finish = self._setup(df, factorList, idCol, timeCol, barReturnCol, futureReturnCols,
+                                            returnIntervals, dailyFreq, useMinFreqPeriod, periodOffset, quantilePeriodOffset)
+        if dailyPnlLimit is not None and dailyFreq:
+            common["periodReturn"] = np.clip(common["periodReturn"], -dailyPnlLimit, dailyPnlLimit)
+        common.update({"callBackPeriod": int(callBackPeriod), "quantiles": int(quantiles)})
+        finish = partial(finish, quantiles=int(quantiles))
+
+        emit = (lambda summaryPart, quantilePart: sink(*finish([summaryPart], [quantilePart]))) if sink is not None else None
+        chunks = split_list(l=list(factorList), k=-(-len(factorList) // self.nJobs)) if factorList else []
+        if self.nJobs == 1 or len(chunks) <= 1:
+            parts = [_evaluate(common, panel.select(chunk), chunk, emit) for chunk in chunks]
+        else:   # 已落盘的DensePanel只向子进程传递路径
+            with ProcessPoolExecutor(max_workers=self.nJobs) as pool:
+                futures = [pool.submit(_evaluate, common, panel.select(chunk), chunk) for chunk in chunks]
+                parts = []
+                for future in as_completed(futures):
+                    if emit is not None:
+                        emit(*future.result())
+                    else:
+                        parts.append(future.result())
+        return finish([p[0] for p in parts], [p[1] for p in parts])
+
+    def _setup(self, df: Union[pd.DataFrame, DensePanel], factorList: List[str], idCol: str, timeCol: str,
+               barReturnCol: str, futureReturnCols: List[str], returnIntervals: List[int], dailyFreq: bool,
+               useMinFreqPeriod: bool, periodOffset: int, quantilePeriodOffset: int) -> Tuple[DensePanel, Dict, Callable]:
+        """构建面板与period划分(与评价参数callBackPeriod/quantiles/dailyPnlLimit无关的部分), 返回(面板, common, finish)"""
+        if isinstance(df, DensePanel):
+            panel = df
+        else:
+            panel = DensePanel.fromFrame(df, idCol=idCol, timeCol=timeCol,
+                                         cols=[barReturnCol] + list(futureReturnCols) + list(factorList))
+        times = panel.times
+        quantilePeriodOffset = int(periodOffset if quantilePeriodOffset is None else quantilePeriodOffset)
+
+        # period: ICIR & 回归法; quantilePeriod: 分层回测法(均从1开始编号)
+        if dailyFreq or useMinFreqPeriod:
+            periodTimes = times
+            periodBounds = np.arange(len(times) + 1)
+        else:   # 分钟频->日频
+            dates = pd.DatetimeIndex(times).normalize().values
+            periodTimes = np.unique(dates)
+            periodBounds = np.searchsorted(dates, periodTimes, side="left")
+            periodBounds = np.append(periodBounds, len(dates))
+
+        returnDict = {int(interval): np.asarray(panel[col], dtype=float)
+                      for interval, col in zip(returnIntervals, futureReturnCols)}
+        common = {"rowMask": np.asarray(panel.rowMask), "periodBounds": periodBounds,
+                  "periodReturn": np.asarray(panel[barReturnCol], dtype=float), "dailyFreq": bool(dailyFreq),
+                  "returnDict": returnDict, "returnIntervals": [int(i) for i in returnIntervals],
+                  "periodOffset": quantilePeriodOffset, "chunkSize": self.chunkSize}
+
+        def finish(summaryParts: List[pd.DataFrame], quantileParts: List[pd.DataFrame],
+                   quantiles: int) -> Tuple[pd.DataFrame, pd.DataFrame]:
+            """添加TradeTime, period加上periodOffset(分层回测结果为quantilePeriodOffset)并排序, 分层回测结果的列顺序同结果表"""
+            quantile_cols = ["QuantileReturn" + str(i) for i in range(1, int(quantiles) + 1)]
+            summary_res = _concat(summaryParts, ["factor", "returnInterval", "period", "indicator", "value"])
+            quantile_res = _concat(quantileParts, ["factor", "returnInterval", "period"] + quantile_cols + QUANTILE_METRICS)
+            summary_res["TradeTime"] = periodTimes[summary_res["period"].values - 1] if len(summary_res) else pd.Series(dtype="datetime64[ns]")
+            quantile_res["TradeTime"] = times[quantile_res["period"].values - 1] if len(quantile_res) else pd.Series(dtype="datetime64[ns]")
+            summary_res["period"] += int(periodOffset)
+            quantile_res["period"] += quantilePeriodOffset
+            quantile_res = quantile_res[["factor", "returnInterval", "period"] + quantile_cols + ["TradeTime"] + QUANTILE_METRICS]
+            summary_res = summary_res.sort_values(["TradeTime", "factor", "period"], kind="stable").reset_index(drop=True)
+            quantile_res = quantile_res.sort_values(["TradeTime", "factor", "period"], kind="stable").reset_index(drop=True)
+            return summary_res, quantile_res
+
+        return panel, common, finish
+
+    def singleFactorSweep(self, df: Union[pd.DataFrame, DensePanel], factorList: List[str], idCol: str, timeCol: str,
+                          barReturnCol: str, futureReturnCols: List[str], returnIntervals: List[int],
+                          dailyFreq: bool, grid: Dict[str, Dict], useMinFreqPeriod: bool = True,
+                          periodOffset: int = 0, quantilePeriodOffset: int = None) -> Dict[str, Tuple[pd.DataFrame, pd.DataFrame]]:
+        """
+        参数扫描: 面板只构建一次, 每组因子的截面数据只读取一次;
+        回归法&IC法结果按callBackPeriod、调仓分组按quantiles、截断后的period_return按dailyPnlLimit在各配置间共用
+        """
+        panel, common, finish = self._setup(df, factorList, idCol, timeCol, barReturnCol, futureReturnCols,
+                                            returnIntervals, dailyFreq, useMinFreqPeriod, periodOffset, quantilePeriodOffset)
+        grid = {configId: _sweepParams(params) for configId, params in grid.items()}
+        chunks = split_list(l=list(factorList), k=-(-len(factorList) // self.nJobs)) if factorList else []
+        if self.nJobs == 1 or len(chunks) <= 1:
+            parts = [_evaluateSweep(common, panel.select(chunk), chunk, grid) for chunk in chunks]
+        else:
+            with ProcessPoolExecutor(max_workers=self.nJobs) as pool:
+                parts = list(pool.map(_evaluateSweep, [common] * len(chunks), [panel.select(c) for c in chunks],
+                                      chunks, [grid] * len(chunks)))
+        return {configId: finish([p[configId][0] for p in parts], [p[configId][1] for p in parts],
+                                 quantiles=params["quantiles"])
+                for configId, params in grid.items()}
+
+
+def _concat(frames: List[pd.DataFrame], columns: List[str]) -> pd.DataFrame:
+    frames = [f for f in frames if len(f)]
+    if not frames:
+        return pd.DataFrame(columns=columns)
+    return pd.concat(frames, ignore_index=True)[columns]
+
+
+def _evaluate(common: Dict, panel: DensePanel, factorNames: List[str],
+              emit: Callable[[pd.DataFrame, pd.DataFrame], None] = None) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    对一组因子执行全部returnIntervals的分层回测 & ICIR法/回归法(每次读取chunkSize个因子)
+    因子端预处理(截面切片/有效性判断/秩/调仓分组)每个period只做一次, 所有returnInterval共用
+    emit不为空时每个(因子组, returnInterval)的结果产生后立即输出, 不在内存中累积
+    """
+    summaryParts, quantileParts = [], []
+    intervals = common["returnIntervals"]
+    for chunk in split_list(l=factorNames, k=common["chunkSize"]):
+        XA = np.stack([np.asarray(panel[f], dtype=float) for f in chunk], axis=-1)    # (时间, 标的, 因子)
+        regParts = _regStats(XA, [common["returnDict"][i] for i in intervals], common["rowMask"],
+                             common["periodBounds"], common["callBackPeriod"], chunk, intervals)
+        bucketCache = {}    # 调仓时刻 -> 分组
+        for interval, summaryPart in zip(intervals, regParts):
+            quantilePart = _quantileStats(XA, common["periodReturn"], common["rowMask"],
+                                          interval, common["quantiles"], chunk, common["periodOffset"], bucketCache)
+            if emit is not None:
+                emit(summaryPart, quantilePart)
+            else:
+                summaryParts.append(summaryPart)
+                quantileParts.append(quantilePart)
+    if not summaryParts:
+        return pd.DataFrame(), pd.DataFrame()
+    return pd.concat(summaryParts, ignore_index=True), pd.concat(quantileParts, ignore_index=True)
+
+
+def _sweepParams(params: Dict) -> Dict:
+    """扫描配置的评价参数(callBackPeriod, quantiles, dailyPnlLimit)"""
+    limit = params.get("dailyPnlLimit")
+    return {"callBackPeriod": int(params.get("callBackPeriod", 1)), "quantiles": int(params.get("quantiles", 5)),
+            "dailyPnlLimit": float(limit) if limit is not None else None}
+
+
+def _evaluateSweep(common: Dict, panel: DensePanel, factorNames: List[str],
+                   grid: Dict[str, Dict]) -> Dict[str, Tuple[pd.DataFrame, pd.DataFrame]]:
+    """
+    对一组因子执行所有扫描配置: 每chunkSize个因子只读取一次,
+    回归法结果按callBackPeriod缓存, 调仓分组按quantiles缓存, period_return按dailyPnlLimit缓存, 秩自相关按returnInterval缓存
+    """
+    parts = {configId: ([], []) for configId in grid}
+    intervals = common["returnIntervals"]
+    for chunk in split_list(l=factorNames, k=common["chunkSize"]):
+        XA = np.stack([np.asarray(panel[f], dtype=float) for f in chunk], axis=-1)    # (时间, 标的, 因子)
+        regCache, bucketCache, returnCache, autoCorrCache = {}, {}, {}, {}
+        for configId, params in grid.items():
+            callBackPeriod, quantiles, limit = params["callBackPeriod"], params["quantiles"], params["dailyPnlLimit"]
+            if callBackPeriod not in regCache:
+                regCache[callBackPeriod] = _regStats(XA, [common["returnDict"][i] for i in intervals], common["rowMask"],
+                                                     common["periodBounds"], callBackPeriod, chunk, intervals)
+            if limit not in returnCache:
+                returnCache[limit] = common["periodReturn"]
+                if limit is not None and common["dailyFreq"]:
+                    returnCache[limit] = np.clip(common["periodReturn"], -limit, limit)
+            for interval, summaryPart in zip(intervals, regCache[callBackPeriod]):
+                quantilePart = _quantileStats(XA, returnCache[limit], common["rowMask"], interval, quantiles, chunk,
+                                              common["periodOffset"], bucketCache.setdefault(quantiles, {}), autoCorrCache)
+                parts[configId][0].append(summaryPart)
+                parts[configId][1].append(quantilePart)
+    return {configId: (pd.concat(s, ignore_index=True) if s else pd.DataFrame(),
+                       pd.concat(q, ignore_index=True) if q else pd.DataFrame()) for configId, (s, q) in parts.items()}
+
+
+def _regStats(XA: np.ndarray, Ys: List[np.ndarray], rowMask: np.ndarray, periodBounds: np.ndarray,
+              callBackPeriod: int, factorNames: List[str], intervals: List[int]) -> List[pd.DataFrame]:
+    """ICIR & 回归法统计(对应RegStats): 每个period截面一次性计算所有因子 × 所有returnInterval, 按interval返回"""
+    if callBackPeriod > 1:  # 滚动窗口: 增量维护充分统计量
+        stats, valid = rollingRegStatsMulti(XA, Ys, rowMask, periodBounds, callBackPeriod)
+        parts = []
+        for k, interval in enumerate(intervals):
+            periodIdx, factorIdx = np.nonzero(valid[k])
+            parts.append(_longTable(periodIdx + 1, factorIdx, stats[k][:, periodIdx, factorIdx], factorNames, interval))
+        return parts
+    periods, factorIdx, values = [[] for _ in intervals], [[] for _ in intervals], [[] for _ in intervals]
+    for period in range(1, len(periodBounds)):
+        start = periodBounds[max(period - callBackPeriod, 0)]
+        end = periodBounds[period]
+        mask = rowMask[start:end]
+        stats, valid = regStatsMulti(XA[start:end][mask], np.stack([Y[start:end][mask] for Y in Ys], axis=1))
+        for k in range(len(intervals)):
+            idx = np.flatnonzero(valid[k])
+            periods[k].append(np.full(len(idx), period))
+            factorIdx[k].append(idx)
+            values[k].append(stats[k][:, idx])
+    return [_longTable(np.concatenate(periods[k]), np.concatenate(factorIdx[k]), np.hstack(values[k]), factorNames, interval)
+            for k, interval in enumerate(intervals)]
+
+
+def _longTable(periods: np.ndarray, factorIdx: np.ndarray, values: np.ndarray,
+               factorNames: List[str], interval: int) -> pd.DataFrame:
+    """(指标, 样本)矩阵 -> factor, returnInterval, period, indicator, value长表"""
+    k = len(REG_INDICATORS)
+    return pd.DataFrame({"factor": np.repeat(np.asarray(factorNames, dtype=object)[factorIdx], k),
+                         "returnInterval": interval,
+                         "period": np.repeat(periods, k),
+                         "indicator": np.tile(np.asarray(REG_INDICATORS, dtype=object), len(periods)),
+                         "value": values.T.reshape(-1)})
+
+
+def _quantileStats(XA: np.ndarray, periodReturn: np.ndarray, rowMask: np.ndarray,
+                   interval: int, quantiles: int, factorNames: List[str], periodOffset: int = 0,
+                   bucketCache: Dict[int, np.ndarray] = None, autoCorrCache: Dict[int, np.ndarray] = None) -> pd.DataFrame:
+    """
+    分层回测统计(对应QuantileStats): 每个调仓时刻分组一次(各interval共用bucketCache), 再对所有period分组聚合period_return
+    调仓时刻的行附带最高/最低组换手率(由相邻两次分组得到)与因子秩自相关(QUANTILE_METRICS), 其余行为空
+    autoCorrCache: interval -> 秩自相关(与quantiles无关, 参数扫描时各配置共用)
+    """
+    rebalancePeriods, buckets = quantileBuckets(XA, rowMask, interval, quantiles, periodOffset, bucketCache)
+    values = quantileReturnBatch(buckets, rebalancePeriods, periodReturn, rowMask, quantiles)  # (时间, 因子, 分组)
+    autoCorr = autoCorrCache.get(interval) if autoCorrCache is not None else None
+    if autoCorr is None:
+        autoCorr = rankAutoCorr(XA, rowMask, rebalancePeriods)
+        if autoCorrCache is not None:
+            autoCorrCache[interval] = autoCorr
+    metrics = np.full((values.shape[0], values.shape[1], len(QUANTILE_METRICS)), np.nan)
+    metrics[rebalancePeriods - 1, :, :2] = quantileTurnover(buckets, quantiles)
+    metrics[rebalancePeriods - 1, :, 2] = autoCorr
+    T, F = values.shape[0], values.shape[1]
+    res = pd.DataFrame({"factor": np.tile(np.asarray(factorNames, dtype=object), T),
+                        "returnInterval": interval,
+                        "period": np.repeat(np.arange(1, T + 1), F)})
+    for q in range(quantiles):
+        res["QuantileReturn" + str(q + 1)] = values[:, :, q].reshape(-1)
+    for k, name in enumerate(QUANTILE_METRICS):
+        res[name] = metrics[:, :, k].reshape(-1)
+    return res
@@ -0,0 +1,449 @@
+import warnings
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from typing import Dict, List, Tuple
+
+REG_INDICATORS = ["R_square", "Adj_square", "Std_Error", "Obs",
+                  "Alpha_OLS", "R_OLS", "Alpha_tstat", "R_tstat", "IC", "RankIC"]
+QUANTILE_METRICS = ["TopTurnover", "BottomTurnover", "RankAutoCorr"]    # 分层回测结果中调仓时刻的换手率 & 秩自相关
+
+
+def validFactorMask(X: np.ndarray) -> np.ndarray:
+    """
+    因子有效性规则(同RegStats): 非空值比例≥10%且因子非常数
+    X: (样本数, 因子数) -> (因子数,) bool
+    """
+    finite = np.isfinite(X)
+    xmin = np.where(finite, X, np.inf).min(axis=0)
+    xmax = np.where(finite, X, -np.inf).max(axis=0)
+    return (finite.sum(axis=0) > X.shape[0] * 0.1) & (xmin < xmax)
+
+
+def olsFromMoments(n: np.ndarray, mx: np.ndarray, my: np.ndarray,
+                   cxx: np.ndarray, cyy: np.ndarray, cxy: np.ndarray) -> Dict[str, np.ndarray]:
+    """
+    由充分统计量(样本数, 均值, 中心化二阶矩)闭式计算单变量OLS(含截距) & IC
+    所有输入均为(因子数,)向量, 逐因子独立
+    """
+    with np.errstate(divide="ignore", invalid="ignore"):
+        beta = cxy / cxx
+        alpha = my - beta * mx
+        sse = np.maximum(cyy - beta * cxy, 0.0)
+        sigma2 = sse / (n - 2)
+        r2 = np.where(cyy > 0, 1 - sse / cyy, np.nan)
+        return {"R_square": r2,
+                "Adj_square": 1 - (1 - r2) * (n - 1) / (n - 2),
+                "Std_Error": np.sqrt(sigma2),
+                "Obs": n.astype(float),
+                "Alpha_OLS": alpha,
+                "R_OLS": beta,
+                "Alpha_tstat": alpha / np.sqrt(sigma2 * (1.0 / n + mx ** 2 / cxx)),
+                "R_tstat": beta / np.sqrt(sigma2 / cxx),
+                "IC": cxy / np.sqrt(cxx * cyy)}
+
+
+def maskedCorr(A: np.ndarray, B: np.ndarray, M: np.ndarray) -> np.ndarray:
+    """逐列计算A与B在掩码M内的Pearson相关系数"""
+    n = M.sum(axis=0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        Ac = np.where(M, A - np.where(M, A, 0.0).sum(axis=0) / n, 0.0)
+        Bc = np.where(M, B - np.where(M, B, 0.0).sum(axis=0) / n, 0.0)
+        return (Ac * Bc).sum(axis=0) / np.sqrt((Ac * Ac).sum(axis=0) * (Bc * Bc).sum(axis=0))
+
+
+def sortColumns(A: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """逐列升序排序(空值视为+inf排在最后), 返回(排序下标, 排序后的值), 形状均为(列数, 样本数)"""
+    B = np.array(A.T, dtype=float, order="C")   # 按行排序, 避免跨步访问
+    B[np.isnan(B)] = np.inf                     # 含空值时argsort明显变慢
+    order = np.argsort(B, axis=1)
+    return order, np.take_along_axis(B, order, axis=1)
+
+
+def ranksFromSorted(order: np.ndarray, S: np.ndarray, keep: np.ndarray = None) -> np.ndarray:
+    """
+    由sortColumns的结果求平均秩(相同值取平均秩): 只对keep(排序后的位置, 默认为有限值)内的样本排序, 其余为空
+    同一截面在不同样本子集上的秩(如成对非空样本)可共用一次排序
+    返回(样本数, 列数)
+    """
+    if keep is None:
+        keep = np.isfinite(S)
+    kept = np.cumsum(keep, axis=1, dtype=float)     # 截至当前位置(含)参与排序的样本数
+    change = S[:, 1:] != S[:, :-1]
+    edge = np.ones((S.shape[0], 1), dtype=bool)
+    startPos = np.maximum.accumulate(np.where(np.hstack([edge, change]), kept - keep + 1, 0.0), axis=1)
+    endPos = np.minimum.accumulate(np.where(np.hstack([change, edge]), kept, np.inf)[:, ::-1], axis=1)[:, ::-1]
+    ranks = np.empty(S.shape)
+    np.put_along_axis(ranks, order, np.where(keep, (startPos + endPos) / 2, np.nan), axis=1)
+    return ranks.T
+
+
+def rankColumns(A: np.ndarray) -> np.ndarray:
+    """逐列求平均秩(相同值取平均秩, 空值保持为空)"""
+    return ranksFromSorted(*sortColumns(A))
+
+
+def quantileSplit(S: np.ndarray, n: np.ndarray, quantiles: int) -> np.ndarray:
+    """
+    由sortColumns的结果计算分位点, 与np.nanquantile(method="midpoint")逐位一致(避免逐列处理空值)
+    S: (列数, 样本数), n: (列数,)非空样本数(均大于0) -> (quantiles-1, 列数)
+    """
+    q = np.arange(1, quantiles) / quantiles
+    pos = (n[None, :] - 1) * q[:, None]
+    virtual = 0.5 * (np.floor(pos) + np.ceil(pos))
+    prev = np.minimum(np.floor(virtual).astype(np.intp), n - 1)
+    nxt = np.minimum(prev + 1, n - 1)
+    a = np.take_along_axis(S, prev.T, axis=1).T
+    b = np.take_along_axis(S, nxt.T, axis=1).T
+    gamma = np.where(virtual % 1 == 0, 0.0, 0.5)
+    return np.where(gamma >= 0.5, b - (b - a) * (1 - gamma), a + (b - a) * gamma)
+
+
+def regStatsBatch(X: np.ndarray, y: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    截面批量回归 & IC: 一次计算所有因子的REG_INDICATORS
+    X: (样本数, 因子数), y: (样本数,)
+    返回: (len(REG_INDICATORS), 因子数)的统计量矩阵, (因子数,)的有效掩码
+    """
+    stats, valid = regStatsMulti(X, y[:, None])
+    return stats[0], valid[0]
+
+
+def regStatsMulti(X: np.ndarray, Ys: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    多个收益率列的截面批量回归 & IC: 因子端的有效值掩码/有效性判断/秩只计算一次, 各收益率列共用
+    X: (样本数, 因子数), Ys: (样本数, 收益率列数)
+    返回: (收益率列数, len(REG_INDICATORS), 因子数)的统计量, (收益率列数, 因子数)的有效掩码
+    """
+    finiteX = np.isfinite(X)
+    validX = validFactorMask(X)
+    rankIC = rankICMulti(X, Ys)
+    stats = np.empty((Ys.shape[1], len(REG_INDICATORS), X.shape[1]))
+    valid = np.empty((Ys.shape[1], X.shape[1]), dtype=bool)
+    for k in range(Ys.shape[1]):
+        M = finiteX & np.isfinite(Ys[:, k])[:, None]
+        n = M.sum(axis=0)
+        Y = np.broadcast_to(Ys[:, k][:, None], X.shape)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            mx = np.where(M, X, 0.0).sum(axis=0) / n
+            my = np.where(M, Y, 0.0).sum(axis=0) / n
+        Xc = np.where(M, X - mx, 0.0)
+        Yc = np.where(M, Y - my, 0.0)
+        cxx = (Xc * Xc).sum(axis=0)
+        valid[k] = validX & (n >= 3) & (cxx > 0)
+        res = olsFromMoments(n, mx, my, cxx, (Yc * Yc).sum(axis=0), (Xc * Yc).sum(axis=0))
+        res["RankIC"] = rankIC[k]
+        stats[k] = np.vstack([res[i] for i in REG_INDICATORS])
+    return stats, valid
+
+
+def rankICMulti(X: np.ndarray, Ys: np.ndarray) -> np.ndarray:
+    """
+    多个收益率列的RankIC(只使用因子与收益率均非空的样本): 因子的秩只计算一次,
+    收益率在因子的有效样本上均非空时直接使用; 各因子有效样本相同时收益率的秩也只计算一次
+    X: (样本数, 因子数), Ys: (样本数, 收益率列数) -> (收益率列数, 因子数)
+    """
+    finiteX = np.isfinite(X)
+    rowsX = finiteX.any(axis=1)
+    aligned = bool((finiteX == rowsX[:, None]).all())
+    rankX = rankColumns(np.where(finiteX, X, np.nan))
+    res = np.empty((Ys.shape[1], X.shape[1]))
+    for k in range(Ys.shape[1]):
+        y = Ys[:, k]
+        finiteY = np.isfinite(y)
+        M = finiteX & finiteY[:, None]
+        RX = rankX if finiteY[rowsX].all() else rankColumns(np.where(M, X, np.nan))
+        if aligned:
+            RY = np.broadcast_to(rankColumns(np.where(rowsX & finiteY, y, np.nan)[:, None]), X.shape)
+        else:
+            RY = rankColumns(np.where(M, np.broadcast_to(y[:, None], X.shape), np.nan))
+        res[k] = maskedCorr(RX, RY, M)
+    return res
+
+
+def quantileBucketBatch(X: np.ndarray, quantiles: int) -> np.ndarray:
+    """
+    截面分组: 按分位点(midpoint插值)对每个因子分组, 等价于1+digitize(x, split, right=true)
+    X: (标的数, 因子数) -> int8 (标的数, 因子数), 取值1..quantiles, 空值为0
+    """
+    finite = np.isfinite(X)
+    bucket = np.zeros(X.shape, dtype=np.int8)
+    cols = finite.any(axis=0)
+    if cols.any():
+        _, S = sortColumns(X[:, cols])
+        split = quantileSplit(S, (~np.isnan(X[:, cols])).sum(axis=0), quantiles)
+        bucket[:, cols] = 1 + (X[:, cols][:, None, :] > split[None, :, :]).sum(axis=1)
+        bucket[~finite] = 0
+    return bucket
+
+
+def quantileBuckets(XA: np.ndarray, rowMask: np.ndarray, interval: int, quantiles: int,
+                    periodOffset: int = 0, cache: Dict[int, np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    只在调仓时刻(quantilePeriod整除interval)分组一次
+    XA: (时间, 标的, 因子) -> (调仓period数组(相对编号), int8(调仓次数, 标的, 因子))
+    periodOffset: 面板首个period之前的period数, 调仓时刻按绝对编号(period+periodOffset)对齐
+    cache: 调仓时刻 -> 分组, 多个interval的调仓时刻重合时(如1与5)共用同一次分组
+    """
+    rebalancePeriods = np.arange(interval - periodOffset % interval, XA.shape[0] + 1, interval)
+    buckets = np.zeros((len(rebalancePeriods), XA.shape[1], XA.shape[2]), dtype=np.int8)
+    for i, period in enumerate(rebalancePeriods):
+        if cache is not None and period in cache:
+            buckets[i] = cache[period]
+            continue
+        buckets[i] = quantileBucketBatch(np.where(rowMask[period - 1][:, None], XA[period - 1], np.nan), quantiles)
+        if cache is not None:
+            cache[period] = buckets[i]
+    return rebalancePeriods, buckets
+
+
+def quantileTurnover(buckets: np.ndarray, quantiles: int) -> np.ndarray:
+    """
+    分组换手率: 每个调仓时刻最高/最低分组中相对上一调仓时刻新进入的标的比例, 首个调仓时刻为空
+    buckets: quantileBuckets的分组(调仓次数, 标的, 因子) -> (调仓次数, 因子, 2), 最后一维依次为最高组/最低组
+    """
+    res = np.full((buckets.shape[0], buckets.shape[2], 2), np.nan)
+    for k, q in enumerate([quantiles, 1]):
+        member = buckets == q
+        with np.errstate(divide="ignore", invalid="ignore"):
+            res[1:, :, k] = 1 - (member[1:] & member[:-1]).sum(axis=1) / member[1:].sum(axis=1)
+    return res
+
+
+def rankAutoCorr(XA: np.ndarray, rowMask: np.ndarray, rebalancePeriods: np.ndarray) -> np.ndarray:
+    """
+    因子秩自相关: 相邻两个调仓时刻截面因子值的Spearman相关系数(只使用两个时刻均非空的标的), 首个调仓时刻为空
+    每个调仓时刻的截面只排序一次(前后两个调仓区间共用), 成对非空样本的秩由排序结果直接得到
+    XA: (时间, 标的, 因子) -> (调仓次数, 因子)
+    """
+    res = np.full((len(rebalancePeriods), XA.shape[2]), np.nan)
+    prev = None
+    for i, period in enumerate(rebalancePeriods):
+        X = np.where(rowMask[period - 1][:, None], XA[period - 1], np.nan)
+        X[~np.isfinite(X)] = np.nan
+        order, S = sortColumns(X)
+        if prev is not None:
+            prevX, prevOrder, prevS = prev
+            M = np.isfinite(X) & np.isfinite(prevX)
+            RX = ranksFromSorted(order, S, np.take_along_axis(M.T, order, axis=1))
+            RP = ranksFromSorted(prevOrder, prevS, np.take_along_axis(M.T, prevOrder, axis=1))
+            res[i] = maskedCorr(RX, RP, M)
+        prev = (X, order, S)
+    return res
+
+
+def quantileReturnBatch(buckets: np.ndarray, rebalancePeriods: np.ndarray, periodReturn: np.ndarray,
+                        rowMask: np.ndarray, quantiles: int) -> np.ndarray:
+    """
+    分组收益: 每个调仓区间内的所有period共享同一组分组, 以one-hot矩阵乘法一次性聚合
+    返回(时间, 因子, quantiles), 无数据的分组为0.0(调仓前的period同样为0.0)
+    """
+    T, F = periodReturn.shape[0], buckets.shape[2]
+    result = np.zeros((T, F, quantiles))
+    ret = np.where(rowMask, periodReturn, np.nan)
+    bounds = np.append(rebalancePeriods - 1, T)
+    for i in range(len(rebalancePeriods)):
+        block = ret[bounds[i]:bounds[i + 1]]
+        onehot = (buckets[i][:, :, None] == np.arange(1, quantiles + 1)).reshape(buckets.shape[1], F * quantiles)
+        finite = np.isfinite(block)
+        sums = np.where(finite, block, 0.0) @ onehot
+        counts = finite.astype(float) @ onehot
+        with np.errstate(divide="ignore", invalid="ignore"):
+            result[bounds[i]:bounds[i + 1]] = np.where(counts > 0, sums / counts, 0.0).reshape(-1, F, quantiles)
+    return result
+
+
+def rollingRegStats(XA: np.ndarray, Y: np.ndarray, rowMask: np.ndarray, periodBounds: np.ndarray,
+                    callBackPeriod: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    滚动窗口回归 & IC(callBackPeriod > 1): 对每个period只计算一次截面充分统计量
+    (n, Σx, Σy, Σxy, Σx², Σy²), 窗口统计量由前缀和相减得到(每步加入一个截面、移除一个截面),
+    结果与对窗口内全部样本重新回归一致; RankIC依赖窗口内的整体秩, 每个截面只排序一次, 窗口的排序随窗口滑动归并得到
+    XA: (时间, 标的, 因子), Y: (时间, 标的)
+    返回: (len(REG_INDICATORS), period数, 因子数)的统计量, (period数, 因子数)的有效掩码
+    """
+    stats, valid = rollingRegStatsMulti(XA, [Y], rowMask, periodBounds, callBackPeriod)
+    return stats[0], valid[0]
+
+
+def rollingRegStatsMulti(XA: np.ndarray, Ys: List[np.ndarray], rowMask: np.ndarray, periodBounds: np.ndarray,
+                         callBackPeriod: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    多个收益率列的滚动窗口回归 & IC: 因子端的窗口统计(有效样本数/最小最大值)与窗口样本只计算一次
+    返回: (收益率列数, len(REG_INDICATORS), period数, 因子数)的统计量, (收益率列数, period数, 因子数)的有效掩码
+    """
+    starts = periodBounds[:-1]
+    P = len(starts)
+    finiteX = np.isfinite(XA) & rowMask[:, :, None]
+
+    def periodSum(A: np.ndarray) -> np.ndarray:
+        # (时间, 标的, 因子) -> 按period聚合 -> 窗口前缀和相减 -> (period, 因子)
+        perPeriod = np.add.reduceat(A.sum(axis=1), starts, axis=0)
+        cum = np.vstack([np.zeros((1,) + perPeriod.shape[1:]), np.cumsum(perPeriod, axis=0)])
+        idx = np.arange(1, P + 1)
+        return cum[idx] - cum[np.maximum(idx - callBackPeriod, 0)]
+
+    rows = periodSum(np.broadcast_to(rowMask[:, :, None], XA.shape[:2] + (1,)).astype(float))
+    cntX = periodSum(finiteX.astype(float))
+    # 窗口内因子的最小/最大值(判断常数因子)
+    xmin = np.minimum.reduceat(np.where(finiteX, XA, np.inf).min(axis=1), starts, axis=0)
+    xmax = np.maximum.reduceat(np.where(finiteX, XA, -np.inf).max(axis=1), starts, axis=0)
+    xmin = sliding_window_view(np.vstack([np.full((callBackPeriod - 1, xmin.shape[1]), np.inf), xmin]),
+                               callBackPeriod, axis=0).min(axis=-1)
+    xmax = sliding_window_view(np.vstack([np.full((callBackPeriod - 1, xmax.shape[1]), -np.inf), xmax]),
+                               callBackPeriod, axis=0).max(axis=-1)
+    validX = (cntX > rows * 0.1) & (xmin < xmax)
+
+    stats = np.empty((len(Ys), len(REG_INDICATORS), P, XA.shape[2]))
+    valid = np.empty((len(Ys), P, XA.shape[2]), dtype=bool)
+    for k, Y in enumerate(Ys):
+        M = finiteX & np.isfinite(Y)[:, :, None]
+        # 以全样本均值平移, 减小Σx²-n·mean²的数值误差
+        with np.errstate(invalid="ignore"):
+            shiftX = np.nanmean(np.where(M, XA, np.nan), axis=(0, 1))
+            shiftY = np.nanmean(np.where(M.any(axis=2), Y, np.nan))
+        shiftX = np.nan_to_num(shiftX)
+        shiftY = np.nan_to_num(shiftY)
+        Xshift = np.where(M, XA - shiftX, 0.0)
+        Yshift = np.where(M, (Y - shiftY)[:, :, None], 0.0)
+        n = periodSum(M.astype(float))
+        sx, sy = periodSum(Xshift), periodSum(Yshift)
+        sxx, syy, sxy = periodSum(Xshift * Xshift), periodSum(Yshift * Yshift), periodSum(Xshift * Yshift)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            mx, my = sx / n, sy / n
+            cxx, cyy, cxy = sxx - n * mx * mx, syy - n * my * my, sxy - n * mx * my
+        valid[k] = validX & (n >= 3) & (cxx > 0)
+        res = olsFromMoments(n, mx + shiftX, my + shiftY, cxx, cyy, cxy)
+        res["RankIC"] = np.full((P, XA.shape[2]), np.nan)
+        stats[k] = np.stack([res[i] for i in REG_INDICATORS])
+    ric = REG_INDICATORS.index("RankIC")
+    # RankIC依赖窗口内的整体秩: 每个period的截面只排序一次, 窗口滑动时移除最早的截面并归并新截面的有序序列(不重新排序)
+    slabs, sortX, sortY = [], None, None
+    for p in range(P):
+        first = max(p + 1 - callBackPeriod, 0)
+        mask = rowMask[periodBounds[p]:periodBounds[p + 1]]
+        slabX = XA[periodBounds[p]:periodBounds[p + 1]][mask]
+        slabY = np.stack([Y[periodBounds[p]:periodBounds[p + 1]][mask] for Y in Ys], axis=1)
+        dropped = len(slabs.pop(0)[0]) if len(slabs) > p - first else 0    # 移出窗口的截面
+        slabs.append((slabX, slabY))
+        sortX = slideSorted(sortX, sortColumns(slabX), dropped)
+        sortY = slideSorted(sortY, sortColumns(slabY), dropped)
+        if valid[:, p].any():
+            stats[:, ric, p] = windowRankIC(np.vstack([X for X, _ in slabs]), np.vstack([Y for _, Y in slabs]), sortX, sortY)
+    return stats, valid
+
+
+def slideSorted(window: Tuple[np.ndarray, np.ndarray], new: Tuple[np.ndarray, np.ndarray],
+                dropped: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    滑动窗口的sortColumns结果: 移除窗口最前面的dropped个样本, 将新截面(sortColumns的结果)追加至窗口末尾并归并
+    等价于对滑动后的窗口样本重新sortColumns(相同值的先后顺序可能不同, 不影响平均秩)
+    """
+    if window is None:
+        return new
+    order, S = window
+    if dropped:
+        keep = order >= dropped
+        order = order[keep].reshape(order.shape[0], -1) - dropped
+        S = S[keep].reshape(S.shape[0], -1)
+    newOrder, newS = new
+    pos = np.vstack([np.searchsorted(S[i], newS[i], side="right") for i in range(S.shape[0])]) + np.arange(newS.shape[1])
+    isNew = np.zeros((S.shape[0], S.shape[1] + newS.shape[1]), dtype=bool)
+    np.put_along_axis(isNew, pos, True, axis=1)
+    mergedOrder, mergedS = np.empty(isNew.shape, dtype=order.dtype), np.empty(isNew.shape)
+    mergedOrder[isNew], mergedOrder[~isNew] = (newOrder + S.shape[1]).ravel(), order.ravel()
+    mergedS[isNew], mergedS[~isNew] = newS.ravel(), S.ravel()
+    return mergedOrder, mergedS
+
+
+def windowRankIC(X: np.ndarray, Ys: np.ndarray, sortX: Tuple[np.ndarray, np.ndarray],
+                 sortY: Tuple[np.ndarray, np.ndarray]) -> np.ndarray:
+    """
+    由窗口样本的排序求RankIC(窗口内全部样本的整体秩, 只使用因子与收益率均非空的样本), 结果同rankICMulti
+    X: (样本数, 因子数), Ys: (样本数, 收益率列数), sortX/sortY: 两者的sortColumns结果 -> (收益率列数, 因子数)
+    """
+    orderX, SX = sortX
+    orderY, SY = sortY
+    finiteX = np.isfinite(X)
+    rowsX = finiteX.any(axis=1)
+    aligned = bool((finiteX == rowsX[:, None]).all())
+    rankX = ranksFromSorted(orderX, SX)
+    res = np.empty((Ys.shape[1], X.shape[1]))
+    for k in range(Ys.shape[1]):
+        finiteY = np.isfinite(Ys[:, k])
+        M = finiteX & finiteY[:, None]
+        # 同rankICMulti: 收益率在因子的有效样本上均非空时直接使用因子的秩, 各因子有效样本相同时收益率只求一次秩
+        RX = rankX if finiteY[rowsX].all() else ranksFromSorted(orderX, SX, np.take_along_axis(M.T, orderX, axis=1))
+        if aligned:
+            oy = orderY[k:k + 1]
+            RY = np.broadcast_to(ranksFromSorted(oy, SY[k:k + 1], (rowsX & finiteY)[oy]), X.shape)
+        else:
+            oy = np.broadcast_to(orderY[k], orderX.shape)
+            RY = ranksFromSorted(oy, np.broadcast_to(SY[k], SX.shape), np.take_along_axis(M.T, oy, axis=1))
+        res[k] = maskedCorr(RX, RY, M)
+    return res
+
+
+def forwardReturns(barRet: np.ndarray, horizons: List[int]) -> np.ndarray:
+    """
+    由单根bar收益率推导任意持有期的未来收益率: 累计对数收益率C[t] = Σ_{s<t} log(1+barRet[s]),
+    fwd(t, h) = exp(C[t+h] - C[t]) - 1, 即t起持有h根bar的收益率; 窗口内存在空值时为空
+    barRet: (时间, 标的) -> (持有期数, 时间, 标的)
+    """
+    T, N = barRet.shape
+    finite = np.isfinite(barRet) & (barRet > -1)
+    C = np.vstack([np.zeros((1, N)), np.cumsum(np.log1p(np.where(finite, barRet, 0.0)), axis=0)])
+    cnt = np.vstack([np.zeros((1, N), dtype=np.int64), np.cumsum(finite, axis=0)])
+    res = np.full((len(horizons), T, N), np.nan)
+    for i, h in enumerate(horizons):
+        if 0 < h <= T:
+            res[i, :T - h + 1] = np.where(cnt[h:] - cnt[:-h] == h, np.expm1(C[h:] - C[:-h]), np.nan)
+    return res
+
+
+def crossSectionCorr(X: np.ndarray, R: np.ndarray, minObs: int = 3) -> np.ndarray:
+    """
+    逐时刻的截面Pearson相关系数(只使用因子与收益率均非空的样本), 所有持有期×因子一次矩阵运算
+    X: (时间, 标的, 因子), R: (持有期数, 时间, 标的) -> (持有期数, 时间, 因子), 样本不足或常数时为空
+    """
+    mX, mR = np.isfinite(X), np.isfinite(R)
+    X0, R0 = np.where(mX, X, 0.0), np.where(mR, R, 0.0)
+    mX, mR = mX.astype(float), mR.astype(float)
+    n = np.einsum("htn,tnf->htf", mR, mX)
+    sx, sy = np.einsum("htn,tnf->htf", mR, X0), np.einsum("htn,tnf->htf", R0, mX)
+    sxx, syy = np.einsum("htn,tnf->htf", mR, X0 * X0), np.einsum("htn,tnf->htf", R0 * R0, mX)
+    sxy = np.einsum("htn,tnf->htf", R0, X0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        cxx, cyy = sxx - sx * sx / n, syy - sy * sy / n
+        corr = (sxy - sx * sy / n) / np.sqrt(cxx * cyy)
+    tol = 1e-12 * np.maximum(n, 1)
+    return np.where((n >= minObs) & (cxx > tol) & (cyy > tol), np.clip(corr, -1.0, 1.0), np.nan)
+
+
+def icDecay(XA: np.ndarray, barRet: np.ndarray, rowMask: np.ndarray, horizons: List[int],
+            dateChunk: int = 64) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    IC衰减: 各持有期未来收益率(forwardReturns)与因子的逐时刻IC & RankIC
+    因子先截面标准化(减小数值误差), RankIC的秩在因子与收益率成对非空的样本上计算(同rankICMulti)
+    XA: (时间, 标的, 因子), barRet: (时间, 标的)
+    返回: IC, RankIC, 均为(持有期数, 时间, 因子)
+    """
+    N = XA.shape[1]
+    X = np.where(rowMask[:, :, None], XA, np.nan)
+    X = np.where(np.isfinite(X), X, np.nan)
+    R = forwardReturns(np.where(rowMask, barRet, np.nan), horizons)
+    with warnings.catch_warnings(), np.errstate(invalid="ignore", divide="ignore"):
+        warnings.simplefilter("ignore", RuntimeWarning)     # 截面全为空
+        X = (X - np.nanmean(X, axis=1, keepdims=True)) / np.nanstd(X, axis=1, keepdims=True)
+    IC = np.full((len(horizons), XA.shape[0], XA.shape[2]), np.nan)
+    RankIC = np.full(IC.shape, np.nan)
+    for t0 in range(0, XA.shape[0], dateChunk):
+        t1 = min(t0 + dateChunk, XA.shape[0])
+        x, r = X[t0:t1], R[:, t0:t1]
+        IC[:, t0:t1] = crossSectionCorr(x, r)
+        xs = np.moveaxis(x, 1, 0).reshape(N, -1)    # (标的, 时刻×因子), 每列一个截面
+        for h in range(len(horizons)):
+            M = np.moveaxis(np.isfinite(x) & np.isfinite(r[h])[:, :, None], 1, 0).reshape(N, -1)    # 成对非空样本
+            rs = np.moveaxis(np.broadcast_to(r[h][:, :, None], x.shape), 1, 0).reshape(N, -1)
+            rho = maskedCorr(rankColumns(np.where(M, xs, np.nan)), rankColumns(np.where(M, rs, np.nan)), M)
+            RankIC[h, t0:t1] = np.where(M.sum(axis=0) >= 3, np.clip(rho, -1.0, 1.0), np.nan).reshape(t1 - t0, -1)
+    return IC, RankIC
@@ -0,0 +1,289 @@
+import os, sys, json, json5, time, inspect, argparse, functools, contextlib, threading
+import numpy as np
+import pandas as pd
+from typing import Dict, List
+# Add project root to Python path
+project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+from src.backend.DensePanel import DensePanel
+from src.entity.Source import Source
+from src.entity.Result import Stats
+from src.entity.Eva import Eva
+import src.FactorEva as FactorEvaModule
+from src.FactorEva import FactorEva
+try:
+    import resource     # 仅Unix
+except ImportError:
+    resource = None
+
+
+def makePanel(nSymbols: int = 200, nDates: int = 500, nFactors: int = 20, nanRatio: float = 0.1,
+              freq: str = "daily", barsPerDay: int = 4, returnIntervals: List[int] = (1, 5, 10),
+              seed: int = 0) -> pd.DataFrame:
+    """
+    合成面板(symbol, tradeDate, barRet, ret{k}D..., factor0...)
+    freq="minute"时每个交易日barsPerDay根bar; ret{k}D为之后k根bar的累计收益, 因子与ret1D弱相关
+    """
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range("2020-01-01", periods=nDates)
+    if freq == "minute":
+        offsets = pd.Timedelta(hours=9, minutes=30) + pd.to_timedelta(np.arange(barsPerDay), unit="min")
+        times = (dates.values[:, None] + offsets.values[None, :]).reshape(-1)
+    else:
+        times = dates.values
+    T, N = len(times), nSymbols
+    barRet = rng.normal(0, 0.02, (T, N))
+    cum = np.vstack([np.zeros((1, N)), np.cumsum(barRet, axis=0)])
+    cols = {"barRet": barRet}
+    for k in returnIntervals:
+        fwd = np.full((T, N), np.nan)
+        fwd[:T - k] = cum[1 + k:T + 1] - cum[1:T + 1 - k]
+        cols[f"ret{k}D"] = fwd
+    signal = np.nan_to_num(cols[f"ret{returnIntervals[0]}D"])
+    for j in range(nFactors):
+        factor = signal * 0.2 * (j + 1) / nFactors + rng.normal(0, 0.02, (T, N))
+        factor[rng.random((T, N)) < nanRatio] = np.nan
+        cols[f"factor{j}"] = factor
+    panel = pd.DataFrame({"symbol": np.tile(np.asarray([f"S{i:04d}" for i in range(N)]), T),
+                          "tradeDate": np.repeat(times, N)})
+    for name, values in cols.items():
+        panel[name] = values.reshape(-1)
+    return panel
+
+
+def benchConfig(freq: str, returnIntervals: List[int], backend: str = "numpy") -> Dict:
+    """与eva.json5中config一致的评价配置"""
+    return {"startDate": "20200101", "endDate": "20991231", "dailyFreq": freq == "daily", "callBackPeriod": 1,
+            "returnIntervals": list(returnIntervals), "quantile": 5, "dailyPnlLimit": 0.1,
+            "useMinFreqPeriod": False, "barRetLabelName": "barRet",
+            "futRetLabelNames": [f"ret{k}D" for k in returnIntervals], "backend": backend}
+
+
+BENCH_SUFFIX = "_bench"
+
+
+def checkBenchConfig(cfg: Dict) -> None:
+    """dolphindb模式会删除并重建因子/标签库及结果库, 仅允许库名以BENCH_SUFFIX结尾的基准测试专用配置"""
+    unsafe = [f"{kind}.dbName={cfg[kind]['dbName']}" for kind in ["factor", "label", "result"]
+              if not str(cfg[kind]["dbName"]).endswith(BENCH_SUFFIX)]
+    if unsafe:
+        raise ValueError(f"benchmark config must only use databases whose names end with '{BENCH_SUFFIX}' "
+                         f"(they are dropped and overwritten), got {', '.join(unsafe)}")
+
+
+class _AggSession:
+    """本地模式下Stats读取汇总表的替身session"""
+    def __init__(self, agg: pd.DataFrame):
+        self.agg = agg
+
+    def existsTable(self, dbUrl: str, tableName: str) -> bool:
+        return True
+
+    def run(self, script: str) -> pd.DataFrame:
+        return self.agg
+
+
+class Benchmark:
+    """
+    各阶段基准测试: getData / eva / insert / summary / factorData, 记录耗时, rows/s与峰值RSS
+    local: 不依赖DolphinDB, 使用本地后端, 数据源与汇总表(aggregate)为替身
+    dolphindb: 将合成数据写入源库后通过FactorEva.run与Stats取数函数计时
+    """
+    def __init__(self):
+        self.results: Dict[str, Dict[str, float]] = {}
+        self._lock = threading.Lock()   # BatchRunner多session并发时各阶段在不同线程中计时
+
+    @staticmethod
+    def peakRSS() -> float:
+        """进程峰值RSS(MB), 不支持时返回None"""
+        if resource is None:
+            return None
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return rss / 1024 ** 2 if sys.platform == "darwin" else rss / 1024
+
+    @contextlib.contextmanager
+    def stage(self, name: str, rows: int = 0):
+        """计时一个阶段(同名阶段累加), 可在with内修改返回字典的rows"""
+        record = {"rows": rows}
+        start = time.perf_counter()
+        yield record
+        wall = time.perf_counter() - start
+        with self._lock:
+            self._record(name, wall, int(record["rows"]))
+
+    def _record(self, name: str, wall: float, rows: int) -> None:
+        res = self.results.setdefault(name, {"wall": 0.0, "rows": 0, "calls": 0})
+        res["wall"] += wall
+        res["rows"] += rows
+        res["calls"] += 1
+        res["rowsPerSec"] = res["rows"] / res["wall"] if res["wall"] > 0 else None
+        res["peakRSS"] = self.peakRSS()
+
+    @contextlib.contextmanager
+    def instrument(self, cls, method: str, name: str, rows=None):
+        """在with内对cls.method计时(rows: 根据参数名->实参(含默认值)与返回值计算行数的函数)"""
+        original = getattr(cls, method)
+        signature = inspect.signature(original)
+
+        @functools.wraps(original)
+        def wrapper(*args, **kwargs):
+            with self.stage(name) as record:
+                out = original(*args, **kwargs)
+                if rows is not None:    # 位置参数与关键字参数统一按参数名取值
+                    bound = signature.bind(*args, **kwargs)
+                    bound.apply_defaults()
+                    record["rows"] = rows(bound.arguments, out)
+                else:
+                    record["rows"] = 0
+            return out
+
+        setattr(cls, method, wrapper)
+        try:
+            yield
+        finally:
+            setattr(cls, method, original)
+
+    def runLocal(self, panel: pd.DataFrame, factorList: List[str], config: Dict) -> None:
+        """本地模式: 面板稠密化 -> 本地后端评价 -> 汇总表 -> Stats汇总页"""
+        labelList = [config["barRetLabelName"]] + config["futRetLabelNames"]
+        with self.stage("getData", rows=len(panel)):
+            data = DensePanel.fromFrame(panel, idCol="symbol", timeCol="tradeDate", cols=labelList + factorList)
+        evaObj = FactorEva(None)
+        evaObj.setConfig(config=config)
+        evaObj.setData(data)
+        with self.stage("eva", rows=len(panel) * len(factorList)):
+            evaObj.eva(factorList=factorList)
+        summary_res = evaObj.summaryRes
+        with self.stage("aggregate", rows=len(summary_res)):     # 替身: 按UpdateAgg的口径生成汇总表
+            ic = summary_res[summary_res["indicator"].isin(["IC", "RankIC"])]
+            ic = ic.assign(year=pd.to_datetime(ic["TradeTime"]).dt.year, square=ic["value"] ** 2)
+            agg = ic.groupby(["factor", "returnInterval", "year", "indicator"]).agg(
+                cnt=("value", "count"), sumValue=("value", "sum"), sumSquare=("square", "sum")).reset_index()
+        statsObj = Stats(_AggSession(agg[agg["returnInterval"] == config["returnIntervals"][0]]))
+        with self.stage("summary", rows=len(agg)):
+            statsObj._summaryData(rInterval=config["returnIntervals"][0])
+
+    def runDolphinDB(self, cfg: Dict, panel: pd.DataFrame, factorList: List[str]) -> None:
+        """DolphinDB模式: 合成数据写入cfg中的源库(会覆盖!), 然后通过FactorEva.run与Stats取数函数计时"""
+        import dolphindb as ddb
+        checkBenchConfig(cfg)
+        session = ddb.session(**cfg["session"])
+        labelList = [cfg["config"]["barRetLabelName"]] + cfg["config"]["futRetLabelNames"]
+        self.loadSource(session, cfg, panel, factorList, labelList)
+        FactorEvaModule.session = session  # FactorEva.run使用模块级session
+        with self.instrument(Source, "getData", "getData", rows=lambda a, o: len(panel)), \
+                self.instrument(Eva, "eva", "eva", rows=lambda a, o: len(panel) * len(a["factorList"])), \
+                self.instrument(Eva, "insertResult", "insert", rows=lambda a, o: len(a["summary_res"]) + len(a["quantile_res"])):
+            FactorEva.run(cfg=cfg, factorList=factorList, dropDB=True)
+        statsObj = FactorEva(session)
+        statsObj.init(factorDict=cfg["factor"], labelDict=cfg["label"], resultDict=cfg["result"])
+        statsObj.setConfig(config=cfg["config"])
+        rInterval = statsObj.returnIntervals[0]
+        for name in ["summary", "summaryCached"]:
+            with self.stage(name, rows=len(factorList)):
+                statsObj.get_summaryData(rInterval=rInterval)
+        for name in ["factorData", "factorDataCached"]:
+            with self.stage(name, rows=len(panel) // max(len(factorList), 1)):
+                statsObj.get_factorData(factor=factorList[0], rInterval=rInterval)
+
+    @staticmethod
+    def loadSource(session, cfg: Dict, panel: pd.DataFrame, factorList: List[str], labelList: List[str]) -> None:
+        """将合成面板写为因子/标签长表(按月VALUE分区)"""
+        checkBenchConfig(cfg)
+        for kind, names in [("factor", factorList), ("label", labelList)]:
+            info = cfg[kind]
+            long = panel.melt(id_vars=["symbol", "tradeDate"], value_vars=names,
+                              var_name=info["indicatorCol"], value_name=info["valueCol"])
+            long = long.rename(columns={"symbol": info["symbolCol"], "tradeDate": info["dateCol"]})
+            if session.existsDatabase(info["dbName"]):
+                session.dropDatabase(info["dbName"])
+            session.upload({"src_": long})
+            session.run(f"""
+                db = database("{info['dbName']}", VALUE, 2019.01M..2030.12M)
+                t = db.createPartitionedTable(src_, "{info['tbName']}", "{info['dateCol']}")
+                t.append!(src_)
+                undef(`src_)
+            """)
+
+    def report(self, caseName: str, baseline: Dict = None, tolerance: float = 0.2) -> bool:
+        """打印各阶段结果与基线对比, 存在耗时回退时返回False"""
+        ok = True
+        print(f"== {caseName}")
+        print(f"{'stage':<18}{'wall(s)':>10}{'rows/s':>14}{'peakRSS(MB)':>13}{'baseline(s)':>13}")
+        base = (baseline or {}).get(caseName, {})
+        for name, res in self.results.items():
+            baseWall = base.get(name, {}).get("wall")
+            flag = ""
+            if baseWall is not None and res["wall"] > baseWall * (1 + tolerance):
+                flag, ok = "  REGRESSION", False
+            rowsPerSec = f"{res['rowsPerSec']:.0f}" if res.get("rowsPerSec") else "-"
+            peak = f"{res['peakRSS']:.0f}" if res.get("peakRSS") is not None else "-"
+            baseStr = f"{baseWall:.3f}" if baseWall is not None else "-"
+            print(f"{name:<18}{res['wall']:>10.3f}{rowsPerSec:>14}{peak:>13}{baseStr:>13}{flag}")
+        return ok
+
+    def save(self, path: str, caseName: str) -> None:
+        """写入/覆盖基线文件中的当前用例"""
+        baseline = {}
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                baseline = json.load(f)
+        baseline[caseName] = self.results
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(baseline, f, indent=2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="FactorEva benchmark")
+    parser.add_argument("--mode", choices=["local", "dolphindb"], default="local")
+    parser.add_argument("--config", default=None,
+                        help=f"dolphindb模式必须指定的基准测试配置文件(因子/标签/结果库会被删除重建, 库名须以{BENCH_SUFFIX}结尾)")
+    parser.add_argument("--symbols", type=int, default=200)
+    parser.add_argument("--dates", type=int, default=500)
+    parser.add_argument("--factors", type=int, default=20)
+    parser.add_argument("--nan", type=float, default=0.1)
+    parser.add_argument("--freq", choices=["daily", "minute"], default="daily")
+    parser.add_argument("--bars", type=int, default=4, help="minute频率下每日bar数")
+    parser.add_argument("--intervals", type=int, nargs="+", default=[1, 5, 10])
+    parser.add_argument("--nJobs", type=int, default=1)
+    parser.add_argument("--baseline", default=os.path.join(project_root, "src", "bench", "baseline.json"))
+    parser.add_argument("--save", action="store_true", help="将本次结果保存为基线")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args()
+    if args.mode == "dolphindb" and args.config is None:
+        parser.error(f"--config is required in dolphindb mode (a benchmark-only config whose dbNames end with '{BENCH_SUFFIX}')")
+
+    caseName = f"{args.mode}-{args.freq}-{args.symbols}x{args.dates}x{args.factors}-nan{args.nan}"
+    panel = makePanel(nSymbols=args.symbols, nDates=args.dates, nFactors=args.factors, nanRatio=args.nan,
+                      freq=args.freq, barsPerDay=args.bars, returnIntervals=args.intervals)
+    factorList = [c for c in panel.columns if c.startswith("factor")]
+    bench = Benchmark()
+    if args.mode == "local":
+        config = benchConfig(args.freq, args.intervals)
+        config["nJobs"] = args.nJobs
+        bench.runLocal(panel, factorList, config)
+    else:
+        with open(args.config, "r", encoding="utf-8") as f:
+            cfg = json5.load(f)
+        try:
+            checkBenchConfig(cfg)
+        except ValueError as e:
+            parser.error(str(e))
+        cfg["config"].update(benchConfig(args.freq, args.intervals, backend=cfg["config"].get("backend", "dolphindb")))
+        for kind in ["factor", "label"]:
+            cfg[kind]["condition"] = ""
+        bench.runDolphinDB(cfg, panel, factorList)
+    baseline = None
+    if os.path.exists(args.baseline):
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+    ok = bench.report(caseName, baseline=baseline, tolerance=args.tolerance)
+    if args.save:
+        bench.save(args.baseline, caseName)
+    sys.exit(0 if ok or args.save else 1)
+
+
+if __name__ == "__main__":
+    main()
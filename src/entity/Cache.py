@@ -0,0 +1,127 @@
+import os, re, json, pickle, hashlib, threading
+import pandas as pd
+from collections import OrderedDict
+from typing import Callable, Dict, List
+
+class PanelCache:
+    """
+    本地列式面板缓存: 每个因子/标签单独存为一个Parquet文件(symbol, tradeDate, value)
+    目录结构: cacheDir/<库名_表名>/<指标名>/<key>.parquet (+ <key>.json 记录源表状态)
+    key由日期区间、标的过滤条件与condition生成; 源表状态(行数, 最大日期)变化时缓存失效
+    """
+    def __init__(self, cacheDir: str):
+        self.cacheDir: str = cacheDir
+
+    @staticmethod
+    def makeKey(startDate: pd.Timestamp, endDate: pd.Timestamp, symbolList: List[str], condition: str) -> str:
+        """日期区间 + 标的过滤 + condition -> 缓存key"""
+        content = json.dumps([pd.Timestamp(startDate).strftime("%Y%m%d"), pd.Timestamp(endDate).strftime("%Y%m%d"),
+                              sorted(symbolList or []), condition or ""])
+        return hashlib.sha1(content.encode("utf-8")).hexdigest()[:16]
+
+    def _path(self, dbName: str, tbName: str, indicator: str, key: str) -> str:
+        tbDir = re.sub(r"[^0-9A-Za-z]+", "_", f"{dbName}_{tbName}").strip("_")
+        return os.path.join(self.cacheDir, tbDir, re.sub(r"[\\/:*?\"<>|]", "_", indicator), key)
+
+    def load(self, dbName: str, tbName: str, indicator: str, key: str, stamp: Dict) -> pd.DataFrame:
+        """读取缓存, 不存在或源表状态不一致时返回None"""
+        path = self._path(dbName, tbName, indicator, key)
+        if not (os.path.exists(path + ".parquet") and os.path.exists(path + ".json")):
+            return None
+        with open(path + ".json", "r", encoding="utf-8") as f:
+            if json.load(f) != stamp:
+                return None
+        return pd.read_parquet(path + ".parquet")
+
+    def save(self, dbName: str, tbName: str, indicator: str, key: str, stamp: Dict, data: pd.DataFrame) -> None:
+        """写入缓存(先写数据再写状态文件, 均写临时文件后替换, 中途失败或并发写入时不会留下不完整的文件)"""
+        path = self._path(dbName, tbName, indicator, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        suffix = f".{os.getpid()}.{threading.get_ident()}.tmp"
+        data.to_parquet(path + ".parquet" + suffix, index=False)
+        os.replace(path + ".parquet" + suffix, path + ".parquet")
+        with open(path + ".json" + suffix, "w", encoding="utf-8") as f:
+            json.dump(stamp, f)
+        os.replace(path + ".json" + suffix, path + ".json")
+
+
+class ResultCache:
+    """
+    看板结果缓存: 进程内存LRU + 磁盘LRU(pickle), 同一进程内的所有实例共用内存缓存(streamlit每次rerun都会新建对象)
+    key = (结果库, 表名, 因子, returnInterval, 结果版本, 评价配置); 每次eva写库都会提升对应因子的版本, 旧缓存不再命中并逐渐被淘汰
+    结果版本包含版本号与更新时间(dropDB重建后版本号从1开始, 但更新时间不同), 评价配置为影响结果形状的配置项(quantile等)
+    """
+    _memory: "OrderedDict[str, object]" = OrderedDict()
+    _lock = threading.Lock()
+
+    def __init__(self, cacheDir: str = None, maxsize: int = 256, diskBytes: int = 2 * 1024 ** 3):
+        self.cacheDir: str = os.path.join(cacheDir, "results") if cacheDir else None
+        self.maxsize: int = maxsize
+        self.diskBytes: int = diskBytes
+
+    @staticmethod
+    def makeKey(dbName: str, tbName: str, factor: str, rInterval: int, version, config: Dict = None) -> str:
+        content = json.dumps([dbName, tbName, factor, int(rInterval), version, config or {}], sort_keys=True, default=str)
+        return hashlib.sha1(content.encode("utf-8")).hexdigest()
+
+    def get(self, dbName: str, tbName: str, factor: str, rInterval: int, version, func: Callable[[], object],
+            config: Dict = None):
+        """命中内存/磁盘缓存时直接返回, 否则调用func计算并写入缓存(version为JSON可序列化的版本标识)"""
+        key = self.makeKey(dbName, tbName, factor, rInterval, version, config)
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                return self._memory[key]
+        value = self._loadDisk(key)
+        if value is None:
+            value = func()
+            self._saveDisk(key, value)
+        with self._lock:
+            self._memory[key] = value
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.maxsize:
+                self._memory.popitem(last=False)
+        return value
+
+    def _loadDisk(self, key: str):
+        if self.cacheDir is None:
+            return None
+        path = os.path.join(self.cacheDir, key + ".pkl")
+        try:
+            with open(path, "rb") as f:
+                value = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            return None
+        os.utime(path)  # 记录最近访问时间, 用于LRU淘汰
+        return value
+
+    def _saveDisk(self, key: str, value) -> None:
+        if self.cacheDir is None:
+            return
+        os.makedirs(self.cacheDir, exist_ok=True)
+        path = os.path.join(self.cacheDir, key + ".pkl")
+        tmpPath = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmpPath, "wb") as f:
+            pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmpPath, path)   # 多进程同时写入时保证文件完整
+        self._evictDisk()
+
+    def _evictDisk(self) -> None:
+        """磁盘缓存超过diskBytes时按最近访问时间淘汰"""
+        files = []
+        for name in os.listdir(self.cacheDir):
+            if name.endswith(".pkl"):
+                try:
+                    stat = os.stat(os.path.join(self.cacheDir, name))
+                except OSError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, name))
+        total = sum(size for _, size, _ in files)
+        for _, size, name in sorted(files):
+            if total <= self.diskBytes:
+                break
+            try:
+                os.remove(os.path.join(self.cacheDir, name))
+            except OSError:
+                pass
+            total -= size
@@ -0,0 +1,169 @@
+import numpy as np
+import pandas as pd
+from typing import List
+from src.entity.Result import Result
+
+class FactorCatalog:
+    """
+    因子目录: 每个因子的覆盖信息, 持久化为结果库中的维度表(catalogTbName), 查询时使用内存索引
+    字段: factor, firstDate, lastDate, rows, nonNull, symbols(单日最大标的数), tailRows, tailNonNull, evaTime, updateTime
+    增量刷新对每个因子只扫描其最新日期(含)之后的数据: 边界日的统计单独记录为tailRows/tailNonNull,
+    下次刷新时先扣除再重新统计该日, 避免边界日数据不完整时重复计数; 历史日期补录的数据需要refresh(full=True)
+    evaTime: 该因子所有returnInterval已评价的最早水位线, 尚未评价完整时为空(pending按各returnInterval各自的水位线判断)
+    """
+    columns: List[str] = ["factor", "firstDate", "lastDate", "rows", "nonNull", "symbols",
+                          "tailRows", "tailNonNull", "evaTime", "updateTime"]
+
+    def __init__(self, evaObj: Result):
+        self.evaObj: Result = evaObj
+        self.session = evaObj.session
+        self.dbName: str = evaObj.resultDBName
+        self.tbName: str = evaObj.resultTBName_Catalog
+        self.index: pd.DataFrame = None     # factor -> 覆盖信息
+
+    def initTable(self) -> None:
+        """创建目录表(结果库需已存在)"""
+        if not self.session.existsTable(dbUrl=self.dbName, tableName=self.tbName):
+            colType = ["SYMBOL", "TIMESTAMP", "TIMESTAMP", "LONG", "LONG", "LONG", "LONG", "LONG", "TIMESTAMP", "TIMESTAMP"]
+            self.evaObj.createDimensionTable(tbName=self.tbName, colName=self.columns, colType=colType,
+                                             sortColumns=["factor", "updateTime"])
+
+    def load(self) -> pd.DataFrame:
+        """读取持久化的目录到内存索引"""
+        if self.session.existsTable(dbUrl=self.dbName, tableName=self.tbName):
+            df = self.session.run(f"""select * from loadTable("{self.dbName}","{self.tbName}")""")
+        else:
+            df = pd.DataFrame(columns=self.columns)
+        self.index = df.set_index("factor")
+        return self.index
+
+    def _scan(self, scanDates: pd.Series = None) -> pd.DataFrame:
+        """
+        统计各因子的覆盖信息, scanDates(factor -> 日期)中的因子只统计该日(含)之后的数据, 其余因子统计全部日期
+        scanDates为空时扫描全表
+        """
+        evaObj = self.evaObj
+        where = [f"({evaObj.factorCondition})"] if evaObj.factorCondition not in ["", None] else []
+        boundScript = ""
+        if scanDates is not None and len(scanDates) > 0:
+            bound = pd.DataFrame({"factor": scanDates.index.astype(str), "scanDate": pd.to_datetime(scanDates.values)})
+            self.session.upload({"bound_": bound})
+            where.append(f"{evaObj.factorDateCol} >= {bound['scanDate'].min().strftime('%Y.%m.%d')}")
+            boundScript = """
+            t = select factor, tradeDate, cnt, nonNullCnt from lj(t, bound_, `factor) where isNull(scanDate) or tradeDate >= date(scanDate)
+            undef(`bound_)"""
+        whereStr = f"where {' and '.join(where)}" if where else ""
+        return self.session.run(f"""
+            t = select count(*) as cnt, count({evaObj.factorValueCol}) as nonNullCnt from loadTable("{evaObj.factorDBName}","{evaObj.factorTBName}")
+                {whereStr} group by {evaObj.factorIndicatorCol} as factor, date({evaObj.factorDateCol}) as tradeDate{boundScript}
+            t = select * from t order by factor, tradeDate
+            select min(tradeDate) as firstDate, max(tradeDate) as lastDate, sum(cnt) as rows, sum(nonNullCnt) as nonNull,
+                max(cnt) as symbols, last(cnt) as tailRows, last(nonNullCnt) as tailNonNull from t group by factor
+        """)
+
+    def refresh(self, full: bool = False) -> pd.DataFrame:
+        """增量(或全量)刷新目录与评价水位线, 并写回目录表"""
+        if self.index is None:
+            self.load()
+        old = self.index if not full else self.index.iloc[0:0]
+        scanDates = old["lastDate"].dropna() if len(old) > 0 else None    # 各因子从自身的最新日期起扫描
+        new = self._scan(scanDates).set_index("factor")
+        for col in ["firstDate", "lastDate"]:
+            new[col] = pd.to_datetime(new[col])
+        if scanDates is not None:     # 扣除被重新统计的边界日(边界日已无数据的因子不在new中, 保留原统计)
+            old = old.copy()
+            onBoundary = old.index.isin(scanDates.index) & old.index.isin(new.index)
+            old.loc[onBoundary, "rows"] -= old.loc[onBoundary, "tailRows"]
+            old.loc[onBoundary, "nonNull"] -= old.loc[onBoundary, "tailNonNull"]
+        catalog = old.reindex(old.index.union(new.index))
+        both = new.index.intersection(old.index)
+        fresh = new.index.difference(old.index)
+        catalog.loc[fresh, new.columns] = new.loc[fresh]
+        catalog.loc[both, "firstDate"] = old.loc[both, "firstDate"].where(old.loc[both, "firstDate"] < new.loc[both, "firstDate"], new.loc[both, "firstDate"])
+        catalog.loc[both, "lastDate"] = new.loc[both, "lastDate"]
+        catalog.loc[both, "rows"] = old.loc[both, "rows"] + new.loc[both, "rows"]
+        catalog.loc[both, "nonNull"] = old.loc[both, "nonNull"] + new.loc[both, "nonNull"]
+        catalog.loc[both, "symbols"] = old.loc[both, "symbols"].combine(new.loc[both, "symbols"], max)
+        catalog.loc[both, ["tailRows", "tailNonNull"]] = new.loc[both, ["tailRows", "tailNonNull"]]
+        countCols = ["rows", "nonNull", "symbols", "tailRows", "tailNonNull"]
+        catalog[countCols] = catalog[countCols].fillna(0).astype("int64")
+        catalog["evaTime"] = self._evaTime(catalog.index.tolist()).reindex(catalog.index)
+        catalog["updateTime"] = pd.Timestamp.now()
+        catalog.index.name = "factor"
+        self.index = catalog[self.columns[1:]]
+        self.save()
+        return self.index
+
+    def _watermark(self, factorList: List[str]) -> pd.DataFrame:
+        """各(因子, returnInterval)的水位线(IC法&回归法与分层回测结果中较早者), 只保留所有returnInterval均已评价的因子"""
+        watermark = self.evaObj.getWatermark(factorList=factorList)
+        watermark = watermark[watermark["returnInterval"].isin(self.evaObj.returnIntervals)]
+        watermark = watermark.assign(time=pd.to_datetime(watermark[["regTime", "quaTime"]].min(axis=1, skipna=False)))
+        covered = watermark.groupby("factor")["time"].transform("count") == len(self.evaObj.returnIntervals)
+        return watermark[covered]
+
+    def _evaTime(self, factorList: List[str]) -> pd.Series:
+        """各因子所有returnInterval中最早的水位线, 有returnInterval尚未评价时为空"""
+        evaTime = pd.Series(pd.NaT, index=pd.Index(factorList, name="factor"), dtype="datetime64[ns]")
+        if not factorList:
+            return evaTime
+        watermark = self._watermark(factorList)
+        evaTime.update(watermark.groupby("factor")["time"].min())
+        return evaTime
+
+    def _dueTime(self, factorList: List[str]) -> pd.Series:
+        """
+        各因子下一次有新结果的最早日期: 各returnInterval按自身的水位线, 之后第returnInterval个交易日(长周期的水位线天然落后于最新日期)
+        取各returnInterval中最早者; 有returnInterval尚未评价时为空, 交易日不足时为pd.Timestamp.max
+        """
+        dueTime = pd.Series(pd.NaT, index=pd.Index(factorList, name="factor"), dtype="datetime64[ns]")
+        if not factorList:
+            return dueTime
+        evaObj = self.evaObj
+        watermark = self._watermark(factorList)
+        if watermark.empty:
+            return dueTime
+        times = pd.DatetimeIndex(evaObj.getTradeDates(startDate=evaObj.startDate, endDate=evaObj.endDate,
+                                                      labelList=[evaObj.barRetLabelName] + evaObj.futRetLabelNames))
+        idx = np.searchsorted(times.values, watermark["time"].values, side="right") + watermark["returnInterval"].astype(int).values - 1
+        due = np.full(len(watermark), pd.Timestamp.max.normalize().to_datetime64())
+        inRange = idx < len(times)
+        due[inRange] = times.normalize().values[idx[inRange]]
+        dueTime.update(pd.Series(due, index=watermark["factor"].values).groupby(level=0).min())
+        return dueTime
+
+    def save(self) -> None:
+        """写回目录表(整表替换)"""
+        self.initTable()
+        df = self.index.reset_index()[self.columns]
+        self.session.upload({"catalog_": df})
+        self.session.run(f"""
+            t = loadTable("{self.dbName}","{self.tbName}")
+            delete from t
+            t.append!(select factor, timestamp(firstDate) as firstDate, timestamp(lastDate) as lastDate, rows, nonNull, symbols,
+                tailRows, tailNonNull, timestamp(evaTime) as evaTime, timestamp(updateTime) as updateTime from catalog_)
+            undef(`catalog_)
+        """)
+
+    def factors(self) -> List[str]:
+        """目录中的所有因子"""
+        if self.index is None:
+            self.load()
+        return self.index.index.tolist()
+
+    def __contains__(self, factor: str) -> bool:
+        if self.index is None:
+            self.load()
+        return factor in self.index.index
+
+    def coverage(self, factorList: List[str] = None) -> pd.DataFrame:
+        """因子的覆盖信息(附非空率nonNullRatio), factorList为空时返回全部"""
+        df = self.index if factorList is None else self.index.reindex([i for i in factorList if i in self.index.index])
+        return df.assign(nonNullRatio=df["nonNull"] / df["rows"].where(df["rows"] > 0))
+
+    def pending(self, factorList: List[str]) -> List[str]:
+        """有新数据(尚未评价, 或最新日期达到任一returnInterval的下一个结果日期)的因子"""
+        df = self.index.reindex([i for i in factorList if i in self.index.index])
+        dueTime = self._dueTime(df.index.tolist())
+        mask = dueTime.isna() | (pd.to_datetime(df["lastDate"]) >= dueTime)
+        return df.index[mask].tolist()
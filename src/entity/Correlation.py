@@ -0,0 +1,238 @@
+import os, json, shutil, hashlib, warnings
+import numpy as np
+import pandas as pd
+from typing import List, Tuple
+from src.entity.Source import Source
+from src.backend.DensePanel import DensePanel
+from src.utils.utils import split_list
+
+class FactorCorrelation:
+    """
+    因子相关性(冗余度)矩阵: 每个时刻的截面相关系数(pearson / spearman)按时间平均
+    分块计算: 因子按blockSize个一组从源表读取一次, 截面变换(spearman为截面秩, pearson为截面标准化)后
+    写入同一网格(时间 × 标的)的内存映射面板; 再对每对因子块按dateChunk个时刻做批量矩阵乘法,
+    由成对充分统计量(n, Σx, Σy, Σx², Σy², Σxy)得到只使用两因子均非空标的的相关系数
+    spearman的秩在各因子自身的非空标的上计算(不对成对的公共样本重新排序)
+    结果(Σcorr与有效时刻数)缓存于cacheDir, update时只计算新增的时刻与新增因子
+    """
+    def __init__(self, evaObj: Source, cacheDir: str, method: str = "spearman", blockSize: int = 200,
+                 minObs: int = 10, dateChunk: int = 64):
+        if method not in ["spearman", "pearson"]:
+            raise ValueError(f"method must be spearman or pearson, got {method}")
+        self.evaObj: Source = evaObj
+        self.cacheDir: str = cacheDir
+        self.method: str = method
+        self.blockSize: int = max(int(blockSize), 1)
+        self.minObs: int = max(int(minObs), 2)
+        self.dateChunk: int = max(int(dateChunk), 1)
+        key = hashlib.sha1(json.dumps([evaObj.factorDBName, evaObj.factorTBName, evaObj.factorCondition or "", method,
+                                       pd.Timestamp(evaObj.startDate).strftime("%Y%m%d") if getattr(evaObj, "startDate", None) is not None else ""]
+                                      ).encode("utf-8")).hexdigest()[:16]
+        self.path: str = os.path.join(cacheDir, f"corr_{method}_{key}.npz")
+        self.factors: List[str] = []
+        self.sumCorr: np.ndarray = np.zeros((0, 0))
+        self.cnt: np.ndarray = np.zeros((0, 0), dtype=np.int64)
+        self.lastDate: pd.Timestamp = None     # 已计算的最新时刻
+
+    def load(self) -> bool:
+        """读取缓存的结果, 不存在时返回False"""
+        if not os.path.exists(self.path):
+            return False
+        with np.load(self.path, allow_pickle=False) as f:
+            self.factors = f["factors"].tolist()
+            self.sumCorr = f["sumCorr"]
+            self.cnt = f["cnt"]
+            self.lastDate = pd.Timestamp(str(f["lastDate"])) if str(f["lastDate"]) else None
+        return True
+
+    def save(self) -> None:
+        """写入缓存(先写临时文件再替换)"""
+        os.makedirs(self.cacheDir, exist_ok=True)
+        tmpPath = self.path + ".tmp.npz"
+        np.savez(tmpPath, factors=np.asarray(self.factors, dtype=str), sumCorr=self.sumCorr, cnt=self.cnt,
+                 lastDate=np.asarray(self.lastDate.isoformat() if self.lastDate is not None else ""))
+        os.replace(tmpPath, self.path)
+
+    def update(self, factorList: List[str] = None, endDate: pd.Timestamp = None) -> pd.DataFrame:
+        """
+        增量更新并返回平均相关系数矩阵
+        新增时刻(lastDate之后): 所有因子对; 新增因子: 与所有因子在已计算区间(startDate~lastDate)上的因子对
+        """
+        evaObj = self.evaObj
+        factorList = list(dict.fromkeys(factorList or evaObj.getFactorList()))
+        endDate = pd.Timestamp(endDate if endDate is not None else evaObj.endDate)
+        self.load()
+        keep = set(factorList)
+        oldList = [f for f in self.factors if f in keep]
+        newList = [f for f in factorList if f not in set(self.factors)]
+        allList = oldList + newList
+        oldIdx = {f: i for i, f in enumerate(self.factors)}
+        sumCorr = np.zeros((len(allList), len(allList)))
+        cnt = np.zeros((len(allList), len(allList)), dtype=np.int64)
+        if oldList:
+            pos = [oldIdx[f] for f in oldList]
+            sumCorr[:len(oldList), :len(oldList)] = self.sumCorr[np.ix_(pos, pos)]
+            cnt[:len(oldList), :len(oldList)] = self.cnt[np.ix_(pos, pos)]
+        lastDate = self.lastDate
+        if newList and lastDate is not None:    # 新增因子补算已计算区间
+            s, c, _ = self._compute(newList, allList, evaObj.startDate, lastDate)
+            rows = slice(len(oldList), len(allList))
+            sumCorr[rows, :], cnt[rows, :] = s, c
+            sumCorr[:, rows], cnt[:, rows] = s.T, c.T
+        startDate = lastDate + pd.Timedelta(days=1) if lastDate is not None else evaObj.startDate
+        if allList and startDate <= endDate:    # 新增时刻
+            s, c, maxDate = self._compute(allList, allList, startDate, endDate)
+            sumCorr += s
+            cnt += c
+            if maxDate is not None:
+                lastDate = maxDate
+        self.factors, self.sumCorr, self.cnt, self.lastDate = allList, sumCorr, cnt, lastDate
+        self.save()
+        return self.matrix()
+
+    def _axes(self, factorList: List[str], startDate: pd.Timestamp, endDate: pd.Timestamp) -> Tuple[np.ndarray, np.ndarray]:
+        """区间内因子源表的时间轴与标的轴"""
+        info = self.evaObj._sourceInfo("factor")
+        session = self.evaObj.session
+        session.upload({"indicatorList_": factorList, "symbolList": []})
+        where = self.evaObj._sourceWhere(info, startDate, endDate, [])
+        times = session.run(f"""exec distinct({info['dateCol']}) from loadTable("{info['dbName']}","{info['tbName']}") where {where}""")
+        symbols = session.run(f"""exec distinct({info['symbolCol']}) from loadTable("{info['dbName']}","{info['tbName']}") where {where}""")
+        return np.sort(pd.to_datetime(np.asarray(times)).values), np.sort(np.asarray(symbols, dtype=str))
+
+    def _loadBlock(self, factorList: List[str], startDate: pd.Timestamp, endDate: pd.Timestamp) -> pd.DataFrame:
+        """读取一组因子的宽表(symbol, tradeDate, 因子...), 配置cacheDir时走本地面板缓存"""
+        evaObj = self.evaObj
+        if evaObj.cacheDir:
+            return evaObj._loadCached("factor", factorList, startDate, endDate, [])
+        info = evaObj._sourceInfo("factor")
+        evaObj.session.upload({"indicatorList_": factorList, "symbolList": []})
+        return evaObj.session.run(f"""
+            select {info['valueCol']} from loadTable("{info['dbName']}","{info['tbName']}") where {evaObj._sourceWhere(info, startDate, endDate, [])}
+            pivot by {info['symbolCol']} as {evaObj.dataSymbolCol}, {info['dateCol']} as {evaObj.dataDateCol}, {info['indicatorCol']}
+        """)
+
+    def _transform(self, arr: np.ndarray) -> np.ndarray:
+        """截面变换: spearman -> 截面秩; pearson -> 截面标准化(减小相关系数计算中的数值误差)"""
+        if self.method == "spearman":
+            return pd.DataFrame(arr).rank(axis=1).values
+        with warnings.catch_warnings(), np.errstate(invalid="ignore", divide="ignore"):
+            warnings.simplefilter("ignore", RuntimeWarning)
+            return (arr - np.nanmean(arr, axis=1, keepdims=True)) / np.nanstd(arr, axis=1, keepdims=True)
+
+    def _buildPanel(self, factorList: List[str], startDate: pd.Timestamp, endDate: pd.Timestamp,
+                    path: str) -> DensePanel:
+        """按因子块读取并变换, 写入共同网格的内存映射面板(float32)"""
+        times, symbols = self._axes(factorList, startDate, endDate)
+        panel = DensePanel(times=times, symbols=symbols, rowMask=np.ones((len(times), len(symbols)), dtype=bool),
+                           dtype="float32")
+        panel._saveMeta(path, files={})
+        timeIndex, symbolIndex = pd.Index(times), pd.Index(symbols)
+        for block in split_list(l=factorList, k=self.blockSize):
+            df = self._loadBlock(block, startDate, endDate)
+            tIdx = timeIndex.get_indexer(pd.to_datetime(df[self.evaObj.dataDateCol]))
+            sIdx = symbolIndex.get_indexer(df[self.evaObj.dataSymbolCol].astype(str))
+            valid = (tIdx >= 0) & (sIdx >= 0)
+            for factor in block:
+                arr = np.full(panel.shape, np.nan)
+                if factor in df.columns:
+                    arr[tIdx[valid], sIdx[valid]] = pd.to_numeric(df[factor], errors="coerce").values[valid]
+                panel._writeColumn(path, factor, self._transform(arr))
+            del df
+        panel._saveMeta(path, files=panel.files)
+        return DensePanel.open(path)
+
+    def _compute(self, rowList: List[str], colList: List[str], startDate: pd.Timestamp,
+                 endDate: pd.Timestamp) -> Tuple[np.ndarray, np.ndarray, pd.Timestamp]:
+        """区间内rowList × colList的Σcorr与有效时刻数, 以及区间内的最新时刻"""
+        sumCorr = np.zeros((len(rowList), len(colList)))
+        cnt = np.zeros((len(rowList), len(colList)), dtype=np.int64)
+        path = os.path.join(self.cacheDir, f"panel_{os.getpid()}")
+        try:
+            panel = self._buildPanel(list(dict.fromkeys(rowList + colList)), startDate, endDate, path)
+            if len(panel.times) == 0:
+                return sumCorr, cnt, None
+            symmetric = rowList == colList
+            rowBlocks = split_list(l=list(range(len(rowList))), k=self.blockSize)
+            colBlocks = rowBlocks if symmetric else split_list(l=list(range(len(colList))), k=self.blockSize)
+            for i, rows in enumerate(rowBlocks):
+                XA = np.stack([panel[rowList[r]] for r in rows], axis=-1)    # (时间, 标的, 因子)
+                for j, cols in enumerate(colBlocks):
+                    if symmetric and j < i:
+                        continue
+                    XB = XA if symmetric and i == j else np.stack([panel[colList[c]] for c in cols], axis=-1)
+                    s, c = self._blockCorr(XA, XB)
+                    sumCorr[np.ix_(rows, cols)], cnt[np.ix_(rows, cols)] = s, c
+                    if symmetric and j > i:
+                        sumCorr[np.ix_(cols, rows)], cnt[np.ix_(cols, rows)] = s.T, c.T
+            return sumCorr, cnt, pd.Timestamp(panel.times.max())
+        finally:
+            shutil.rmtree(path, ignore_errors=True)
+
+    def _blockCorr(self, XA: np.ndarray, XB: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """两个因子块(时间, 标的, 因子)逐时刻的成对相关系数之和与有效时刻数"""
+        sumCorr = np.zeros((XA.shape[2], XB.shape[2]))
+        cnt = np.zeros((XA.shape[2], XB.shape[2]), dtype=np.int64)
+        for t0 in range(0, XA.shape[0], self.dateChunk):
+            a = np.asarray(XA[t0:t0 + self.dateChunk], dtype=float)
+            b = np.asarray(XB[t0:t0 + self.dateChunk], dtype=float)
+            ma, mb = np.isfinite(a), np.isfinite(b)
+            a0, b0 = np.where(ma, a, 0.0), np.where(mb, b, 0.0)
+            maT, a0T = ma.transpose(0, 2, 1).astype(float), a0.transpose(0, 2, 1)
+            mb = mb.astype(float)
+            n = maT @ mb
+            sa, sb = a0T @ mb, maT @ b0
+            with np.errstate(invalid="ignore", divide="ignore"):
+                cov = a0T @ b0 - sa * sb / n
+                varA = (a0T ** 2) @ mb - sa ** 2 / n
+                varB = maT @ (b0 ** 2) - sb ** 2 / n
+                corr = cov / np.sqrt(varA * varB)
+                valid = (n >= self.minObs) & (varA > 1e-12 * n) & (varB > 1e-12 * n) & np.isfinite(corr)
+            sumCorr += np.where(valid, np.clip(corr, -1.0, 1.0), 0.0).sum(axis=0)
+            cnt += valid.sum(axis=0)
+        return sumCorr, cnt
+
+    def matrix(self, factorList: List[str] = None) -> pd.DataFrame:
+        """平均相关系数矩阵(没有有效时刻的因子对为空)"""
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = np.where(self.cnt > 0, self.sumCorr / np.maximum(self.cnt, 1), np.nan)
+        df = pd.DataFrame(mean, index=pd.Index(self.factors, name="factor"), columns=self.factors)
+        if factorList is not None:
+            factorList = [f for f in factorList if f in df.index]
+            df = df.loc[factorList, factorList]
+        return df
+
+    def redundantPairs(self, threshold: float = 0.7) -> pd.DataFrame:
+        """|平均相关系数| >= threshold的因子对(按|corr|降序)"""
+        mat = self.matrix()
+        i, j = np.triu_indices(len(mat), k=1)
+        values = mat.values[i, j]
+        mask = np.abs(values) >= threshold
+        res = pd.DataFrame({"factorA": mat.index.values[i[mask]], "factorB": mat.index.values[j[mask]],
+                            "corr": values[mask], "periods": self.cnt[i[mask], j[mask]]})
+        return res.reindex(res["corr"].abs().sort_values(ascending=False).index).reset_index(drop=True)
+
+    def clusters(self, threshold: float = 0.7, order: List[str] = None) -> pd.DataFrame:
+        """
+        贪心聚类: 按order(默认因子顺序, 可传入按IC等排序的因子)依次处理, 与已有代表因子的|corr|>=threshold时
+        归入相关性最高的代表因子所在的类, 否则成为新的代表因子
+        返回: factor, cluster, representative, corr(与代表因子的平均相关系数)
+        """
+        mat = self.matrix()
+        order = [f for f in (order or self.factors) if f in mat.index]
+        pos = {f: i for i, f in enumerate(mat.index)}
+        absMat = np.abs(np.nan_to_num(mat.values, nan=0.0))
+        leaders, rows = [], []
+        for factor in order:
+            best = -1
+            if leaders:
+                corrs = absMat[pos[factor], [pos[l] for l in leaders]]
+                if corrs.max() >= threshold:
+                    best = int(corrs.argmax())
+            if best < 0:
+                leaders.append(factor)
+                rows.append((factor, len(leaders) - 1, factor, 1.0))
+            else:
+                leader = leaders[best]
+                rows.append((factor, best, leader, float(mat.values[pos[factor], pos[leader]])))
+        return pd.DataFrame(rows, columns=["factor", "cluster", "representative", "corr"])
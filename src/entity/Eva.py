@@ -1,17 +1,33 @@
+import numpy as np
 import pandas as pd
 import dolphindb as ddb
-from typing import Dict, List
-from src.entity.Result import Result
+from typing import Callable, Dict, List, Tuple, Union
+from src.entity.Result import Result, SWEEP_KEYS
+from src.backend.Backend import getBackend
+from src.backend.DensePanel import DensePanel
+from src.backend.kernel import QUANTILE_METRICS, icDecay
+from src.utils.utils import split_list
 
 class Eva(Result):
     def __init__(self, session: ddb.session):
         super().__init__(session)
+        self.summaryRes: pd.DataFrame = None   # 本地后端的IC法&回归法结果
+        self.quantileRes: pd.DataFrame = None  # 本地后端的分层回测结果
 
     def initDef(self):
         """初始化定义"""
         self.session.run(rf"""
-        def InsertData(DBName, TBName, data, batchsize){{
+        def LogStage(logFunc, stage, returnInterval, startTime, rowsIn, rowsOut){{
+            // 阶段日志: logFunc不为空时(如append!{{stageLog_}})记录耗时(秒)与输入/输出行数
+            if (!isVoid(logFunc)){{
+                logFunc(table([stage] as stage, [int(returnInterval)] as returnInterval, [double(now() - startTime) / 1000] as seconds,
+                    [long(rowsIn)] as rowsIn, [long(rowsOut)] as rowsOut))
+            }}
+        }};
+
+        def InsertData(DBName, TBName, data, batchsize, logFunc=NULL){{
             // 预防Out of Memory，分批插入数据，batchsize为每次数据的记录数
+            start_time = now()
             start_idx = 0
             end_idx = batchsize
             krow = rows(data)
@@ -19,130 +35,297 @@ class Eva(Result):
                 slice_data = data[start_idx:min(end_idx,krow),]
                 if (rows(slice_data)>0){{
                 loadTable(DBName, TBName).append!(slice_data);
-                print(start_idx);
                 }}
                 start_idx = start_idx + batchsize
                 end_idx = end_idx + batchsize
             }}while(start_idx < krow)
+            cost = max(long(now() - start_time), 1)   // 毫秒
+            print(TBName + ": " + string(krow) + " rows in " + string(cost) + "ms (" + string(long(krow * 1000.0 / cost)) + " rows/s)")
+            LogStage(logFunc, "insert:" + TBName, NULL, start_time, krow, krow)
+            return krow
+        }};
+
+        def ResultRange(data){{
+            // 结果的覆盖范围: 每个(factor, returnInterval)的[最早, 最晚]tradeTime, 重写时该范围内的旧结果被替换
+            rng = select min(tradeTime) as startTime, max(tradeTime) as endTime from data group by factor, returnInterval
+            rng[`rangeKey] = rng[`factor] + "_" + string(rng[`returnInterval])
+            return rng
         }};
 
-        def RegStats(df, factor_list, ReturnInterval, callBackPeriod, currentPeriod){{
+        def InResultRange(rng, factor, returnInterval, tradeTime){{
+            // 结果是否落在ResultRange的覆盖范围内
+            key = factor + "_" + string(returnInterval)
+            startDict = dict(rng[`rangeKey], rng[`startTime])
+            endDict = dict(rng[`rangeKey], rng[`endTime])
+            return (key in rng[`rangeKey]) and tradeTime >= startDict[key] and tradeTime <= endDict[key]
+        }};
+
+        def UpsertData(DBName, TBName, data, batchsize, logFunc=NULL){{
+            // 幂等写入(长表布局的维度表): 先删除每个(factor, returnInterval)在本次结果时间范围内的旧结果再分批插入,
+            // 重试/断点续跑重复写入同一批结果时不会产生重复数据
+            if (rows(data)>0){{
+                rng = ResultRange(data)
+                factors_ = exec distinct(factor) from rng
+                t = loadTable(DBName, TBName)
+                delete from t where factor in factors_, InResultRange(rng, factor, returnInterval, tradeTime)
+            }}
+            return InsertData(DBName, TBName, data, batchsize, logFunc)
+        }};
+
+        def ReplacedIC(DBName, TBName, data, wide){{
+            // 本次写入将替换的IC&RankIC旧结果(长表), 由UpdateAgg从汇总表中扣除, 重复写入时汇总表保持不变
+            // 长表布局: 覆盖范围内的全部旧结果(UpsertData整段删除); 宽表布局: 排序键与新结果相同的旧结果(keepDuplicates=LAST)
+            if (rows(data)==0){{
+                return NULL
+            }}
+            rng = ResultRange(data)
+            factors_ = exec distinct(factor) from rng
+            startTime_ = min(rng[`startTime])
+            endTime_ = max(rng[`endTime])
+            t = loadTable(DBName, TBName)
+            if (wide){{
+                keys_ = select count(*) as cnt from data group by factor, returnInterval, tradeTime
+                old = select factor, returnInterval, tradeTime, IC, RankIC from t where factor in factors_, tradeTime between startTime_:endTime_
+                old = select factor, returnInterval, tradeTime, IC, RankIC from ej(old, keys_, `factor`returnInterval`tradeTime)
+                old = unpivot(old, `factor`returnInterval`tradeTime, `IC`RankIC)
+                rename!(old, `valueType, `indicator)
+                return select factor, returnInterval, indicator, value, tradeTime from old
+            }}
+            return select factor, returnInterval, indicator, value, tradeTime from t 
+                where factor in factors_, indicator in ["IC","RankIC"], tradeTime between startTime_:endTime_,
+                    InResultRange(rng, factor, returnInterval, tradeTime)
+        }};
+
+        def UpdateAgg(DBName, TBName, data, replaced=NULL){{
+            // 将新插入的IC&RankIC结果累加至汇总表(factor, returnInterval, year, indicator) -> cnt, Σ, Σ²
+            // replaced: 被本次写入替换的旧结果(ReplacedIC), 从汇总表中扣除
+            newAgg = select count(value) as cnt, sum(value) as sumValue, sum2(value) as sumSquare from data 
+                where indicator in ["IC","RankIC"] group by factor, returnInterval, year(tradeTime) as year, indicator
+            if (!isVoid(replaced)){{
+                if (rows(replaced)>0){{
+                    newAgg.append!(select -count(value) as cnt, -sum(value) as sumValue, -sum2(value) as sumSquare from replaced
+                        where indicator in ["IC","RankIC"] group by factor, returnInterval, year(tradeTime) as year, indicator)
+                }}
+            }}
+            if (rows(newAgg)>0){{
+                factors_ = exec distinct(factor) from newAgg
+                t = loadTable(DBName, TBName)
+                oldAgg = select factor, returnInterval, year, indicator, cnt, sumValue, sumSquare from t where factor in factors_
+                aggData = select sum(cnt) as cnt, sum(sumValue) as sumValue, sum(sumSquare) as sumSquare from unionAll(oldAgg, newAgg) 
+                    group by factor, returnInterval, year, indicator
+                delete from t where factor in factors_
+                t.append!(select * from aggData where cnt > 0)
+            }}
+        }};
+
+        def ToWideReg(data, indicators){{
+            // IC法&回归法长表 -> 宽表(factor, returnInterval, period, tradeTime, 各指标列), 缺失的指标补空值
+            wide = select value from data pivot by factor, returnInterval, period, tradeTime, indicator
+            for (ind in indicators){{
+                if (!(ind in columnNames(wide))){{
+                    wide[ind] = take(double(NULL), rows(wide))
+                }}
+            }}
+            return sql(select=sqlCol(`factor`returnInterval`period`tradeTime join indicators), from=wide).eval()
+        }};
+
+        def BumpVersion(DBName, TBName, data){{
+            // 写入结果的因子版本+1(看板缓存按版本失效)
+            factors_ = exec distinct(factor) from data
+            if (size(factors_)>0){{
+                t = loadTable(DBName, TBName)
+                oldVersion = select factor, version from t where factor in factors_
+                newVersion = select factor, iif(isNull(version), 0, version)+1 as version, now() as updateTime 
+                    from lj(table(factors_ as factor), oldVersion, `factor)
+                delete from t where factor in factors_
+                t.append!(newVersion)
+            }}
+        }};
+
+        def RegStats(df, factor_list, returnIntervals, callBackPeriod, currentPeriod){{
             /* ICIR & 回归法统计函数 */
-            // 统计函数(peach并行内部)
+            // 统计函数(peach并行内部), 一次处理所有returnInterval:
+            // 因子端预处理(类型转换/有效性判断/zscore/秩)每个period×因子只做一次, 收益端的zscore/秩每个period×returnInterval只做一次
             if (callBackPeriod != 1){{
                 data = select * from df where currentPeriod-callBackPeriod < period <= currentPeriod;
             }}else{{
                 data = select * from df where period = currentPeriod;
             }};
-            rename!(data,`Ret+string(ReturnInterval), `Ret);
+            retCols = `Ret+string(returnIntervals)
+            retZscore = dict(STRING, ANY)
+            retRank = dict(STRING, ANY)
+            retFull = dict(STRING, BOOL)
+            for (retCol in retCols){{
+                retZscore[retCol] = zscore(data[retCol])
+                retRank[retCol] = rank(data[retCol], tiesMethod='average')
+                retFull[retCol] = countNanInf(double(data[retCol]), true) == 0
+            }};
             counter = 0;
             for (factorName in factor_list){{
-                data[`factor] = double(data[factorName])  // 为了避免数据类型发生变化
+                factorValue = double(data[factorName])  // 为了避免数据类型发生变化
                 // 有可能因子存在大量空值/Inf/返回一样的值, 使得回归统计量报错
-                if (countNanInf(double(data[`factor]),true)<size(data[`factor])*0.9 and all(data[`factor]==data[`factor][0])==0){{
-                    // OLS回归统计量(因子收益率/T值/R方/调整后的R方/StdError/样本数量)
-                    result_OLS=ols(data[`Ret], data[`factor], intercept=true, mode=2); 
-                    if (not isVoid(result_OLS[`RegressionStat])){{
-                        beta_df = select factor as indicator, beta as value from result_OLS[`Coefficient];
-                        beta_df[`indicator] = ["Alpha_OLS","R_OLS"] // 截距项/回归系数
-                        tstat_df= select factor as indicator, tstat as value from result_OLS[`Coefficient];
-                        tstat_df[`indicator] = ["Alpha_tstat", "R_tstat"] // 截距项T值/回归系数T值
-                        RegDict=dict(result_OLS[`RegressionStat][`item], result_OLS[`RegressionStat][`statistics]); 
-                        R_square=RegDict[`R2];
-                        Adj_square=RegDict[`AdjustedR2];
-                        Std_error=RegDict[`StdError];
-                        Obs=RegDict['Observations'];
-
-                        // IC统计量
-                        IC_df = select `IC as indicator, corr(zscore(factor), zscore(Ret)) as value from data
-                        RankIC_df = select `RankIC as indicator, spearmanr(factor, Ret) as value from data
-
-                        // 合并结果
-                        summary_result=table([`R_square,`Adj_square,`Std_Error,`Obs] as `indicator, 
-                                [R_square, Adj_square, Std_error, Obs] as `value);
-                        summary_result.append!(beta_df)
-                        summary_result.append!(tstat_df)
-                        summary_result.append!(IC_df)
-                        summary_result.append!(RankIC_df)
-                        if (counter == 0){{
-                            res = select factorName as factor, ReturnInterval as returnInterval, 
-                                    currentPeriod as period, indicator, value from summary_result;
-                        }}else{{
-                            res.append!(select factorName as factor, ReturnInterval as returnInterval, 
-                                    currentPeriod as period, indicator, value from summary_result);
+                if (countNanInf(factorValue,true)<size(factorValue)*0.9 and all(factorValue==factorValue[0])==0){{
+                    factorZscore = zscore(factorValue)
+                    factorRank = rank(factorValue, tiesMethod='average')
+                    factorFull = countNanInf(factorValue, true) == 0
+                    for (i in 0..(size(returnIntervals)-1)){{
+                        Ret = data[retCols[i]]
+                        // OLS回归统计量(因子收益率/T值/R方/调整后的R方/StdError/样本数量)
+                        result_OLS=ols(Ret, factorValue, intercept=true, mode=2); 
+                        if (not isVoid(result_OLS[`RegressionStat])){{
+                            beta_df = select factor as indicator, beta as value from result_OLS[`Coefficient];
+                            beta_df[`indicator] = ["Alpha_OLS","R_OLS"] // 截距项/回归系数
+                            tstat_df= select factor as indicator, tstat as value from result_OLS[`Coefficient];
+                            tstat_df[`indicator] = ["Alpha_tstat", "R_tstat"] // 截距项T值/回归系数T值
+                            RegDict=dict(result_OLS[`RegressionStat][`item], result_OLS[`RegressionStat][`statistics]); 
+                            R_square=RegDict[`R2];
+                            Adj_square=RegDict[`AdjustedR2];
+                            Std_error=RegDict[`StdError];
+                            Obs=RegDict['Observations'];
+
+                            // IC统计量(因子与收益率均无空值时直接使用预先计算的秩, 否则按成对非空样本重新排序)
+                            IC = corr(factorZscore, retZscore[retCols[i]])
+                            if (factorFull and retFull[retCols[i]]){{
+                                RankIC = corr(factorRank, retRank[retCols[i]])
+                            }}else{{
+                                RankIC = spearmanr(factorValue, Ret)
+                            }};
+
+                            // 合并结果
+                            summary_result=table([`R_square,`Adj_square,`Std_Error,`Obs] as `indicator, 
+                                    [R_square, Adj_square, Std_error, Obs] as `value);
+                            summary_result.append!(beta_df)
+                            summary_result.append!(tstat_df)
+                            summary_result.append!(table([`IC,`RankIC] as `indicator, [double(IC), double(RankIC)] as `value))
+                            if (counter == 0){{
+                                res = select factorName as factor, returnIntervals[i] as returnInterval, 
+                                        currentPeriod as period, indicator, value from summary_result;
+                            }}else{{
+                                res.append!(select factorName as factor, returnIntervals[i] as returnInterval, 
+                                        currentPeriod as period, indicator, value from summary_result);
+                            }};
+                            counter += 1
                         }};
-                        counter += 1
                     }};
-                }}:
-                dropColumns!(data,`factor)
+                }};
             }};
             if (counter>0){{
                 return res 
             }}
         }}
 
-        def QuantileStats(df, idCol, factor_list, ReturnInterval, quantiles, currentPeriod){{
-            // 分层统计函数
-            // 统计函数(peach并行内部)
-            data = select * from df where period == currentPeriod;
-            // 按照这一个时刻数据(quantile_df)的因子值进行分组
-            quantile_df = select * from df where quantilePeriod == currentPeriod-currentPeriod%ReturnInterval
+        def QuantileGroups(df, idCol, factor_list, quantiles, rebalancePeriod){{
+            // 按照调仓时刻数据(quantile_df)的因子值进行分组, 返回(因子 -> 各标的分组, 因子 -> 各标的因子值)
+            bins = (1..(quantiles-1)*(1.0\quantiles)); // quantile bins
+            quantile_df = select * from df where quantilePeriod == rebalancePeriod
             quantile_df[`id] = quantile_df[idCol]
             quantile_df = select * from quantile_df context by id limit 1; // 取第一个因子值进行分组
-            bins = (1..(quantiles-1)*(1.0\quantiles)); // quantile bins
+            groups = dict(STRING, ANY)
+            factorValues = dict(STRING, ANY)
+            if (rows(quantile_df)>0){{
+                for (factorName in factor_list){{
+                    quantileFunc = quantile{{quantile_df[factorName],,"midpoint"}}; // 函数部分化应用
+                    split = each(quantileFunc, bins); // 按照阈值得到分割点
+                    groups[factorName] = dict(quantile_df[`id], 1+digitize(quantile_df[factorName], split, right=true))  // 当前因子的分组情况
+                    factorValues[factorName] = dict(quantile_df[`id], double(quantile_df[factorName]))
+                }};
+            }};
+            return groups, factorValues
+        }}
+
+        def QuantileMetrics(groups, factorValues, prevGroups, prevFactorValues, factorName, quantiles){{
+            // 调仓时刻的最高/最低组换手率(相对上一调仓时刻新进入的标的比例) & 因子秩自相关
+            if (!(factorName in keys(prevGroups)) or !(factorName in keys(groups))){{
+                return [double(NULL), double(NULL), double(NULL)]
+            }};
+            ids = keys(groups[factorName])
+            value = factorValues[factorName][ids]
+            prevValue = prevFactorValues[factorName][ids]  // 上一调仓时刻没有数据的标的为空
+            group = iif(isNull(value), 0, groups[factorName][ids])
+            prevGroup = iif(isNull(prevValue), 0, nullFill(prevGroups[factorName][ids], 0))
+            topTurnover = 1.0 - sum(group==quantiles and prevGroup==quantiles)\sum(group==quantiles)
+            bottomTurnover = 1.0 - sum(group==1 and prevGroup==1)\sum(group==1)
+            return [double(topTurnover), double(bottomTurnover), double(spearmanr(value, prevValue))]
+        }}
+
+        def QuantileSnapshots(df, idCol, factor_list, returnIntervals, quantiles, qperiod_list){{
+            // 所有returnInterval的调仓时刻(及其上一调仓时刻)的分组与因子值, 每个时刻只分组一次
+            // 返回(调仓时刻 -> (因子 -> 各标的分组), 调仓时刻 -> (因子 -> 各标的因子值)), 供QuantileStats在各period间共用
+            snapshotPeriods = array(LONG, 0)
+            for (ReturnInterval in returnIntervals){{
+                rebalancePeriods = distinct(long(qperiod_list - qperiod_list%ReturnInterval))
+                snapshotPeriods.append!(rebalancePeriods)
+                snapshotPeriods.append!(rebalancePeriods-ReturnInterval)    // 上一调仓时刻(换手率&秩自相关)
+            }};
+            snapshotPeriods = distinct(snapshotPeriods)
+            snapshots = ploop(QuantileGroups{{df, idCol, factor_list, quantiles, }}, snapshotPeriods)
+            groupCache = dict(STRING, ANY)
+            valueCache = dict(STRING, ANY)
+            for (i in 0..(size(snapshotPeriods)-1)){{
+                groupCache[string(snapshotPeriods[i])] = snapshots[i][0]
+                valueCache[string(snapshotPeriods[i])] = snapshots[i][1]
+            }};
+            return groupCache, valueCache
+        }}
+
+        def QuantileStats(df, idCol, factor_list, returnIntervals, quantiles, groupCache, valueCache, currentPeriod){{
+            // 分层统计函数
+            // 统计函数(peach并行内部), 一次处理所有returnInterval: 当前period的数据只切片一次,
+            // 分组取自QuantileSnapshots预先计算的groupCache/valueCache, 调仓时刻相同的returnInterval及同一调仓区间内的period共用
+            // 调仓时刻的结果附带最高/最低组换手率与因子秩自相关(由本次与上一调仓时刻的分组/因子值得到), 其余时刻为空
+            data = select * from df where period == currentPeriod;
+            quantile_list = `QuantileReturn+string(1..quantiles)
+            metric_list = {QUANTILE_METRICS}
 
             counter = 0
-            for (factorName in factor_list){{
-                // 分层测试
-                quantileFunc = quantile{{quantile_df[factorName],,"midpoint"}}; // 函数部分化应用
-                split = each(quantileFunc, bins); // 按照阈值得到分割点
-                quantile_df[`Quantile] = 1+digitize(quantile_df[factorName], split, right=true);
-                quantile_dict = dict(quantile_df[`id], quantile_df[`Quantile])  // 当前因子的分组情况
-                data[`Quantile] = quantile_dict[data[idCol]]
-                quantile_return = select factorName as factor, nullFill(avg(period_return),0.0) as value from data group by Quantile
-                tab = select value from quantile_return pivot by factor, Quantile
-                rename!(tab, [`factor].append!(`QuantileReturn+string(columnNames(tab)[1:])))
-                quantile_list = `QuantileReturn+string(1..quantiles)
-                for (col in quantile_list){{
-                    if (not (col in columnNames(tab))){{
-                        tab[col] = 0.0; // 说明没有当前分组的数据
+            for (ReturnInterval in returnIntervals){{
+                rebalancePeriod = currentPeriod-currentPeriod%ReturnInterval
+                isRebalance = currentPeriod%ReturnInterval == 0
+                groups = groupCache[string(rebalancePeriod)]
+                for (factorName in factor_list){{
+                    // 分层测试
+                    data[`Quantile] = groups[factorName][data[idCol]]
+                    quantile_return = select factorName as factor, nullFill(avg(period_return),0.0) as value from data group by Quantile
+                    tab = select value from quantile_return pivot by factor, Quantile
+                    rename!(tab, [`factor].append!(`QuantileReturn+string(columnNames(tab)[1:])))
+                    for (col in quantile_list){{
+                        if (not (col in columnNames(tab))){{
+                            tab[col] = 0.0; // 说明没有当前分组的数据
+                        }};
+                    }};        
+                    // 合并结果
+                    QuantileReturn_df = sql(select=[sqlCol(`factor)].append!(sqlCol(quantile_list)), from=tab).eval()
+                    metrics = [double(NULL), double(NULL), double(NULL)]
+                    if (isRebalance){{
+                        prevKey = string(rebalancePeriod-ReturnInterval)
+                        metrics = QuantileMetrics(groups, valueCache[string(rebalancePeriod)], groupCache[prevKey], valueCache[prevKey], factorName, quantiles)
                     }};
-                }};        
-                // 合并结果
-                QuantileReturn_df = sql(select=[sqlCol(`factor)].append!(sqlCol(quantile_list)), from=tab).eval()
-                if (counter == 0){{        
-                    qes = sql(select=[sqlCol(`factor), sqlColAlias(<ReturnInterval>, `returnInterval), sqlColAlias(<currentPeriod>, `period)].append!(sqlCol(quantile_list)), from=QuantileReturn_df).eval()           
-                }}else{{
-                    qes.append!(sql(select=[sqlCol(`factor), sqlColAlias(<ReturnInterval>, `returnInterval), sqlColAlias(<currentPeriod>, `period)].append!(sqlCol(quantile_list)), from=QuantileReturn_df).eval())     
+                    for (i in 0..(size(metric_list)-1)){{
+                        QuantileReturn_df[metric_list[i]] = metrics[i]
+                    }};
+                    if (counter == 0){{        
+                        qes = sql(select=[sqlCol(`factor), sqlColAlias(<ReturnInterval>, `returnInterval), sqlColAlias(<currentPeriod>, `period)].append!(sqlCol(quantile_list)).append!(sqlCol(metric_list)), from=QuantileReturn_df).eval()           
+                    }}else{{
+                        qes.append!(sql(select=[sqlCol(`factor), sqlColAlias(<ReturnInterval>, `returnInterval), sqlColAlias(<currentPeriod>, `period)].append!(sqlCol(quantile_list)).append!(sqlCol(metric_list)), from=QuantileReturn_df).eval())     
+                    }};
+                    counter += 1
                 }};
-                counter += 1
             }};
             if (counter>0){{
                 return qes // 返回分层回测结果 
             }}
         }}
 
-        def SingleFactorAnalysis(df, factor_list, idCol, timeCol, barReturnCol, futureReturnCols, returnIntervals, dailyFreq, callBackPeriod=1, quantiles=5, 
-            dailyPnlLimit=NULL, useMinFreqPeriod=true){{
-            /*单因子测试, 输出一张窄表
-            totalData: GPLearnProcessing输出的因子结果+行情数据
-            factor_list: 单因子列表
-            idCol: 标的列
-            timeCol: 时间列
-            barReturnCol: 1根Bar的区间收益率(For 分层回测法)
-            futureReturnCols: 未来区间收益率列名list(For IC法&回归法)
-            returnIntervals: 收益率计算间隔
-            dailyFreq: 表示当前因子输入是否为日频, false表示输入分钟频因子回测
-            callBackPeriod: 回看周期, 默认为1(即只使用当前period数据进行因子统计量计算)
-            quantiles: 分组数量, 每个period中标的会根据当前因子的值从小到大分成quantiles个数的分组去统计分组收益率
-            dailyPnlLimit: 当且仅当dailyFreq=true时生效, 表示日涨跌幅限制
-            useMinFreqPeriod: 仅当分钟频因子评价时有效, true表示计算因子统计量时按照分钟频聚合计算，false则按照日频聚合计算
-            */
+        def SingleFactorPrepare(df, factor_list, idCol, timeCol, barReturnCol, futureReturnCols, returnIntervals, dailyFreq,
+            useMinFreqPeriod, periodOffset, quantilePeriodOffset, logFunc){{
+            /* 单因子测试的数据准备(period划分及回归/分层回测数据), 与callBackPeriod/quantiles/dailyPnlLimit无关, 参数扫描时各配置共用
+            返回dict: regData, quantileData(period_return未截断), period_list, qperiod_list, time_dict, qtime_dict */
+            stageStart = now()
             totalData = df
             if (dailyFreq==true or (dailyFreq==false and useMinFreqPeriod==true)){{ // 分钟频->分钟频 & 日频->日频
                 // for ICIR & 回归法, 使用原始时间频率生成period
                 time_list = sort(distinct(totalData[timeCol]),true) // 分钟时间列/日时间列
-                period_dict = dict(time_list, cumsum(take(1, size(time_list))))
+                period_dict = dict(time_list, periodOffset + cumsum(take(1, size(time_list))))
                 time_dict = dict(values(period_dict), keys(period_dict))
                 totalData[`period] = period_dict[totalData[timeCol]]  // timeCol -> period
                 period_list = values(period_dict) // 所有period组成的list
@@ -154,14 +337,18 @@ class Eva(Result):
             }}else{{ // 分钟频->日频
                 // for 分层回测法, 依然使用原始分钟频生成period
                 qtime_list = sort(distinct(totalData[timeCol]),true) // 分钟时间列
-                qperiod_dict = dict(qtime_list, cumsum(take(1, size(qtime_list))))
+                qOffset = periodOffset
+                if (!isVoid(quantilePeriodOffset)){{
+                    qOffset = quantilePeriodOffset
+                }}
+                qperiod_dict = dict(qtime_list, qOffset + cumsum(take(1, size(qtime_list))))
                 qtime_dict = dict(values(qperiod_dict), keys(qperiod_dict))
                 totalData[`quantilePeriod] = qperiod_dict[totalData[timeCol]]  // timeCol -> qperiod
                 qperiod_list = values(qperiod_dict)
 
                 // for ICIR & 回归法, 生成日频period
                 time_list = sort(distinct(sql(select=sqlColAlias(makeCall(date, sqlCol(timeCol)),"time"), from=totalData).eval()["time"]), true) // 日期时间列
-                period_dict = dict(time_list, cumsum(take(1, size(time_list))))
+                period_dict = dict(time_list, periodOffset + cumsum(take(1, size(time_list))))
                 time_dict = dict(values(period_dict), keys(period_dict))
                 totalData[`period] = period_dict[date(totalData[timeCol])]  // timeCol -> period
                 period_list = values(period_dict) // 所有period组成的list
@@ -176,48 +363,184 @@ class Eva(Result):
 
             // 分层回测 \ ICIR法&回归法
             sortBy!(totalData, timeCol, 1)            
-            if (dailyPnlLimit!=NULL and dailyFreq==true){{
-                update totalData set period_return = clip(period_return, -dailyPnlLimit, dailyPnlLimit)
-            }}
             colList = returnCol.copy().append!(idCol).append!(timeCol).append!([`period,`quantilePeriod]).append!(factor_list)
             regData = sql(sqlCol(colList),from=totalData).eval()  // for ICIR法 & 回归法
             quantileData = sql(sqlCol(colList).append!(sqlCol(`period_return)), from=totalData).eval() // for 分层回测法
-            counter = 0
-            for (interval in returnIntervals){{
-                print("processing ReturnInterval:"+string(interval))
-
-                // 分层回测
-                print("Start Quantile BackTesting...")
-                QuantileFunc = QuantileStats{{quantileData, idCol, factor_list, interval, quantiles, }} // DolphinDB函数部分化应用
-                qes = peach(QuantileFunc, qperiod_list).unionAll(false)
-                print("End Quantile BackTesting...")
-
-                // ICIR法&回归法
-                RegStatsFunc = RegStats{{regData, factor_list, interval, callBackPeriod, }}; // DolphinDB函数部分化应用
-                res = peach(RegStatsFunc, period_list).unionAll(false)
-
-                if (counter == 0){{
-                    summary_res = res
-                    quantile_res = qes
-                }}else{{
-                    summary_res.append!(res)
-                    quantile_res.append!(qes)
-                }}
-                counter += 1
+            LogStage(logFunc, "prepare", NULL, stageStart, rows(df), rows(regData))
+            prep = dict(STRING, ANY)
+            prep[`regData] = regData
+            prep[`quantileData] = quantileData
+            prep[`period_list] = period_list
+            prep[`qperiod_list] = qperiod_list
+            prep[`time_dict] = time_dict
+            prep[`qtime_dict] = qtime_dict
+            return prep
+        }}
+
+        def LimitReturn(quantileData, dailyPnlLimit, dailyFreq){{
+            // 日频时按dailyPnlLimit截断period_return(返回副本, 不修改共用的quantileData)
+            if (dailyPnlLimit!=NULL and dailyFreq==true){{
+                data = select * from quantileData
+                update data set period_return = clip(period_return, -dailyPnlLimit, dailyPnlLimit)
+                return data
             }}
-            print("SingleFactor Evaluation End")
-            summary_res[`TradeTime] = time_dict[summary_res[`period]]     // 添加时间
+            return quantileData
+        }}
+
+        def QuantilePass(quantileData, idCol, factor_list, returnIntervals, quantiles, qperiod_list, qtime_dict, logFunc){{
+            // 分层回测: 一次完成returnIntervals, 调仓时刻的分组由QuantileSnapshots计算一次后各period共用, 返回按时间排序的quantile_res
+            print("Start Quantile BackTesting...")
+            stageStart = now()
+            groupCache, valueCache = QuantileSnapshots(quantileData, idCol, factor_list, returnIntervals, quantiles, qperiod_list)
+            QuantileFunc = QuantileStats{{quantileData, idCol, factor_list, returnIntervals, quantiles, groupCache, valueCache, }} // DolphinDB函数部分化应用
+            quantile_res = peach(QuantileFunc, qperiod_list).unionAll(false)
+            print("End Quantile BackTesting...")
+            LogStage(logFunc, "quantile", NULL, stageStart, rows(quantileData), rows(quantile_res))
             quantile_res[`TradeTime] = qtime_dict[quantile_res[`period]]
-            sortBy!(summary_res,[`TradeTime,`factor,`period],[1,1,1])
+            quantile_cols = `factor`returnInterval`period join (`QuantileReturn+string(1..quantiles)) join `TradeTime join {QUANTILE_METRICS}
+            quantile_res = sql(select=sqlCol(quantile_cols), from=quantile_res).eval()  // 列顺序同结果表(换手率&自相关在tradeTime之后)
             sortBy!(quantile_res,[`TradeTime,`factor,`period],[1,1,1])
+            return quantile_res
+        }}
+
+        def RegPass(regData, factor_list, returnIntervals, callBackPeriod, period_list, time_dict, logFunc){{
+            // ICIR法&回归法: 一次完成returnIntervals(因子端预处理共用), 返回按时间排序的summary_res
+            stageStart = now()
+            RegStatsFunc = RegStats{{regData, factor_list, returnIntervals, callBackPeriod, }}; // DolphinDB函数部分化应用
+            summary_res = peach(RegStatsFunc, period_list).unionAll(false)
+            LogStage(logFunc, "regression", NULL, stageStart, rows(regData), rows(summary_res))
+            summary_res[`TradeTime] = time_dict[summary_res[`period]]     // 添加时间
+            sortBy!(summary_res,[`TradeTime,`factor,`period],[1,1,1])
+            return summary_res
+        }}
+
+        def SingleFactorAnalysis(df, factor_list, idCol, timeCol, barReturnCol, futureReturnCols, returnIntervals, dailyFreq, callBackPeriod=1, quantiles=5, 
+            dailyPnlLimit=NULL, useMinFreqPeriod=true, periodOffset=0, sinkFunc=NULL, logFunc=NULL, quantilePeriodOffset=NULL){{
+            /*单因子测试, 输出一张窄表
+            totalData: GPLearnProcessing输出的因子结果+行情数据
+            factor_list: 单因子列表
+            idCol: 标的列
+            timeCol: 时间列
+            barReturnCol: 1根Bar的区间收益率(For 分层回测法)
+            futureReturnCols: 未来区间收益率列名list(For IC法&回归法)
+            returnIntervals: 收益率计算间隔
+            dailyFreq: 表示当前因子输入是否为日频, false表示输入分钟频因子回测
+            callBackPeriod: 回看周期, 默认为1(即只使用当前period数据进行因子统计量计算)
+            quantiles: 分组数量, 每个period中标的会根据当前因子的值从小到大分成quantiles个数的分组去统计分组收益率
+            dailyPnlLimit: 当且仅当dailyFreq=true时生效, 表示日涨跌幅限制
+            useMinFreqPeriod: 仅当分钟频因子评价时有效, true表示计算因子统计量时按照分钟频聚合计算，false则按照日频聚合计算
+            periodOffset: 面板首个时刻之前的period数, 增量评价时使period编号及调仓时刻与全量评价保持一致
+            sinkFunc: 流式输出, 不为空时逐个returnInterval计算并立即调用sinkFunc(res, qes)(不再在returnInterval间共用分组及因子端预处理)
+            logFunc: 阶段日志, 不为空时记录数据准备及分层回测/回归阶段的耗时与行数
+            quantilePeriodOffset: 面板首个时刻之前的quantilePeriod数(分钟频->日频的分块评价), 为空时同periodOffset
+            */
+            prep = SingleFactorPrepare(df, factor_list, idCol, timeCol, barReturnCol, futureReturnCols, returnIntervals, dailyFreq,
+                                       useMinFreqPeriod, periodOffset, quantilePeriodOffset, logFunc)
+            quantileData = LimitReturn(prep[`quantileData], dailyPnlLimit, dailyFreq)
+            if (!isVoid(sinkFunc)){{
+                for (retInterval in returnIntervals){{   // 逐个returnInterval计算并立即流式输出, 内存中只保留当前一段结果
+                    qes = QuantilePass(quantileData, idCol, factor_list, [retInterval], quantiles, prep[`qperiod_list], prep[`qtime_dict], logFunc)
+                    res = RegPass(prep[`regData], factor_list, [retInterval], callBackPeriod, prep[`period_list], prep[`time_dict], logFunc)
+                    sinkFunc(res, qes)
+                }}
+                print("SingleFactor Evaluation End")
+                return NULL, NULL
+            }}
+            quantile_res = QuantilePass(quantileData, idCol, factor_list, returnIntervals, quantiles, prep[`qperiod_list], prep[`qtime_dict], logFunc)
+            summary_res = RegPass(prep[`regData], factor_list, returnIntervals, callBackPeriod, prep[`period_list], prep[`time_dict], logFunc)
+            print("SingleFactor Evaluation End")
             return summary_res, quantile_res
         }}
         """)
 
-    def eva(self, factorList: List[str]):
-        """运行评价"""
+    def eva(self, factorList: List[str], periodOffset: int = 0, watermark: pd.DataFrame = None,
+            quantilePeriodOffset: int = None):
+        """
+        运行评价
+        periodOffset: 面板首日之前的period数(增量评价)
+        quantilePeriodOffset: 面板首个时刻之前的quantilePeriod数(分块评价), 为空时同periodOffset
+        watermark: getWatermark的返回值, 不为空时只插入水位线之后的结果
+        返回写入的(summary行数, quantile行数), 流式写库时为None
+        """
+        if self.backend != "dolphindb":
+            return self.evaLocal(factorList=factorList, periodOffset=periodOffset, watermark=watermark,
+                                 quantilePeriodOffset=quantilePeriodOffset)
         self.session.upload({"factorList": factorList})
+        filterScript, cleanScript = "", ""
+        hasWatermark = watermark is not None and not watermark.empty
+        if hasWatermark:
+            self.session.upload({"watermark_": watermark.astype({"returnInterval": "int32"})})
+            untilCond, dropCols = "", "`regTime`quaTime"
+            if "untilTime" in watermark.columns:    # 分块评价: untilTime及之后的结果由后一块产生
+                untilCond, dropCols = " and (isNull(untilTime) or TradeTime < untilTime)", "`regTime`quaTime`untilTime"
+            filterScript = f"""
+        // 增量/分块评价: 只保留水位线之后(及untilTime之前)的结果
+        summary_res = select * from lj(summary_res, watermark_, `factor`returnInterval) where (isNull(regTime) or TradeTime > regTime){untilCond};
+        quantile_res = select * from lj(quantile_res, watermark_, `factor`returnInterval) where (isNull(quaTime) or TradeTime > quaTime){untilCond};
+        dropColumns!(summary_res, {dropCols});
+        dropColumns!(quantile_res, {dropCols});
+        """
+            cleanScript = "undef(`watermark_);"
+        logFunc, extraArg = None, ""
+        if self.metrics is not None:    # 服务端阶段日志
+            self.session.run("""
+            stageLog_ = table(1:0, `stage`returnInterval`seconds`rowsIn`rowsOut, [STRING,INT,DOUBLE,LONG,LONG]);
+            logFunc_ = append!{stageLog_};
+            """)
+            logFunc = "logFunc_"
+            extraArg += ", logFunc=logFunc_"
+            cleanScript += "undef(`stageLog_`logFunc_);"
+        if self.streamWrite:    # 结果按returnInterval分段(过滤并)写库
+            bound = (["watermark_"] if hasWatermark else []) + ([logFunc] if logFunc else [])
+            sinkDef = f"""
+        def StreamSink_({"".join(i + ", " for i in bound)}summaryPart, quantilePart){{
+            summary_res = summaryPart
+            quantile_res = quantilePart
+            {filterScript}
+            {self.insertScript(logFunc=logFunc)}
+        }}
+        """
+            sinkArg = f", sinkFunc=StreamSink_{{{','.join(bound)}}}" if bound else ", sinkFunc=StreamSink_"
+        else:
+            sinkDef, sinkArg = "", ""
+        with self.stage("eva", factorList=factorList, periodOffset=int(periodOffset)):
+            if quantilePeriodOffset is not None:
+                extraArg += f", quantilePeriodOffset={int(quantilePeriodOffset)}"
+            if self.streamWrite:    # sink在服务端脚本内写库, 无法只对维度表的写入加锁, 整个批次持有tableLock
+                with self.tableLock:
+                    self._evaServer(factorList, periodOffset, sinkDef, sinkArg + extraArg, "")
+            else:
+                self._evaServer(factorList, periodOffset, sinkDef, sinkArg + extraArg, filterScript, keepResult=True)
+                self.insertUploaded(logFunc=logFunc)    # 插入至数据库
+                self.session.run("undef(`summary_res`quantile_res`replaced_);")
+            if self.metrics is not None:
+                self.metrics.emitServerLog(self.session.run("stageLog_"), factorList=factorList)
+        rowCount = self.session.run("rowCount_")
+        self.session.run(cleanScript + "undef(`rowCount_);")
+        return tuple(int(i) for i in rowCount) if rowCount is not None else None
+
+    def _evaServer(self, factorList: List[str], periodOffset: int, sinkDef: str, extraArg: str, insertScript: str,
+                   keepResult: bool = False):
+        """dolphindb后端: 在服务端执行SingleFactorAnalysis并写库(keepResult时保留summary_res, quantile_res由调用方写库)"""
         self.session.run(rf"""
+        {self._configScript()}
+        // 执行单因子评价
+        {sinkDef}
+        summary_res, quantile_res = SingleFactorAnalysis(pt, factorList, idCol, timeCol, barReturnCol, futureReturnCols,
+         returnIntervals, dailyFreq, callBackPeriod=callBackPeriod, quantiles=quantiles, 
+            dailyPnlLimit=dailyPnlLimit, useMinFreqPeriod=useMinFreqPeriod, periodOffset={int(periodOffset)}{extraArg})
+        {insertScript}
+        if (isVoid(summary_res)){{    // 流式写库
+            rowCount_ = NULL;
+        }}else{{
+            rowCount_ = [rows(summary_res), rows(quantile_res)];
+        }}
+        undef({"`pt" if keepResult else "`summary_res`quantile_res`pt"}); // 释放内存
+        """)
+
+    def _configScript(self) -> str:
+        """服务端评价脚本的配置项与面板数据(pt)"""
+        return rf"""
         // 配置项
         idCol = "{self.dataSymbolCol}";
         timeCol = "{self.dataDateCol}"; // 这里由于后续就算引入分钟频，也是降频为日频因子，就直接写死为日期列
@@ -244,18 +567,208 @@ class Eva(Result):
         
         // 获取数据
         pt = select * from {self.dataObjName} order by {self.dataSymbolCol},{self.dataDateCol};
-        
-        // 执行单因子评价
-        summary_res, quantile_res = SingleFactorAnalysis(pt, factorList, idCol, timeCol, barReturnCol, futureReturnCols,
-         returnIntervals, dailyFreq, callBackPeriod=callBackPeriod, quantiles=quantiles, 
-            dailyPnlLimit=dailyPnlLimit, useMinFreqPeriod=useMinFreqPeriod)
-        
-        // 插入至数据库
-        InsertData(DBName="{self.resultDBName}", TBName="{self.resultTBName_Reg}", 
-                            data=summary_res, batchsize=1000000);
-        print("IC法&回归法结果插入完毕")
-        InsertData(DBName="{self.resultDBName}", TBName="{self.resultTBName_Qua}", 
-                            data=quantile_res, batchsize=1000000);
-        print("分层回测法结果插入完毕")
-        undef(`summary_res`quantile_res`pt); // 释放内存
-        """)
\ No newline at end of file
+        """
+
+    def _sweepServer(self, factorList: List[str], configs: Dict[str, Dict], quaCols: List[str]) -> None:
+        """
+        dolphindb后端的参数扫描: 数据准备(SingleFactorPrepare)只执行一次,
+        回归法结果按callBackPeriod、分层回测结果按(quantile, dailyPnlLimit)在各配置间共用, 只对不同的参数重新计算
+        """
+        self.session.run(rf"""
+        {self._configScript()}
+        prep_ = SingleFactorPrepare(pt, factorList, idCol, timeCol, barReturnCol, futureReturnCols, returnIntervals, dailyFreq,
+                                    useMinFreqPeriod, 0, NULL, NULL)
+        undef(`pt)
+        regCache_ = dict(STRING, ANY)   // callBackPeriod -> summary_res
+        quaCache_ = dict(STRING, ANY)   // (quantile, dailyPnlLimit) -> quantile_res
+        """)
+        for configId, config in configs.items():
+            limit = config["dailyPnlLimit"]
+            regKey = str(int(config["callBackPeriod"]))
+            quaKey = f"{int(config['quantile'])}_{limit}"
+            self.session.run(rf"""
+            if (!("{regKey}" in keys(regCache_))){{
+                regCache_["{regKey}"] = RegPass(prep_[`regData], factorList, returnIntervals, {int(config["callBackPeriod"])},
+                                                prep_[`period_list], prep_[`time_dict], NULL)
+            }}
+            if (!("{quaKey}" in keys(quaCache_))){{
+                quantileData_ = LimitReturn(prep_[`quantileData], {limit if limit is not None else "NULL"}, dailyFreq)
+                quaCache_["{quaKey}"] = QuantilePass(quantileData_, idCol, factorList, returnIntervals, {int(config["quantile"])},
+                                                     prep_[`qperiod_list], prep_[`qtime_dict], NULL)
+                undef(`quantileData_)
+            }}
+            summary_res = regCache_["{regKey}"]
+            quantile_res = quaCache_["{quaKey}"]
+            {self.sweepInsertScript(configId, config["quantile"], quaCols)}
+            undef(`summary_res`quantile_res)
+            """)
+        self.session.run("undef(`prep_`regCache_`quaCache_);")
+
+    def evaLocal(self, factorList: List[str], periodOffset: int = 0, watermark: pd.DataFrame = None,
+                 quantilePeriodOffset: int = None):
+        """本地后端评价: self.data -> Backend.singleFactorAnalysis -> 插入结果数据库(若存在session), 返回结果行数(同eva)"""
+        if self.streamWrite and self.session is not None:   # 边计算边写库, 不保留完整结果
+            from src.entity.Writer import ResultWriter
+            writer = ResultWriter(self, queueSize=self.writerQueueSize)
+            try:
+                self.computeLocal(data=self.data, factorList=factorList, periodOffset=periodOffset,
+                                  watermark=watermark, sink=writer.put, quantilePeriodOffset=quantilePeriodOffset)
+            finally:
+                writer.close()
+                self.releaseData()
+            return None
+        try:
+            summary_res, quantile_res = self.computeLocal(data=self.data, factorList=factorList,
+                                                          periodOffset=periodOffset, watermark=watermark,
+                                                          quantilePeriodOffset=quantilePeriodOffset)
+        finally:
+            self.releaseData()
+        self.summaryRes, self.quantileRes = summary_res, quantile_res
+        if self.session is not None:
+            self.insertResult(summary_res=summary_res, quantile_res=quantile_res)
+        return len(summary_res), len(quantile_res)
+
+    def computeLocal(self, data: Union[pd.DataFrame, DensePanel], factorList: List[str], periodOffset: int = 0,
+                     watermark: pd.DataFrame = None,
+                     sink: Callable[[pd.DataFrame, pd.DataFrame], None] = None,
+                     quantilePeriodOffset: int = None) -> Tuple[pd.DataFrame, pd.DataFrame]:
+        """
+        本地后端计算(不写库): 面板数据 -> summary_res, quantile_res
+        sink不为空时结果分段(过滤水位线后)交给sink, 返回(None, None)
+        """
+        backend = getBackend(self.backend, session=self.session, nJobs=self.nJobs)
+        if isinstance(data, pd.DataFrame):
+            data = data.sort_values([self.dataSymbolCol, self.dataDateCol]).reset_index(drop=True)
+        filteredSink = None
+        if sink is not None:
+            filteredSink = lambda summary_res, quantile_res: sink(*self.filterWatermark(summary_res, quantile_res, watermark))
+        rowsIn = len(data) if isinstance(data, pd.DataFrame) else int(data.rowMask.sum())
+        with self.stage("compute", factorList=factorList, periodOffset=int(periodOffset), rowsIn=rowsIn) as record:
+            summary_res, quantile_res = backend.singleFactorAnalysis(
+                data, factorList, self.dataSymbolCol, self.dataDateCol, self.barRetLabelName, self.futRetLabelNames,
+                self.returnIntervals, self.dailyFreq, callBackPeriod=self.callBackPeriod, quantiles=self.quantile,
+                dailyPnlLimit=self.dailyPnlLimit, useMinFreqPeriod=self.useMinFreqPeriod, periodOffset=periodOffset,
+                quantilePeriodOffset=quantilePeriodOffset, sink=filteredSink)
+            if sink is None:
+                record["rowsOut"] = len(summary_res) + len(quantile_res)
+        if sink is not None:
+            return None, None
+        return self.filterWatermark(summary_res, quantile_res, watermark)
+
+    def insertResult(self, summary_res: pd.DataFrame, quantile_res: pd.DataFrame):
+        """将本地计算结果上传并插入至结果数据库"""
+        factorList = summary_res["factor"].unique().tolist() if len(summary_res) > 0 else None
+        with self.stage("insert", factorList=factorList, rowsIn=len(summary_res) + len(quantile_res)) as record:
+            if self.metrics is not None:
+                record["bytes"] = self.metrics.frameBytes(summary_res, quantile_res)
+            self.session.upload({"summary_res": summary_res, "quantile_res": quantile_res})
+            self.insertUploaded()
+            self.session.run("undef(`summary_res`quantile_res`replaced_);")   # 释放内存
+
+    def evaDecay(self, factorList: List[str], horizons: List[int] = None) -> pd.DataFrame:
+        """
+        IC衰减分析: 只读取barRetLabelName与因子(不读取futRetLabelNames), 由累计对数收益率推导各持有期的未来收益率,
+        一次计算所有持有期×因子的逐时刻IC & RankIC, 按(因子, 持有期, 年)汇总后覆盖写入IC衰减汇总表(若存在session)
+        返回: factor, horizon, year, indicator, cnt, sumValue(Σ), sumSquare(Σ²)
+        """
+        horizons = sorted(set(int(h) for h in (horizons or self.decayHorizons)))
+        with self.stage("decay", factorList=factorList, horizons=len(horizons)) as record:
+            self.getData(startDate=self.startDate, endDate=self.endDate, factorList=factorList, symbolList=None,
+                         labelList=[self.barRetLabelName])
+            data, self.data = self.data, None
+            if self.backend == "dolphindb":     # 面板数据在服务端内存中
+                data = self.session.run(self.dataObjName)
+                self.session.run(f"undef(`{self.dataObjName})")
+            if not isinstance(data, DensePanel):
+                data = DensePanel.fromFrame(data, idCol=self.dataSymbolCol, timeCol=self.dataDateCol,
+                                            cols=[c for c in [self.barRetLabelName] + factorList if c in data.columns])
+            try:
+                barRet = np.asarray(data[self.barRetLabelName], dtype=float)
+                if self.dailyPnlLimit is not None and self.dailyFreq:   # 同分层回测的period_return
+                    barRet = np.clip(barRet, -self.dailyPnlLimit, self.dailyPnlLimit)
+                years = pd.DatetimeIndex(data.times).year.values
+                parts = []
+                for chunk in split_list(l=list(factorList), k=32) if len(years) else []:
+                    XA = np.stack([np.asarray(data[f], dtype=float) if f in data else np.full(data.shape, np.nan)
+                                   for f in chunk], axis=-1)
+                    IC, RankIC = icDecay(XA, barRet, np.asarray(data.rowMask), horizons)
+                    parts += [self.decayAgg(IC, years, chunk, horizons, "IC"),
+                              self.decayAgg(RankIC, years, chunk, horizons, "RankIC")]
+            finally:
+                data.release()    # 删除panelDir下的临时目录
+            agg = pd.concat(parts, ignore_index=True) if parts else self.decayAgg(np.zeros((0, 0, 0)), years, [], [], "IC")
+            record["rowsOut"] = len(agg)
+        if self.session is not None:
+            self.insertDecay(agg, factorList)
+        return agg
+
+    @staticmethod
+    def decayAgg(values: np.ndarray, years: np.ndarray, factorNames: List[str], horizons: List[int],
+                 indicator: str) -> pd.DataFrame:
+        """(持有期, 时间, 因子)的逐时刻IC -> 按(因子, 持有期, 年)的cnt, Σ, Σ²(时间已排序)"""
+        columns = ["factor", "horizon", "year", "indicator", "cnt", "sumValue", "sumSquare"]
+        if values.size == 0:
+            return pd.DataFrame(columns=columns)
+        starts = np.flatnonzero(np.r_[True, years[1:] != years[:-1]])
+        valid = np.isfinite(values)
+        v = np.where(valid, values, 0.0)
+        cnt = np.add.reduceat(valid.astype(np.int64), starts, axis=1)
+        h, y, f = np.nonzero(cnt)
+        return pd.DataFrame({"factor": np.asarray(factorNames, dtype=object)[f],
+                             "horizon": np.asarray(horizons)[h],
+                             "year": years[starts][y],
+                             "indicator": indicator,
+                             "cnt": cnt[h, y, f],
+                             "sumValue": np.add.reduceat(v, starts, axis=1)[h, y, f],
+                             "sumSquare": np.add.reduceat(v * v, starts, axis=1)[h, y, f]})[columns]
+
+    def insertDecay(self, agg: pd.DataFrame, factorList: List[str]):
+        """覆盖写入factorList的IC衰减汇总, 并更新结果版本(看板缓存失效)"""
+        with self.stage("insert", factorList=factorList, rowsIn=len(agg), table=self.resultTBName_Decay):
+            self.session.upload({"decay_": agg.astype({"horizon": "int32", "year": "int32", "cnt": "int64"}),
+                                 "decayFactors_": list(factorList)})
+            self.session.run(f"""
+            t = loadTable("{self.resultDBName}","{self.resultTBName_Decay}")
+            delete from t where factor in decayFactors_
+            if (rows(decay_)>0){{
+                t.append!(select factor, horizon, year, indicator, cnt, sumValue, sumSquare from decay_)
+            }}
+            BumpVersion(DBName="{self.resultDBName}", TBName="{self.resultTBName_Version}", data=table(decayFactors_ as factor));
+            undef(`decay_`decayFactors_);
+            """)
+
+    def sweep(self, factorList: List[str], grid: List[Dict]) -> pd.DataFrame:
+        """
+        参数扫描: 一批因子只取数一次, 评价grid中的每组评价参数(callBackPeriod/quantile/dailyPnlLimit, 见sweepConfigs),
+        结果按configId覆盖写入参数扫描结果表
+        dolphindb后端: 各配置共用服务端的数据准备, 回归结果/分层回测结果按参数共用(_sweepServer); 本地后端: Backend.singleFactorSweep共用回归结果/调仓分组/截断收益
+        返回: configId与各配置的评价参数
+        """
+        configs = self.sweepConfigs(grid)
+        quaCols = self.initSweepDB(maxQuantile=max(c["quantile"] for c in configs.values()))
+        self.saveSweepConfigs(configs)
+        with self.stage("sweep", factorList=factorList, configs=len(configs)):
+            self.getData(startDate=self.startDate, endDate=self.endDate, factorList=factorList, symbolList=None,
+                         labelList=[self.barRetLabelName] + self.futRetLabelNames)
+            self.session.upload({"factorList": factorList})
+            if self.backend == "dolphindb":
+                self._sweepServer(factorList, configs, quaCols)
+            else:
+                backend = getBackend(self.backend, session=self.session, nJobs=self.nJobs)
+                data, self.data = self.data, None
+                if isinstance(data, pd.DataFrame):
+                    data = data.sort_values([self.dataSymbolCol, self.dataDateCol]).reset_index(drop=True)
+                try:
+                    res = backend.singleFactorSweep(
+                        data, factorList, self.dataSymbolCol, self.dataDateCol, self.barRetLabelName, self.futRetLabelNames,
+                        self.returnIntervals, self.dailyFreq, useMinFreqPeriod=self.useMinFreqPeriod,
+                        grid={configId: {"callBackPeriod": c["callBackPeriod"], "quantiles": c["quantile"],
+                                         "dailyPnlLimit": c["dailyPnlLimit"]} for configId, c in configs.items()})
+                finally:
+                    if isinstance(data, DensePanel):    # 删除panelDir下的临时目录
+                        data.release()
+                for configId, (summary_res, quantile_res) in res.items():
+                    self.session.upload({"summary_res": summary_res, "quantile_res": quantile_res})
+                    self.session.run(self.sweepInsertScript(configId, configs[configId]["quantile"], quaCols)
+                                     + "undef(`summary_res`quantile_res);")
+        return pd.DataFrame([{"configId": configId, **{k: c[k] for k in SWEEP_KEYS}} for configId, c in configs.items()])
@@ -0,0 +1,81 @@
+import os, json, hashlib, threading
+import pandas as pd
+from typing import Dict, List, Set, Tuple
+
+class RunManifest:
+    """
+    运行清单: 批量评价每完成一个批次(块)追加一条记录(JSON lines), 中断后可按清单续跑
+    字段: runId, configId, time, stage("run"/"batch"), chunk, factorList, summaryRows, quantileRows
+    configId由评价配置(数据源、区间、评价参数、结果库及分块方式)生成, 配置改变后清单中的记录不再适用
+    resume=True时沿用该配置最近一次运行的runId, 跳过其中已完成的(因子, 块)
+    """
+    def __init__(self, path: str, config: Dict = None, resume: bool = False):
+        self.path: str = path
+        self.config: Dict = config or {}
+        self.configId: str = hashlib.sha1(json.dumps(self.config, sort_keys=True, default=str).encode("utf-8")).hexdigest()[:12]
+        self.runId: str = None
+        self.completed: Dict[str, Set[str]] = {}    # chunk -> 已完成的因子
+        self._lock = threading.Lock()
+        if os.path.dirname(os.path.abspath(path)):
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        if resume and os.path.exists(path):
+            records = self.load(path)
+            if not records.empty:
+                records = records[records["configId"] == self.configId]
+            if not records.empty:
+                self.runId = records["runId"].iloc[-1]
+                for record in records[(records["runId"] == self.runId) & (records["stage"] == "batch")].to_dict("records"):
+                    self.completed.setdefault(record["chunk"], set()).update(record["factorList"])
+        resumed = self.runId is not None
+        if not resumed:
+            self.runId = pd.Timestamp.now().strftime("%Y%m%d%H%M%S") + "-" + self.configId
+        self.emit({"stage": "run", "config": self.config, "resumed": resumed,
+                   "completed": int(sum(len(i) for i in self.completed.values()))})
+
+    @staticmethod
+    def chunkKey(chunk: Dict = None) -> str:
+        """块的标识(整段评价为"all")"""
+        if chunk is None:
+            return "all"
+        return f"{pd.Timestamp(chunk['startDate']).isoformat()}~{pd.Timestamp(chunk['endDate']).isoformat()}"
+
+    def pending(self, factorList: List[str], chunk: Dict = None) -> List[str]:
+        """该块中尚未完成的因子(保持原顺序)"""
+        with self._lock:
+            completed = self.completed.get(self.chunkKey(chunk), set())
+        return [i for i in factorList if i not in completed]
+
+    def done(self, factorList: List[str], chunk: Dict = None, rows: Tuple[int, int] = None) -> None:
+        """记录一个已写库的批次(块), rows为写入的(summary行数, quantile行数), 未知时为None"""
+        key = self.chunkKey(chunk)
+        with self._lock:
+            self.completed.setdefault(key, set()).update(factorList)
+        self.emit({"stage": "batch", "chunk": key, "factorList": list(factorList),
+                   "summaryRows": int(rows[0]) if rows is not None else None,
+                   "quantileRows": int(rows[1]) if rows is not None else None})
+
+    def emit(self, record: Dict) -> None:
+        """追加一条记录(写入后立即落盘, 中断时不丢失已完成的批次; 末行不完整时另起一行, 不与其拼接)"""
+        record = dict(runId=self.runId, configId=self.configId, time=pd.Timestamp.now().isoformat(), **record)
+        line = json.dumps(record, ensure_ascii=False, default=str) + "\n"
+        with self._lock:
+            with open(self.path, "a+b") as f:
+                if f.seek(0, os.SEEK_END) > 0:
+                    f.seek(-1, os.SEEK_END)
+                    if f.read(1) != b"\n":
+                        line = "\n" + line
+                f.write(line.encode("utf-8"))
+                f.flush()
+                os.fsync(f.fileno())
+
+    @staticmethod
+    def load(path: str) -> pd.DataFrame:
+        """读取清单文件(忽略中断时写了一半的末行)"""
+        records = []
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    continue
+        return pd.DataFrame(records)
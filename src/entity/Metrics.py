@@ -0,0 +1,95 @@
+import os, json, time, hashlib, threading, contextlib
+import pandas as pd
+import dolphindb as ddb
+from typing import Dict, List
+
+class RunMetrics:
+    """
+    运行指标: 每个阶段一条记录, 以JSON lines追加写入path(多个session/线程共用同一实例)
+    字段: runId, configId, time, stage, seconds, rowsIn, rowsOut, bytes(Python端与服务端之间的传输量),
+          serverMemory(阶段结束时当前session的服务端内存), batch, factorList, error, 以及阶段自定义字段
+    同一批因子的各阶段使用相同的batch编号; 运行开始时写一条stage="run"的记录, 其中包含完整配置
+    """
+    def __init__(self, path: str, config: Dict = None, runId: str = None):
+        self.path: str = path
+        self.config: Dict = config or {}
+        self.configId: str = hashlib.sha1(json.dumps(self.config, sort_keys=True, default=str).encode("utf-8")).hexdigest()[:12]
+        self.runId: str = runId or pd.Timestamp.now().strftime("%Y%m%d%H%M%S") + "-" + self.configId
+        self.records: List[Dict] = []
+        self._batches: Dict[tuple, int] = {}
+        self._lock = threading.Lock()
+        if os.path.dirname(os.path.abspath(path)):
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.emit({"stage": "run", "config": self.config})
+
+    def batch(self, factorList: List[str]) -> int:
+        """因子集合对应的批次编号(按首次出现的顺序, 与因子顺序无关)"""
+        key = tuple(sorted(factorList or []))
+        with self._lock:
+            return self._batches.setdefault(key, len(self._batches))
+
+    @staticmethod
+    def serverMemory(session: ddb.session) -> int:
+        """当前session在服务端占用的内存(字节), 获取失败时返回None"""
+        if session is None:
+            return None
+        try:
+            return int(session.run("exec sum(memSize) from getSessionMemoryStat() where sessionId == getCurrentSessionAndUser()[0]"))
+        except Exception:
+            return None
+
+    @staticmethod
+    def frameBytes(*frames) -> int:
+        """DataFrame的内存大小(作为上传/下载的传输量估计)"""
+        return int(sum(df.memory_usage(index=False).sum() for df in frames if isinstance(df, pd.DataFrame)))
+
+    @contextlib.contextmanager
+    def stage(self, name: str, session: ddb.session = None, factorList: List[str] = None, **fields):
+        """
+        记录一个阶段, with内可向返回的字典填写rowsIn/rowsOut/bytes等字段
+        阶段抛出异常时同样写入记录(error字段)后再抛出
+        """
+        record = {"stage": name, "rowsIn": None, "rowsOut": None, "bytes": None}
+        record.update(fields)
+        if factorList is not None:
+            record["batch"] = self.batch(factorList)
+            record["factorList"] = list(factorList)
+        start = time.perf_counter()
+        try:
+            yield record
+        except Exception as e:
+            record["error"] = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            record["seconds"] = round(time.perf_counter() - start, 6)
+            record["serverMemory"] = self.serverMemory(session)
+            self.emit(record)
+
+    def emit(self, record: Dict) -> None:
+        """追加一条记录"""
+        record = dict(runId=self.runId, configId=self.configId, time=pd.Timestamp.now().isoformat(), **record)
+        line = json.dumps(record, ensure_ascii=False, default=str)
+        with self._lock:
+            self.records.append(record)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+
+    def emitServerLog(self, log: pd.DataFrame, factorList: List[str] = None) -> None:
+        """将服务端阶段日志(SingleFactorAnalysis/InsertData的stageLog)逐条写为记录"""
+        batch = self.batch(factorList) if factorList is not None else None
+        for row in log.to_dict("records"):
+            record = {"stage": row["stage"], "seconds": float(row["seconds"]),
+                      "rowsIn": int(row["rowsIn"]), "rowsOut": int(row["rowsOut"]), "bytes": None, "serverMemory": None,
+                      "server": True}
+            if row.get("returnInterval") is not None and not pd.isna(row["returnInterval"]):
+                record["returnInterval"] = int(row["returnInterval"])
+            if batch is not None:
+                record["batch"] = batch
+                record["factorList"] = list(factorList)
+            self.emit(record)
+
+    @staticmethod
+    def load(path: str) -> pd.DataFrame:
+        """读取指标文件"""
+        with open(path, "r", encoding="utf-8") as f:
+            return pd.DataFrame([json.loads(line) for line in f if line.strip()])
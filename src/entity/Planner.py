@@ -0,0 +1,76 @@
+from typing import Dict, List
+from src.entity.Eva import Eva
+from src.utils.utils import split_list
+
+class BatchPlanner:
+    """
+    按内存预算规划因子批次
+    峰值内存 ≈ (标签面板行数 × (标签数 + 2) + Σ本批因子(标签面板行数 + 因子源表行数)) × 8B × memoryCopies + 结果表大小
+    标签面板为lj的左表, 其行数即透视后面板的行数; 行数均取自源表的count(*)
+    memoryCopies为计算过程中面板的副本数(透视、lj、排序/稠密矩阵等), 发生内存不足时通过shrink缩小后续批次
+    maxBatchSize为空时: 未配置memoryBudget则每批10个因子, 配置了memoryBudget则批次大小只由内存预算决定
+    """
+    def __init__(self, memoryBudget: int = None, memoryCopies: float = 4.0, maxBatchSize: int = None):
+        self.memoryBudget: int = memoryBudget
+        self.memoryCopies: float = float(memoryCopies)
+        if maxBatchSize:
+            self.maxBatchSize: int = max(int(maxBatchSize), 1)
+        else:
+            self.maxBatchSize: int = None if memoryBudget else 10
+
+    def baseBytes(self, panelRows: int, nLabels: int) -> int:
+        """与因子数无关的部分: 标签面板与主键列"""
+        return int(panelRows * (nLabels + 2) * 8 * self.memoryCopies)
+
+    def factorBytes(self, panelRows: int, factorRows: int, nPeriods: int, nIntervals: int, quantiles: int) -> int:
+        """单个因子带来的内存: 面板中的一列 + 透视前的因子数据 + 该因子的结果表"""
+        resultBytes = nPeriods * nIntervals * (10 * 40 + (3 + quantiles) * 8 + 8)  # 回归长表10个指标 + 分层回测一行
+        return int((panelRows + factorRows) * 8 * self.memoryCopies) + resultBytes
+
+    def estimate(self, factorRows: Dict[str, int], panelRows: int, nLabels: int,
+                 nPeriods: int, nIntervals: int, quantiles: int) -> int:
+        """估计一个批次的峰值内存(字节)"""
+        return self.baseBytes(panelRows, nLabels) + sum(
+            self.factorBytes(panelRows, rows, nPeriods, nIntervals, quantiles) for rows in factorRows.values())
+
+    def plan(self, evaObj: Eva, factorList: List[str]) -> List[List[str]]:
+        """
+        按源表行数与内存预算切分factorList(保持因子顺序)
+        未配置memoryBudget时退化为每批maxBatchSize个因子, 否则maxBatchSize(如有)为每批因子数的上限
+        """
+        if not self.memoryBudget:
+            return split_list(l=factorList, k=self.maxBatchSize)
+        labelList = [evaObj.barRetLabelName] + evaObj.futRetLabelNames
+        labelStats = evaObj.getSourceStats("label", labelList, evaObj.startDate, evaObj.endDate)
+        factorStats = evaObj.getSourceStats("factor", factorList, evaObj.startDate, evaObj.endDate)
+        panelRows = int(labelStats["rows"].max()) if not labelStats.empty else 0
+        factorRows = {str(row["indicator"]): int(row["rows"]) for _, row in factorStats.iterrows()}
+        nPeriods = len(evaObj.getTradeDates(evaObj.startDate, evaObj.endDate,
+                                              labelList=[evaObj.barRetLabelName] + evaObj.futRetLabelNames))
+        nIntervals = len(evaObj.returnIntervals)
+        available = self.memoryBudget - self.baseBytes(panelRows, len(labelList))
+        if available <= 0:
+            print(f"memoryBudget {self.memoryBudget / 1024 ** 3:.2f}GB is smaller than the label panel, evaluating one factor per batch")
+        batches, batch, batchBytes = [], [], 0
+        for factor in factorList:
+            cost = self.factorBytes(panelRows, factorRows.get(factor, 0), nPeriods, nIntervals, evaObj.quantile)
+            full = self.maxBatchSize is not None and len(batch) >= self.maxBatchSize
+            if batch and (batchBytes + cost > available or full):
+                batches.append(batch)
+                batch, batchBytes = [], 0
+            batch.append(factor)
+            batchBytes += cost
+        if batch:
+            batches.append(batch)
+        return batches
+
+    def split(self, factorList: List[str]) -> List[List[str]]:
+        """按当前maxBatchSize再次切分(shrink之后对尚未执行的批次生效), 不限批次大小时不切分"""
+        if self.maxBatchSize is None:
+            return [factorList]
+        return split_list(l=factorList, k=self.maxBatchSize)
+
+    def shrink(self, failedSize: int) -> int:
+        """批次内存不足后, 将后续批次的上限降为失败批次的一半"""
+        self.maxBatchSize = max(min(self.maxBatchSize or failedSize, failedSize // 2), 1)
+        return self.maxBatchSize
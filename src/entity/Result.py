@@ -1,9 +1,20 @@
+import json, hashlib, itertools, threading, tqdm
+import numpy as np
 import pandas as pd
 import dolphindb as ddb
 import streamlit as st
-from functools import lru_cache
-from typing import Dict, List
+from typing import Dict, List, Tuple
 from src.entity.Source import Source
+from src.entity.Cache import ResultCache
+from src.entity.Metrics import RunMetrics
+from src.entity.Manifest import RunManifest
+from src.entity.Transfer import DataTransfer
+from src.entity.Correlation import FactorCorrelation
+from src.backend.kernel import REG_INDICATORS, QUANTILE_METRICS
+from src.utils.utils import parse_bytes, split_list
+
+SWEEP_KEYS = ["callBackPeriod", "quantile", "dailyPnlLimit"]    # 参数扫描支持的评价参数(不影响取数)
+QUANTILE_METRIC_COLS = [i[0].lower() + i[1:] for i in QUANTILE_METRICS]    # 分层回测表中tradeTime之后的换手率&秩自相关列
 
 class Result(Source):
     def __init__(self, session: ddb.session):
@@ -18,6 +29,31 @@ class Result(Source):
         self.useMinFreqPeriod: bool = False
         self.barRetLabelName: str = ""
         self.futRetLabelNames: List[str] = []
+        self.nJobs: int = 1
+        self.concurrency: int = 1
+        self.memoryBudget: int = None
+        self.memoryCopies: float = 4.0
+        self.maxBatchSize: int = None      # 为空时固定分批为每批10个因子, 按内存预算分批时不限
+        self.resultCacheDir: str = None
+        self.resultCacheSize: int = 256
+        self.resultCacheDiskSize: int = 2 * 1024 ** 3
+        self.resultLayout: str = "long"
+        self.streamWrite: bool = False
+        self.writerThreads: int = 1
+        self.writerQueueSize: int = 4
+        self.metricsPath: str = None
+        self.manifestPath: str = None
+        self.transferProtocol: str = "ddb"
+        self.transferCompress: bool = False
+        self.fetchConcurrency: int = 1
+        self.chunkDays: int = None
+        self.shardFreq: str = None
+        self.corrCacheDir: str = "factorCorr"
+        self.corrMethod: str = "spearman"
+        self.corrBlockSize: int = 200
+        self.corrMinObs: int = 10
+        self.decayHorizons: List[int] = []
+        self.tableLock = threading.Lock()   # 维度表(long布局结果表/汇总表/版本表)的写入锁, 各session的worker(copy.copy)共用
 
     def setConfig(self, config: Dict):
         """初始化结果配置项"""
@@ -31,6 +67,45 @@ class Result(Source):
         self.useMinFreqPeriod = config["useMinFreqPeriod"]
         self.barRetLabelName = config["barRetLabelName"]
         self.futRetLabelNames = config["futRetLabelNames"]
+        self.backend = config.get("backend", "dolphindb")
+        self.nJobs = int(config.get("nJobs") or 1)
+        self.concurrency = int(config.get("concurrency") or 1)
+        self.cacheDir = config.get("cacheDir")
+        self.panelDir = config.get("panelDir")
+        self.panelDtype = config.get("panelDtype") or "float64"
+        self.memoryBudget = parse_bytes(config.get("memoryBudget"))
+        self.memoryCopies = float(config.get("memoryCopies") or 4.0)
+        self.maxBatchSize = int(config["maxBatchSize"]) if config.get("maxBatchSize") else None
+        self.resultCacheDir = config.get("resultCacheDir")
+        self.resultCacheSize = int(config.get("resultCacheSize") or 256)
+        self.resultCacheDiskSize = parse_bytes(config.get("resultCacheDiskSize") or 2 * 1024 ** 3)
+        self.resultLayout = config.get("resultLayout") or "long"
+        self.streamWrite = bool(config.get("streamWrite", False))
+        self.writerThreads = int(config.get("writerThreads") or 1)
+        self.writerQueueSize = int(config.get("writerQueueSize") or 4)
+        self.metricsPath = config.get("metricsPath")
+        self.manifestPath = config.get("manifestPath")
+        self.transferProtocol = config.get("transferProtocol") or "ddb"
+        self.transferCompress = bool(config.get("transferCompress", False))
+        self.fetchConcurrency = int(config.get("fetchConcurrency") or 1)
+        self.chunkDays = int(config["chunkDays"]) if config.get("chunkDays") else None
+        self.shardFreq = config.get("shardFreq")
+        self.corrCacheDir = config.get("corrCacheDir") or "factorCorr"
+        self.corrMethod = config.get("corrMethod") or "spearman"
+        self.corrBlockSize = int(config.get("corrBlockSize") or 200)
+        self.corrMinObs = int(config.get("corrMinObs") or 10)
+        self.decayHorizons = [int(i) for i in config.get("decayHorizons") or []]
+        self.metrics = RunMetrics(self.metricsPath, config=config) if self.metricsPath else None
+
+    def initTransfer(self, sessionConfig: Dict = None):
+        """按transferProtocol/transferCompress/fetchConcurrency创建传输层(需能新建session), 均为默认值时不使用"""
+        if self.transfer is not None:
+            self.transfer.close()
+            self.transfer = None
+        if not sessionConfig or (self.transferProtocol == "ddb" and not self.transferCompress and self.fetchConcurrency <= 1):
+            return
+        self.transfer = DataTransfer(sessionConfig, protocol=self.transferProtocol, compress=self.transferCompress,
+                                     size=self.fetchConcurrency)
 
     def initResDB(self, dropDB: bool = False):
         """
@@ -38,14 +113,18 @@ class Result(Source):
         """
         if dropDB and self.session.existsDatabase(self.resultDBName):
             self.session.dropDatabase(self.resultDBName)
+        if self.resultLayout == "wide":
+            self.initWideResDB()
         if not self.session.existsTable(dbUrl=self.resultDBName, tableName=self.resultTBName_Qua):
-            colName = ["factor","returnInterval","period"]+["quantileReturn"+str(i) for i in range(1, self.quantile+1)]+["tradeTime"]
-            colType = ["SYMBOL","INT","INT"]+["DOUBLE"]*self.quantile+["TIMESTAMP"]
+            colName = ["factor","returnInterval","period"]+["quantileReturn"+str(i) for i in range(1, self.quantile+1)]+["tradeTime"]+QUANTILE_METRIC_COLS
+            colType = ["SYMBOL","INT","INT"]+["DOUBLE"]*self.quantile+["TIMESTAMP"]+["DOUBLE"]*len(QUANTILE_METRIC_COLS)
             self.session.run(f"""
             db=database("{self.resultDBName}",RANGE,2010.01M+(0..30)*12,engine="OLAP")
             schemaTb=table(1:0,{colName}, {colType});
             t=db.createDimensionTable(table=schemaTb, tableName="{self.resultTBName_Qua}")
             """)    # DolphinDB 维度表 - 分层回测
+        self.addMissingColumns(tbName=self.resultTBName_Qua, colName=QUANTILE_METRIC_COLS,
+                               colType=["DOUBLE"]*len(QUANTILE_METRIC_COLS))   # 已有结果库: 追加换手率&秩自相关列
         if not self.session.existsTable(dbUrl=self.resultDBName, tableName=self.resultTBName_Reg):
             colName = ["factor","returnInterval","period","indicator","value","tradeTime"]
             colType = ["SYMBOL","INT","INT","SYMBOL","DOUBLE","TIMESTAMP"]
@@ -54,57 +133,498 @@ class Result(Source):
                 schemaTb=table(1:0,{colName},{colType});
                 t=db.createDimensionTable(table=schemaTb,tableName="{self.resultTBName_Reg}")
             """)
+        if not self.session.existsTable(dbUrl=self.resultDBName, tableName=self.resultTBName_Agg):
+            self.rebuildAgg()
+        if not self.session.existsTable(dbUrl=self.resultDBName, tableName=self.resultTBName_Version):
+            self.createDimensionTable(tbName=self.resultTBName_Version, colName=["factor","version","updateTime"],
+                                      colType=["SYMBOL","LONG","TIMESTAMP"], sortColumns=["factor","updateTime"])  # 各因子结果版本
+        if not self.session.existsTable(dbUrl=self.resultDBName, tableName=self.resultTBName_Decay):
+            self.createDimensionTable(tbName=self.resultTBName_Decay,
+                                      colName=["factor","horizon","year","indicator","cnt","sumValue","sumSquare"],
+                                      colType=["SYMBOL","INT","INT","SYMBOL","LONG","DOUBLE","DOUBLE"],
+                                      sortColumns=["factor","indicator","horizon","year"])    # IC衰减汇总
+
+    def addMissingColumns(self, tbName: str, colName: List[str], colType: List[str]) -> List[str]:
+        """结果表缺少colName中的列时追加(列名不区分大小写), 返回表的全部列名"""
+        table = f'loadTable("{self.resultDBName}","{tbName}")'
+        cols = self.session.run(f"exec name from schema({table}).colDefs").tolist()
+        existing = [c.lower() for c in cols]
+        missing = [(c, t) for c, t in zip(colName, colType) if c.lower() not in existing]
+        if missing:
+            self.session.run(f"addColumn({table}, {[c for c, _ in missing]}, {[t for _, t in missing]})")
+            cols += [c for c, _ in missing]
+        return cols
+
+    def createDimensionTable(self, tbName: str, colName: List[str], colType: List[str], sortColumns: List[str]):
+        """在结果库中创建维度表(宽表布局为TSDB库, 需要指定sortColumns)"""
+        sortArg = f", sortColumns={sortColumns}" if self.resultLayout == "wide" else ""
+        self.session.run(f"""
+            db=database("{self.resultDBName}");
+            schemaTb=table(1:0,{colName},{colType});
+            t=db.createDimensionTable(table=schemaTb,tableName="{tbName}"{sortArg})
+        """)
+
+    def initWideResDB(self):
+        """
+        宽表结果布局: 按月(RANGE) + 因子哈希(HASH)组合分区的TSDB库
+        regRes每个(factor, returnInterval, period)一行, 各指标为列; 两张表的排序键均为(factor, returnInterval, tradeTime)
+        keepDuplicates=LAST, 重复写入同一排序键时保留最新结果; atomic=CHUNK, 允许多个写入线程并发写同一分区
+        """
+        if not self.session.existsDatabase(self.resultDBName):
+            self.session.run(f"""
+            dbMonth = database(, RANGE, 2010.01M+(0..360))
+            dbFactor = database(, HASH, [SYMBOL, 50])
+            db = database("{self.resultDBName}", COMPO, [dbMonth, dbFactor], engine="TSDB", atomic="CHUNK")
+            """)
+        tables = {self.resultTBName_Qua: (["factor","returnInterval","period"]+["quantileReturn"+str(i) for i in range(1, self.quantile+1)]+["tradeTime"]+QUANTILE_METRIC_COLS,
+                                          ["SYMBOL","INT","INT"]+["DOUBLE"]*self.quantile+["TIMESTAMP"]+["DOUBLE"]*len(QUANTILE_METRIC_COLS)),
+                  self.resultTBName_Reg: (["factor","returnInterval","period","tradeTime"]+REG_INDICATORS,
+                                          ["SYMBOL","INT","INT","TIMESTAMP"]+["DOUBLE"]*len(REG_INDICATORS))}
+        for tbName, (colName, colType) in tables.items():
+            if not self.session.existsTable(dbUrl=self.resultDBName, tableName=tbName):
+                self.session.run(f"""
+                db=database("{self.resultDBName}");
+                schemaTb=table(1:0,{colName},{colType});
+                t=db.createPartitionedTable(table=schemaTb, tableName="{tbName}", partitionColumns=`tradeTime`factor,
+                    sortColumns=`factor`returnInterval`tradeTime, keepDuplicates=LAST)
+                """)    # DolphinDB 分区表 - 宽表布局
+
+    def regLongScript(self, where: str, indicators: List[str] = None) -> str:
+        """
+        读取IC法&回归法结果为服务端长表pt(factor, returnInterval, period, indicator, value, tradeTime)
+        兼容长表/宽表两种结果布局, indicators为空时读取全部指标
+        """
+        regTable = f'loadTable("{self.resultDBName}","{self.resultTBName_Reg}")'
+        if self.resultLayout == "wide":
+            indicators = indicators or REG_INDICATORS
+            return f"""
+            pt = select factor, returnInterval, period, tradeTime, {",".join(indicators)} from {regTable} where {where}
+            pt = unpivot(pt, `factor`returnInterval`period`tradeTime, {indicators})
+            rename!(pt, `valueType, `indicator)
+            pt = select factor, returnInterval, period, indicator, value, tradeTime from pt
+            """
+        indicatorWhere = f"indicator in {indicators} and " if indicators else ""
+        return f"""
+            pt = select factor, returnInterval, period, indicator, value, tradeTime from {regTable} where {indicatorWhere}({where})
+            """
+
+    def insertScript(self, logFunc: str = None) -> str:
+        """将服务端的summary_res(长表), quantile_res插入结果库并更新汇总表与结果版本(幂等, 可重复写入)"""
+        return self.insertDataScript(logFunc=logFunc) + self.updateMetaScript()
+
+    def insertDataScript(self, logFunc: str = None) -> str:
+        """
+        写入结果表(宽表布局的分区表允许多个session并发写入), 同一(factor, returnInterval, tradeTime)的旧结果被替换:
+        长表布局由UpsertData删除覆盖范围内的旧结果后插入, 宽表布局由keepDuplicates=LAST保留最新结果
+        被替换的IC&RankIC记为replaced_, 由updateMetaScript从汇总表中扣除
+        logFunc: 服务端阶段日志函数的变量名, 不为空时InsertData记录耗时与行数
+        """
+        wide = self.resultLayout == "wide"
+        regData = "summary_res" if not wide else f"ToWideReg(summary_res, {REG_INDICATORS})"
+        insertFunc = "UpsertData" if not wide else "InsertData"
+        logArg = f", logFunc={logFunc}" if logFunc else ""
+        return f"""
+        replaced_ = ReplacedIC(DBName="{self.resultDBName}", TBName="{self.resultTBName_Reg}", data=summary_res, wide={str(wide).lower()});
+        {insertFunc}(DBName="{self.resultDBName}", TBName="{self.resultTBName_Reg}", 
+                            data={regData}, batchsize=1000000{logArg});
+        {insertFunc}(DBName="{self.resultDBName}", TBName="{self.resultTBName_Qua}", 
+                            data=quantile_res, batchsize=1000000{logArg});
+        """
+
+    def insertUploaded(self, logFunc: str = None) -> None:
+        """
+        将当前session中的summary_res, quantile_res写库: 维度表不支持并发写入, 汇总表/版本表为读改写, 均持有tableLock串行执行
+        宽表布局的结果表(分区表)在锁外写入
+        """
+        if self.resultLayout == "wide":
+            self.session.run(self.insertDataScript(logFunc=logFunc))
+            with self.tableLock:
+                self.session.run(self.updateMetaScript())
+        else:
+            with self.tableLock:
+                self.session.run(self.insertScript(logFunc=logFunc))
+
+    def updateMetaScript(self) -> str:
+        """更新汇总表与结果版本(维度表, 不支持并发写入), 需在同一session的insertDataScript之后执行"""
+        return f"""
+        UpdateAgg(DBName="{self.resultDBName}", TBName="{self.resultTBName_Agg}", data=summary_res, replaced=replaced_);
+        BumpVersion(DBName="{self.resultDBName}", TBName="{self.resultTBName_Version}", data=summary_res);
+        """
+
+    def migrateResult(self, srcDBName: str, srcRegTbName: str = None, srcQuaTbName: str = None, batchSize: int = 100):
+        """
+        将已有的长表结果(原维度表布局)迁移至当前结果库/布局, 按因子分批读取与写入
+        需先initDef与initResDB; 宽表布局下重复迁移不会产生重复数据
+        """
+        srcRegTbName = srcRegTbName or self.resultTBName_Reg
+        srcQuaTbName = srcQuaTbName or self.resultTBName_Qua
+        factorList = self.session.run(f"""
+            exec distinct(factor) from loadTable("{srcDBName}","{srcRegTbName}")
+        """).tolist()
+        srcCols = [c.lower() for c in self.session.run(
+            f'exec name from schema(loadTable("{srcDBName}","{srcQuaTbName}")).colDefs').tolist()]
+        quaCols = self.session.run(
+            f'exec name from schema(loadTable("{self.resultDBName}","{self.resultTBName_Qua}")).colDefs').tolist()
+        quaSelect = ", ".join(c if c.lower() in srcCols else f"double(NULL) as {c}" for c in quaCols)  # 原结果缺少的列(换手率&秩自相关)为空
+        for factors in tqdm.tqdm(split_list(l=sorted(factorList), k=batchSize), desc="Migrating..."):
+            self.session.upload({"factorList_": factors})
+            self.session.run(f"""
+            summary_res = select factor, returnInterval, period, indicator, value, tradeTime 
+                from loadTable("{srcDBName}","{srcRegTbName}") where factor in factorList_
+            quantile_res = select {quaSelect} from loadTable("{srcDBName}","{srcQuaTbName}") where factor in factorList_
+            {self.insertScript()}
+            undef(`summary_res`quantile_res`replaced_`factorList_);
+            """)
+
+    def rebuildAgg(self, factorList: List[str] = None):
+        """
+        由结果表重新生成IC&RankIC汇总表(已有结果库的迁移/修复), factorList为空时重建全部因子
+        汇总表: factor, returnInterval, year, indicator, cnt, sumValue(Σ), sumSquare(Σ²)
+        """
+        if not self.session.existsTable(dbUrl=self.resultDBName, tableName=self.resultTBName_Agg):
+            self.createDimensionTable(tbName=self.resultTBName_Agg,
+                                      colName=["factor","returnInterval","year","indicator","cnt","sumValue","sumSquare"],
+                                      colType=["SYMBOL","INT","INT","SYMBOL","LONG","DOUBLE","DOUBLE"],
+                                      sortColumns=["factor","indicator","returnInterval","year"])    # IC&RankIC汇总
+        self.session.upload({"factorList": factorList or []})
+        self.session.run(f"""
+            t = loadTable("{self.resultDBName}","{self.resultTBName_Agg}")
+            {self.regLongScript(where="size(factorList)==0 or factor in factorList", indicators=["IC", "RankIC"])}
+            aggData = select count(value) as cnt, sum(value) as sumValue, sum2(value) as sumSquare 
+                from pt group by factor, returnInterval, year(tradeTime) as year, indicator
+            if (size(factorList)==0){{
+                delete from t
+            }}else{{
+                delete from t where factor in factorList
+            }}
+            t.append!(aggData)
+            undef(`pt);
+        """)
+
+    def getWatermark(self, factorList: List[str]) -> pd.DataFrame:
+        """
+        获取各(因子, returnInterval)已评价的最新时间(水位线)
+        返回: factor, returnInterval, regTime(IC法&回归法结果), quaTime(分层回测结果)
+        """
+        if not self.session.existsTable(dbUrl=self.resultDBName, tableName=self.resultTBName_Qua):
+            return pd.DataFrame(columns=["factor", "returnInterval", "regTime", "quaTime"])
+        self.session.upload({"factorList": factorList})
+        return self.session.run(f"""
+            qua = select max(tradeTime) as quaTime from loadTable("{self.resultDBName}","{self.resultTBName_Qua}")
+                where factor in factorList group by factor, returnInterval
+            reg = select max(tradeTime) as regTime from loadTable("{self.resultDBName}","{self.resultTBName_Reg}")
+                where factor in factorList group by factor, returnInterval
+            select factor, returnInterval, regTime, quaTime from lj(qua, reg, `factor`returnInterval)
+        """)
+
+    def getIncrementalStart(self, watermark: pd.DataFrame, factorList: List[str]) -> Tuple[pd.Timestamp, int]:
+        """
+        增量评价的数据起始日期与periodOffset
+        在最早的水位线之前预留max(returnIntervals)+callBackPeriod个交易日, 用于调仓分组与回看窗口
+        任一(因子, returnInterval)尚无结果时从startDate开始全量评价; 返回(None, None)表示没有新数据
+        """
+        if not self.dailyFreq and not self.useMinFreqPeriod:
+            raise ValueError("incremental evaluation requires period == quantilePeriod (dailyFreq or useMinFreqPeriod)")
+        tradeDates = self.getTradeDates(startDate=self.startDate, endDate=self.endDate,
+                                         labelList=[self.barRetLabelName] + self.futRetLabelNames)
+        covered = watermark[watermark["factor"].isin(factorList) & watermark["returnInterval"].isin(self.returnIntervals)]
+        if len(covered) < len(set(factorList)) * len(self.returnIntervals):
+            return self.startDate, 0
+        lastTime = covered[["regTime", "quaTime"]].min(axis=1).min()
+        idx = int(np.searchsorted(tradeDates.values, np.datetime64(lastTime), side="right"))
+        if idx >= len(tradeDates):
+            return None, None
+        startIdx = max(idx - (max(self.returnIntervals) + self.callBackPeriod), 0)
+        return tradeDates[startIdx], startIdx
+
+    def planChunks(self, chunkDays: int = None, shardFreq: str = None) -> List[Dict]:
+        """
+        分块评价: 按chunkDays个交易日(或shardFreq: Y/Q/M自然年/季/月)切分startDate~endDate,
+        每块只需加载该块及其预热数据, 内存与总时长无关; 各块相互独立, 可以并行评价
+        预热: 回看窗口(callBackPeriod)及块内首个调仓时刻的上一调仓时刻(各returnInterval, 用于首个时刻的分组及换手率&秩自相关)所在的交易日
+        periodOffset/quantilePeriodOffset为预热起点之前的period/quantilePeriod数, 使编号与调仓时刻与整段评价一致
+        返回各块的startDate, endDate(取数范围), fromTime, untilTime(本块负责的结果时间范围), lastRegTime, lastQuaTime
+        (本块最后一个period/quantilePeriod的时间), periodOffset, quantilePeriodOffset
+        """
+        times = self.getTradeDates(startDate=self.startDate, endDate=self.endDate,
+                                    labelList=[self.barRetLabelName] + self.futRetLabelNames)
+        days, bars = np.unique(times.normalize().values, return_counts=True)
+        quaCum = np.cumsum(bars)    # 每日结束时累计的quantilePeriod数
+        minToDaily = not self.dailyFreq and not self.useMinFreqPeriod    # 分钟频->日频: 每日一个period
+        regCum = np.arange(1, len(days) + 1) if minToDaily else quaCum
+        if shardFreq:
+            if shardFreq not in ["Y", "Q", "M"]:
+                raise ValueError(f"shardFreq must be one of Y/Q/M, got {shardFreq}")
+            labels = pd.DatetimeIndex(days).to_period(shardFreq)
+            starts = np.flatnonzero(np.append(True, labels[1:] != labels[:-1])) if len(days) else np.array([], dtype=int)
+        else:
+            starts = np.arange(0, len(days), max(int(chunkDays), 1))
+        chunks = []
+        for i, j in zip(starts, np.append(starts[1:], len(days))):
+            i, j = int(i), int(j)
+            firstReg = (regCum[i - 1] if i > 0 else 0) + 1
+            firstQua = (quaCum[i - 1] if i > 0 else 0) + 1
+            needReg = max(firstReg - (self.callBackPeriod - 1), 1)
+            needQua = max(min(-(-firstQua // k) * k - k for k in self.returnIntervals), 1)    # 块内首个调仓时刻的上一调仓时刻
+            start = int(min(np.searchsorted(regCum, needReg), np.searchsorted(quaCum, needQua)))
+            chunks.append({"startDate": pd.Timestamp(days[start]) if start > 0 else self.startDate,
+                           "endDate": pd.Timestamp(days[j]) if j < len(days) else self.endDate,
+                           "fromTime": pd.Timestamp(days[i]) if i > 0 else None,
+                           "untilTime": pd.Timestamp(days[j]) if j < len(days) else None,
+                           "lastRegTime": pd.Timestamp(days[j - 1]) if minToDaily else times[quaCum[j - 1] - 1],
+                           "lastQuaTime": times[quaCum[j - 1] - 1],
+                           "periodOffset": int(regCum[start - 1]) if start > 0 else 0,
+                           "quantilePeriodOffset": int(quaCum[start - 1]) if start > 0 else 0})
+        return chunks
+
+    def chunkWatermark(self, chunk: Dict, factorList: List[str], watermark: pd.DataFrame = None) -> pd.DataFrame:
+        """
+        分块评价的水位线: fromTime之前的结果(预热部分)由前一块产生, 与增量评价的水位线取较晚者;
+        untilTime及之后的结果由后一块产生(取数终点为下一块首日)
+        """
+        keys = pd.MultiIndex.from_product([list(dict.fromkeys(factorList)), self.returnIntervals],
+                                          names=["factor", "returnInterval"])
+        bound = chunk["fromTime"] - pd.Timedelta(milliseconds=1) if chunk["fromTime"] is not None else pd.NaT
+        res = pd.DataFrame({"regTime": bound, "quaTime": bound, "untilTime": chunk["untilTime"]}, index=keys)
+        res = res.astype({"regTime": "datetime64[ns]", "quaTime": "datetime64[ns]", "untilTime": "datetime64[ns]"})
+        if watermark is not None and not watermark.empty:
+            old = watermark.set_index(["factor", "returnInterval"])[["regTime", "quaTime"]].reindex(keys)
+            for col in ["regTime", "quaTime"]:
+                res[col] = pd.concat([res[col], pd.to_datetime(old[col])], axis=1).max(axis=1)
+        return res.reset_index()
+
+    def chunkCovered(self, chunk: Dict, watermark: pd.DataFrame, factorList: List[str]) -> bool:
+        """增量分块评价: 所有(因子, returnInterval)的水位线都已达到该块末尾时跳过该块"""
+        if watermark is None:
+            return False
+        covered = watermark[watermark["factor"].isin(factorList) & watermark["returnInterval"].isin(self.returnIntervals)]
+        if len(covered) < len(set(factorList)) * len(self.returnIntervals):
+            return False
+        return bool((pd.to_datetime(covered["regTime"]) >= chunk["lastRegTime"]).all()
+                    and (pd.to_datetime(covered["quaTime"]) >= chunk["lastQuaTime"]).all())
+
+    @staticmethod
+    def filterWatermark(summary_res: pd.DataFrame, quantile_res: pd.DataFrame,
+                        watermark: pd.DataFrame) -> Tuple[pd.DataFrame, pd.DataFrame]:
+        """只保留水位线之后的新结果(水位线含untilTime列时同时去掉untilTime及之后的结果)"""
+        if watermark is None or watermark.empty:
+            return summary_res, quantile_res
+        keys = ["factor", "returnInterval"]
+        until = ["untilTime"] if "untilTime" in watermark.columns else []
+        res = []
+        for df, timeCol in [(summary_res, "regTime"), (quantile_res, "quaTime")]:
+            df = df.merge(watermark[keys + [timeCol] + until], on=keys, how="left")
+            mask = df[timeCol].isna() | (df["TradeTime"] > df[timeCol])
+            if until:
+                mask &= df["untilTime"].isna() | (df["TradeTime"] < df["untilTime"])
+            res.append(df[mask].drop(columns=[timeCol] + until).reset_index(drop=True))
+        return res[0], res[1]
+
+    def getResultVersion(self) -> Dict[str, Tuple[int, str]]:
+        """各因子的结果版本(每次写库+1)与更新时间, 版本表不存在时返回空字典"""
+        if not self.session.existsTable(dbUrl=self.resultDBName, tableName=self.resultTBName_Version):
+            return {}
+        df = self.session.run(f"""select factor, version, updateTime from loadTable("{self.resultDBName}","{self.resultTBName_Version}")""")
+        return {f: (int(v), pd.Timestamp(t).isoformat()) for f, v, t in zip(df["factor"], df["version"], df["updateTime"])}
+
+    def resultVersionKey(self, factor: str = None):
+        """
+        看板缓存的版本标识: 单个因子为(版本, 更新时间), factor为空时为所有因子版本的摘要
+        更新时间区分dropDB前后版本号相同的结果
+        """
+        versions = self.getResultVersion()
+        if factor is not None:
+            return list(versions.get(factor, (0, None)))
+        content = json.dumps(sorted([f, v, t] for f, (v, t) in versions.items()))
+        return hashlib.sha1(content.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def sweepGrid(axes: Dict[str, List]) -> List[Dict]:
+        """参数网格的笛卡尔积, 如{"quantile": [5, 10], "callBackPeriod": [1, 5]} -> 4组配置"""
+        keys = list(axes)
+        return [dict(zip(keys, values)) for values in itertools.product(*[axes[k] for k in keys])]
+
+    def evalConfig(self) -> Dict:
+        """决定评价结果的配置: 数据源、区间(已解析的起止日期)与评价参数"""
+        return {"factorDBName": self.factorDBName, "factorTBName": self.factorTBName,
+                "factorCondition": self.factorCondition, "labelDBName": self.labelDBName,
+                "labelTBName": self.labelTBName, "labelCondition": self.labelCondition,
+                "startDate": pd.Timestamp(self.startDate).strftime("%Y%m%d"),
+                "endDate": pd.Timestamp(self.endDate).strftime("%Y%m%d"),
+                "dailyFreq": self.dailyFreq, "useMinFreqPeriod": self.useMinFreqPeriod,
+                "returnIntervals": self.returnIntervals, "barRetLabelName": self.barRetLabelName,
+                "futRetLabelNames": self.futRetLabelNames, "callBackPeriod": self.callBackPeriod,
+                "quantile": self.quantile, "dailyPnlLimit": self.dailyPnlLimit}
+
+    def runManifest(self, resume: bool = False, incremental: bool = False) -> RunManifest:
+        """批量评价的运行清单(未配置manifestPath时为None), 配置包含结果库与分块方式"""
+        if not self.manifestPath:
+            return None
+        config = self.evalConfig()
+        config.update({"resultDBName": self.resultDBName, "resultTBName_Reg": self.resultTBName_Reg,
+                       "resultTBName_Qua": self.resultTBName_Qua, "resultLayout": self.resultLayout,
+                       "chunkDays": self.chunkDays, "shardFreq": self.shardFreq, "incremental": bool(incremental)})
+        return RunManifest(self.manifestPath, config=config, resume=resume)
+
+    def sweepConfigs(self, grid: List[Dict]) -> Dict[str, Dict]:
+        """
+        参数扫描的各配置: 在当前配置上覆盖grid中的评价参数(SWEEP_KEYS), 返回configId -> 配置
+        configId由数据源、区间与全部评价参数生成, 同一配置重复扫描时覆盖原结果
+        """
+        configs = {}
+        for params in grid:
+            unknown = set(params) - set(SWEEP_KEYS)
+            if unknown:
+                raise ValueError(f"sweep only supports {SWEEP_KEYS}, got {sorted(unknown)}")
+            config = self.evalConfig()
+            config.update(params)
+            config["callBackPeriod"] = int(config["callBackPeriod"])
+            config["quantile"] = int(config["quantile"])
+            config["dailyPnlLimit"] = float(config["dailyPnlLimit"]) if config["dailyPnlLimit"] is not None else None
+            configId = hashlib.sha1(json.dumps(config, sort_keys=True, default=str).encode("utf-8")).hexdigest()[:12]
+            configs[configId] = config
+        return configs
+
+    def initSweepDB(self, maxQuantile: int) -> List[str]:
+        """创建参数扫描结果表与配置表(分层回测表的分组列不足时追加), 返回分层回测表的列名"""
+        if not self.session.existsTable(dbUrl=self.resultDBName, tableName=self.resultTBName_SweepReg):
+            self.createDimensionTable(tbName=self.resultTBName_SweepReg,
+                                      colName=["configId","factor","returnInterval","period","indicator","value","tradeTime"],
+                                      colType=["SYMBOL","SYMBOL","INT","INT","SYMBOL","DOUBLE","TIMESTAMP"],
+                                      sortColumns=["configId","factor","returnInterval","tradeTime"])
+        quaCols = ["quantileReturn" + str(i) for i in range(1, int(maxQuantile) + 1)]
+        if not self.session.existsTable(dbUrl=self.resultDBName, tableName=self.resultTBName_SweepQua):
+            self.createDimensionTable(tbName=self.resultTBName_SweepQua,
+                                      colName=["configId","factor","returnInterval","period"] + quaCols + ["tradeTime"] + QUANTILE_METRIC_COLS,
+                                      colType=["SYMBOL","SYMBOL","INT","INT"] + ["DOUBLE"] * len(quaCols) + ["TIMESTAMP"]
+                                              + ["DOUBLE"] * len(QUANTILE_METRIC_COLS),
+                                      sortColumns=["configId","factor","returnInterval","tradeTime"])
+        if not self.session.existsTable(dbUrl=self.resultDBName, tableName=self.resultTBName_SweepConfig):
+            self.createDimensionTable(tbName=self.resultTBName_SweepConfig, colName=["configId","config","updateTime"],
+                                      colType=["SYMBOL","STRING","TIMESTAMP"], sortColumns=["configId","updateTime"])
+        # 之前的扫描使用了更少的分组/没有换手率&秩自相关列时追加
+        return self.addMissingColumns(tbName=self.resultTBName_SweepQua, colName=quaCols + QUANTILE_METRIC_COLS,
+                                      colType=["DOUBLE"] * (len(quaCols) + len(QUANTILE_METRIC_COLS)))
+
+    def saveSweepConfigs(self, configs: Dict[str, Dict]):
+        """写入(覆盖)configId -> 配置(JSON)"""
+        self.session.upload({"sweepConfig_": pd.DataFrame({"configId": list(configs),
+                                                           "config": [json.dumps(c, sort_keys=True, default=str) for c in configs.values()]})})
+        self.session.run(f"""
+        t = loadTable("{self.resultDBName}","{self.resultTBName_SweepConfig}")
+        configIds_ = exec configId from sweepConfig_
+        delete from t where configId in configIds_
+        t.append!(select configId, config, now() as updateTime from sweepConfig_)
+        undef(`sweepConfig_`configIds_);
+        """)
+
+    def sweepInsertScript(self, configId: str, quantiles: int, quaCols: List[str]) -> str:
+        """服务端的summary_res/quantile_res标记configId后覆盖写入参数扫描结果表(需先上传factorList)"""
+        select = []
+        for col in quaCols:     # 按表的列顺序, 多余的分组列为空
+            if col == "configId":
+                select.append(f'"{configId}" as configId')
+            elif col == "tradeTime":
+                select.append("TradeTime as tradeTime")
+            elif col.lower().startswith("quantilereturn"):
+                i = int(col[len("quantileReturn"):])
+                select.append(f"QuantileReturn{i} as {col}" if i <= int(quantiles) else f"double(NULL) as {col}")
+            else:
+                select.append(col)
+        return f"""
+        summary_res = select "{configId}" as configId, factor, returnInterval, period, indicator, value, TradeTime as tradeTime from summary_res
+        quantile_res = select {", ".join(select)} from quantile_res
+        tReg_ = loadTable("{self.resultDBName}","{self.resultTBName_SweepReg}")
+        tQua_ = loadTable("{self.resultDBName}","{self.resultTBName_SweepQua}")
+        delete from tReg_ where configId == "{configId}" and factor in factorList
+        delete from tQua_ where configId == "{configId}" and factor in factorList
+        InsertData(DBName="{self.resultDBName}", TBName="{self.resultTBName_SweepReg}", data=summary_res, batchsize=1000000);
+        InsertData(DBName="{self.resultDBName}", TBName="{self.resultTBName_SweepQua}", data=quantile_res, batchsize=1000000);
+        undef(`tReg_`tQua_);
+        """
 
 class Stats(Result):    # for EvaPlot
     def __init__(self, session: ddb.session):
         super().__init__(session)
 
-    @lru_cache(maxsize=128)
+    def resultCache(self) -> ResultCache:
+        return ResultCache(cacheDir=self.resultCacheDir, maxsize=self.resultCacheSize, diskBytes=self.resultCacheDiskSize)
+
+    def cacheConfig(self) -> Dict:
+        """影响看板结果形状的配置项(参与缓存key)"""
+        return {"quantile": int(self.quantile), "returnIntervals": [int(i) for i in self.returnIntervals],
+                "resultLayout": self.resultLayout}
+
+    @staticmethod
+    def aggStat(agg: pd.DataFrame, stat: str) -> pd.Series:
+        """由(cnt, Σ, Σ²)精确计算均值(mean)或IR(均值/样本标准差)"""
+        cnt = agg["cnt"].where(agg["cnt"] > 0)
+        mean = agg["sumValue"] / cnt
+        if stat == "mean":
+            return mean
+        var = ((agg["sumSquare"] - agg["sumValue"] * mean) / (cnt - 1).where(cnt > 1)).clip(lower=0)
+        return mean / np.sqrt(var)
+
+    def _timedQuery(self, name: str, query, factorList: List[str] = None, **fields) -> Dict[str, pd.DataFrame]:
+        """看板查询(缓存未命中时)的指标: 返回的行数与下载量"""
+        with self.stage(name, factorList=factorList, **fields) as record:
+            resDict = query()
+            frames = [df for df in resDict.values() if isinstance(df, pd.DataFrame)]
+            record["rowsOut"] = sum(len(df) for df in frames)
+            if self.metrics is not None:
+                record["bytes"] = self.metrics.frameBytes(*frames)
+        return resDict
+
     def get_summaryData(self, rInterval: int) -> Dict[str, pd.DataFrame]:
-        resDict = self.session.run(rf"""
-        /* 取数 */
-        pt = select ReturnInterval,period,factor,indicator,value,tradeTime 
-            from loadTable("{self.resultDBName}","{self.resultTBName_Reg}") 
-            where ReturnInterval == int({rInterval}) and indicator in ["IC","RankIC"]
-        update pt set yearInt = year(tradeTime);
-        update pt set yearStr = "Year"+string(yearInt)
-        year_list = sort(exec distinct(yearInt) from pt)
-
-        /* avg(IC) */
-        TotalIC_pt = select avg(value) as Total from pt where indicator == "IC" group by factor
-        sortBy!(TotalIC_pt,`factor)
-        YearIC_pt = select avg(value) as value from pt where indicator == "IC" pivot by factor, yearStr
-        YearIC_pt = sql(select=[sqlCol(`factor)].append!(sqlCol("Year"+string(year_list))), from=YearIC_pt).eval()
-        TotalIC_pt = lj(TotalIC_pt, YearIC_pt, `factor)
-
-        /* avg(RankIC) */
-        TotalRankIC_pt = select avg(value) as Total from pt where indicator == "RankIC" group by factor 
-        sortBy!(TotalRankIC_pt,`factor)
-        YearRankIC_pt = select avg(value) as value from pt where indicator == "RankIC" pivot by factor, yearStr
-        YearRankIC_pt = sql(select=[sqlCol(`factor)].append!(sqlCol("Year"+string(year_list))), from=YearRankIC_pt).eval()
-        TotalRankIC_pt = lj(TotalRankIC_pt, YearRankIC_pt, `factor)
-
-        /* avg(IC)\std(IC) */
-        TotalICIR_pt = select avg(value)\std(value) as Total from pt where indicator == "IC" group by factor
-        sortBy!(TotalICIR_pt,`factor)
-        YearICIR_pt = select avg(value)\std(value) as value from pt where indicator == "IC" pivot by factor, yearStr
-        YearICIR_pt = sql(select=[sqlCol(`factor)].append!(sqlCol("Year"+string(year_list))), from=YearICIR_pt).eval()
-        TotalICIR_pt = lj(TotalICIR_pt, YearICIR_pt, `factor)
-
-        /* avg(RankIC)\std(RankIC) */
-        TotalRankICIR_pt = select avg(value)\std(value) as Total from pt where indicator == "RankIC" group by factor
-        sortBy!(TotalRankICIR_pt,`factor)
-        YearRankICIR_pt = select avg(value)\std(value) as value from pt where indicator == "RankIC" pivot by factor, yearStr
-        YearRankICIR_pt = sql(select=[sqlCol(`factor)].append!(sqlCol("Year"+string(year_list))), from=YearRankICIR_pt).eval()
-        TotalRankICIR_pt = lj(TotalRankICIR_pt, YearRankICIR_pt, `factor)
-
-        /* 返回结果 */
-        res_dict = dict(["TotalIC","TotalRankIC","TotalICIR","TotalRankICIR"], 
-                        [TotalIC_pt,TotalRankIC_pt,TotalICIR_pt,TotalRankICIR_pt])
-        res_dict
-        """)
+        """
+        所有因子的avg(IC), avg(RankIC), ICIR, RankICIR(全区间Total + 分年度)
+        读取汇总表(因子数×年数行, 由initResDB/rebuildAgg创建, 不存在时返回空结果); 结果按所有因子版本的摘要缓存
+        """
+        return self.resultCache().get(self.resultDBName, self.resultTBName_Agg, "", rInterval, self.resultVersionKey(),
+                                      lambda: self._timedQuery("stats:summary", lambda: self._summaryData(rInterval),
+                                                                       rInterval=int(rInterval)),
+                                      config=self.cacheConfig())
+
+    def _summaryData(self, rInterval: int) -> Dict[str, pd.DataFrame]:
+        cols = ["cnt", "sumValue", "sumSquare"]
+        if self.session.existsTable(dbUrl=self.resultDBName, tableName=self.resultTBName_Agg):
+            agg = self.fetchGroups([(f"""
+                agg_ = select factor, year, indicator, cnt, sumValue, sumSquare from loadTable("{self.resultDBName}","{self.resultTBName_Agg}")
+                where returnInterval == int({rInterval})
+            """, {"agg": "agg_"})])["agg"]
+        else:   # 只读: 汇总表由initResDB/rebuildAgg创建, 不存在时返回空结果
+            agg = pd.DataFrame({"factor": pd.Series(dtype=object), "year": pd.Series(dtype=int),
+                                "indicator": pd.Series(dtype=object), **{c: pd.Series(dtype=float) for c in cols}})
+        resDict = {}
+        for name, indicator, stat in [("TotalIC", "IC", "mean"), ("TotalRankIC", "RankIC", "mean"),
+                                      ("TotalICIR", "IC", "ir"), ("TotalRankICIR", "RankIC", "ir")]:
+            df = agg[agg["indicator"] == indicator]
+            total = df.groupby("factor")[cols].sum()
+            yearly = df.groupby(["factor", "year"])[cols].sum()
+            yearDF = self.aggStat(yearly, stat).unstack("year").sort_index(axis=1)
+            yearDF.columns = ["Year" + str(int(i)) for i in yearDF.columns]
+            res = pd.DataFrame({"Total": self.aggStat(total, stat)}).join(yearDF)
+            resDict[name] = res.sort_index().rename_axis("factor").reset_index()
         return resDict
 
+    def sweepSummary(self, rInterval: int, factorList: List[str] = None) -> pd.DataFrame:
+        """参数扫描结果比较: 各(configId, 因子)全区间的avg(IC), avg(RankIC), ICIR, RankICIR及该配置的评价参数"""
+        self.session.upload({"factorList_": factorList or []})
+        agg = self.session.run(f"""
+            select count(value) as cnt, sum(value) as sumValue, sum2(value) as sumSquare
+            from loadTable("{self.resultDBName}","{self.resultTBName_SweepReg}")
+            where returnInterval == int({rInterval}) and indicator in ["IC","RankIC"] and (size(factorList_)==0 or factor in factorList_)
+            group by configId, factor, indicator
+        """)
+        configs = self.session.run(f"""select configId, config from loadTable("{self.resultDBName}","{self.resultTBName_SweepConfig}")""")
+        cols = ["cnt", "sumValue", "sumSquare"]
+        res = pd.DataFrame({name: self.aggStat(agg[agg["indicator"] == indicator].set_index(["configId", "factor"])[cols], stat)
+                            for name, indicator, stat in [("IC", "IC", "mean"), ("RankIC", "RankIC", "mean"),
+                                                          ("ICIR", "IC", "ir"), ("RankICIR", "RankIC", "ir")]})
+        params = pd.DataFrame([{"configId": i, **{k: json.loads(c).get(k) for k in SWEEP_KEYS}}
+                               for i, c in zip(configs["configId"], configs["config"])], columns=["configId"] + SWEEP_KEYS)
+        return res.reset_index().merge(params, on="configId", how="left").sort_values(["factor", "configId"]).reset_index(drop=True)
+
     def summaryPlot_(self) -> None:
         """
         所有因子横向比较可视化
@@ -132,14 +652,21 @@ class Stats(Result):    # for EvaPlot
         st.subheader("All Factors' RankICIR", divider=True)
         st.dataframe(data=TotalRankICIR_df, height=1000)
 
-    @lru_cache(maxsize=128)
     def get_factorData(self, factor: str, rInterval: int) -> Dict[str, pd.DataFrame]:
-        resDict = self.session.run(rf"""
-            pt=select * from loadTable("{self.resultDBName}","{self.resultTBName_Reg}") 
-                where factor == "{factor}" and ReturnInterval=={rInterval}
-            quantile_pt=select * from loadTable("{self.resultDBName}","{self.resultTBName_Qua}") 
-                where factor == "{factor}";
+        """单因子评价结果(按该因子的结果版本缓存)"""
+        return self.resultCache().get(self.resultDBName, self.resultTBName_Reg, factor, rInterval, self.resultVersionKey(factor),
+                                      lambda: self._timedQuery("stats:factor", lambda: self._factorData(factor, rInterval),
+                                                                       factorList=[factor], rInterval=int(rInterval)),
+                                      config=self.cacheConfig())
 
+    def _factorData(self, factor: str, rInterval: int) -> Dict[str, pd.DataFrame]:
+        """
+        单因子评价结果的各表: 回归法、IC法与各returnInterval的分层回测为相互独立的查询组,
+        每组只读取所需的指标/行, 配置了传输层时由session池并发下载(fetchGroups)
+        """
+        where = f'factor == "{factor}" and returnInterval == {int(rInterval)}'
+        regScript = rf"""
+            {self.regLongScript(where=where, indicators=["R_OLS", "Obs", "Std_Error", "R_square", "Adj_square", "R_tstat"])}
             /* 因子收益率&累计因子收益率 */
             R=select value from pt where indicator ="R_OLS" pivot by tradeTime,indicator;
             R_cumsum=R.copy();
@@ -157,7 +684,10 @@ class Stats(Result):    # for EvaPlot
             // Tstat
             t_stat = select value from pt where indicator == "R_tstat" pivot by tradeTime,indicator;
             // alpha_tStat = select value from pt where indicator == "Alpha_tstat" pivot by tradeTime,indicator;
-
+            undef(`pt); // 清除缓存
+            """
+        icScript = rf"""
+            {self.regLongScript(where=where, indicators=["IC", "RankIC"])}
             // IC & 累计IC
             IC=select value from pt where indicator="IC" pivot by tradeTime,indicator;
             IC_cumsum=IC.copy();
@@ -185,27 +715,60 @@ class Stats(Result):    # for EvaPlot
             rename!(data,`tradeTime`factor`factor_RankIC);
             avg_RankIC=select avg(factor_RankIC) from data pivot by year(tradeTime) as year,factor;
             RankIR=select avg(factor_RankIC)/std(factor_RankIC) from data pivot by year(tradeTime) as year,factor;
+            undef(`pt`data); // 清除缓存
+            """
+        groups = [(regScript, {i: i for i in ["R_square", "Adj_square", "Obs", "Std_Error", "R", "R_cumsum", "t_stat"]}),
+                  (icScript, {i: i for i in ["IC", "IC_cumsum", "RankIC", "RankIC_cumsum", "avg_IC", "IR", "avg_RankIC", "RankIR"]})]
+        for r_interval in self.returnIntervals:
+            quantileScript = rf"""
+            quantile_pt=select * from loadTable("{self.resultDBName}","{self.resultTBName_Qua}") 
+                where factor == "{factor}" and returnInterval == {int(r_interval)};
+
+            /* Quantile Return & Quantile Cumsum Return: 这里只统计累计值(cumsum) */
+            df = sql(select=[sqlCol(`TradeTime)].append!(sqlCol("QuantileReturn"+string(1..{self.quantile}))),
+                    from=quantile_pt).eval()
+            ts_list = df[`tradeTime];
+            dropColumns!(df,`tradeTime);
+            df = cumsum(df) + 1
+            quantileReturn_ = select ts_list as `tradeTime, * from df
 
-            // 返回为字典格式
-            Dict=dict(["R_square","Adj_square","Obs","Std_Error","R","R_cumsum","t_stat",
-                        "IC","IC_cumsum","RankIC","RankIC_cumsum","avg_IC","IR","avg_RankIC","RankIR"],
-                        [R_square,Adj_square,Obs,Std_Error,R,R_cumsum,t_stat,
-                        IC,IC_cumsum,RankIC,RankIC_cumsum,avg_IC,IR,avg_RankIC,RankIR]);
-
-            /* Quantile Return & Quantile Cumsum Return */
-            returnIntervals = {self.returnIntervals}
-            for (r_interval in returnIntervals){{  // 这里只统计累计值(cumsum)
-                df = sql(select=[sqlCol(`TradeTime)].append!(sqlCol("QuantileReturn"+string(1..{self.quantile}))),
-                        from=quantile_pt, where=<ReturnInterval == r_interval>).eval()
-                ts_list = df[`tradeTime];
-                dropColumns!(df,`tradeTime);
-                df = cumsum(df) + 1
-                Dict["Return"+string(r_interval)] = select ts_list as `tradeTime, * from df
+            /* 调仓时刻的换手率 & 秩自相关(早于该功能的结果没有这些列, 返回空表) */
+            if ("rankautocorr" in lower(columnNames(quantile_pt))){{
+                turnover_ = select tradeTime, {", ".join(QUANTILE_METRIC_COLS)} from quantile_pt
+                    where !isNull(topTurnover) or !isNull(rankAutoCorr) order by tradeTime
+            }}else{{
+                turnover_ = table(1:0, `tradeTime`{"`".join(QUANTILE_METRIC_COLS)}, [TIMESTAMP{",DOUBLE" * len(QUANTILE_METRIC_COLS)}])
             }}
-            undef(`pt); // 清除缓存
-            Dict
-            """)
-        return resDict
+            undef(`quantile_pt`df); // 清除缓存
+            """
+            groups.append((quantileScript, {"Return" + str(r_interval): "quantileReturn_",
+                                            "Turnover" + str(r_interval): "turnover_"}))
+        return self.fetchGroups(groups)
+
+    def get_decayData(self, factor: str) -> Dict[str, pd.DataFrame]:
+        """单因子IC衰减曲线: 各持有期的avg(IC), avg(RankIC), ICIR, RankICIR(按该因子的结果版本缓存)"""
+        return self.resultCache().get(self.resultDBName, self.resultTBName_Decay, factor, 0, self.resultVersionKey(factor),
+                                      lambda: self._timedQuery("stats:decay", lambda: self._decayData(factor),
+                                                               factorList=[factor]),
+                                      config=self.cacheConfig())
+
+    def _decayData(self, factor: str) -> Dict[str, pd.DataFrame]:
+        cols = ["cnt", "sumValue", "sumSquare"]
+        res = pd.DataFrame(columns=["horizon", "IC", "RankIC", "ICIR", "RankICIR"])
+        if self.session.existsTable(dbUrl=self.resultDBName, tableName=self.resultTBName_Decay):
+            agg = self.fetchGroups([(f"""
+                agg_ = select horizon, indicator, sum(cnt) as cnt, sum(sumValue) as sumValue, sum(sumSquare) as sumSquare
+                from loadTable("{self.resultDBName}","{self.resultTBName_Decay}") where factor == "{factor}"
+                group by horizon, indicator
+            """, {"agg": "agg_"})])["agg"]
+            if len(agg) > 0:
+                total = agg.set_index(["indicator", "horizon"])[cols].sort_index()
+                res = pd.DataFrame({name: self.aggStat(total.loc[indicator], stat)
+                                    for name, indicator, stat in [("IC", "IC", "mean"), ("RankIC", "RankIC", "mean"),
+                                                                  ("ICIR", "IC", "ir"), ("RankICIR", "RankIC", "ir")]
+                                    if indicator in total.index.get_level_values(0)})
+                res = res.rename_axis("horizon").reset_index()
+        return {"decay": res}
 
     def factorPlot_(self, factorList: List[str]) -> None:
         """单因子评价可视化"""
@@ -224,7 +787,7 @@ class Stats(Result):    # for EvaPlot
             help="选择当前因子进行因子分层收益展示"
         )
         st.title("_Single Factor BackTest Analysis_")
-        tabReg, tabIC, tabQuantile, tabStats = st.tabs(["回归法", "IC法", "分层回测", "其他指标"])
+        tabReg, tabIC, tabDecay, tabQuantile, tabTurnover, tabStats = st.tabs(["回归法", "IC法", "IC衰减", "分层回测", "换手率&自相关", "其他指标"])
         Dict = self.get_factorData(factor=factor, rInterval=rInterval)
         R_square = Dict["R_square"]
         Adj_square = Dict["Adj_square"]
@@ -277,10 +840,32 @@ class Stats(Result):    # for EvaPlot
             st.subheader("Factor RankIR", divider=True)
             st.bar_chart(data=RankIR, x="year", y=None, stack=False)
             st.dataframe(data=RankIR)
+        with tabDecay:
+            decay = self.get_decayData(factor=factor)["decay"]
+            if len(decay) == 0:
+                st.write("暂无IC衰减结果(FactorEva.decay)")
+            else:
+                st.subheader("IC Decay(avg IC & avg RankIC by horizon)", divider=True)
+                st.line_chart(data=decay, x="horizon", y=["IC", "RankIC"])
+                st.subheader("ICIR Decay", divider=True)
+                st.line_chart(data=decay, x="horizon", y=["ICIR", "RankICIR"])
+                st.dataframe(data=decay)
         with tabQuantile:
             for rInterval in self.returnIntervals:
                 st.subheader(f"Single Factor Quantile Return(ReturnInterval={rInterval})", divider=True)
                 st.line_chart(data=Dict["Return" + str(rInterval)], x="tradeTime", y=None)
+        with tabTurnover:
+            for rInterval in self.returnIntervals:
+                turnover = Dict.get("Turnover" + str(rInterval))
+                if turnover is None or len(turnover) == 0:
+                    st.write(f"暂无换手率&秩自相关结果(ReturnInterval={rInterval}), 需重新评价该因子")
+                    continue
+                st.subheader(f"Top/Bottom Quantile Turnover(ReturnInterval={rInterval})", divider=True)
+                st.line_chart(data=turnover, x="tradeTime", y=["topTurnover", "bottomTurnover"])
+                st.subheader(f"Factor Rank AutoCorrelation(ReturnInterval={rInterval})", divider=True)
+                st.line_chart(data=turnover, x="tradeTime", y=["rankAutoCorr"])
+                st.write("调仓时刻的平均换手率&秩自相关:")
+                st.dataframe(data=turnover.set_index("tradeTime").mean())
         with tabReg:
             st.subheader("R square", divider=True)
             st.bar_chart(data=R_square, x="tradeTime", y=None, stack=False)
@@ -289,4 +874,38 @@ class Stats(Result):    # for EvaPlot
             st.subheader("Std Error(残差标准差)", divider=True)
             st.bar_chart(data=Std_Error, x="tradeTime", y=None, stack=False)
             st.subheader("Num of Obs", divider=True)
-            st.line_chart(data=Obs, x="tradeTime", y=None)
\ No newline at end of file
+            st.line_chart(data=Obs, x="tradeTime", y=None)
+
+    def factorCorrelation(self) -> FactorCorrelation:
+        """因子相关性矩阵对象(配置corrCacheDir/corrMethod/corrBlockSize/corrMinObs)"""
+        return FactorCorrelation(self, cacheDir=self.corrCacheDir, method=self.corrMethod,
+                                 blockSize=self.corrBlockSize, minObs=self.corrMinObs)
+
+    def correlationPlot_(self) -> None:
+        """
+        因子相关性(冗余度)可视化: 高相关因子对, 聚类结果与相关系数矩阵
+        只读取FactorCorrelation.update缓存的结果
+        """
+        corrObj = self.factorCorrelation()
+        st.title("_Factor Correlation Analysis_")
+        if not corrObj.load():
+            st.warning(f"未找到因子相关性缓存({corrObj.path}), 请先运行FactorEva.correlation")
+            return
+        threshold = st.slider(
+            label="请输入相关系数阈值(|corr|)",
+            min_value=0.0, max_value=1.0, value=0.7, step=0.05,
+            help='|平均截面相关系数|大于等于阈值的因子视为冗余'
+        )
+        st.write(f"{corrObj.method} 截面相关系数的时间平均, 共{len(corrObj.factors)}个因子, 截至{corrObj.lastDate}")
+        tabPair, tabCluster, tabMatrix = st.tabs(["高相关因子对", "聚类", "相关系数矩阵"])
+        with tabPair:
+            st.subheader("Redundant Factor Pairs", divider=True)
+            st.dataframe(data=corrObj.redundantPairs(threshold=threshold), height=1000)
+        with tabCluster:
+            clusterDF = corrObj.clusters(threshold=threshold)
+            st.subheader("Factor Clusters", divider=True)
+            st.write(f"聚类数: {clusterDF['cluster'].nunique()}")
+            st.dataframe(data=clusterDF, height=1000)
+        with tabMatrix:
+            st.subheader("Correlation Matrix", divider=True)
+            st.dataframe(data=corrObj.matrix(), height=1000)
@@ -0,0 +1,308 @@
+import copy, threading, tqdm
+import pandas as pd
+import dolphindb as ddb
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, Dict, List, Tuple
+from src.entity.Eva import Eva
+from src.backend.DensePanel import DensePanel
+from src.entity.Planner import BatchPlanner
+from src.entity.Manifest import RunManifest
+from src.entity.Writer import ResultWriter
+from src.utils.utils import split_list, is_out_of_memory
+
+class BatchRunner:
+    """
+    流水线批量评价
+    dolphindb后端: concurrency个session并行执行getData+eva(数据与计算均在各自session的服务端内存中)
+    本地后端: 取数(提前预取后续批次) -> 计算(主线程, nJobs进程) -> 写库(异步) 三段流水线
+    sessionFactory为空时退化为单session顺序执行
+    各session对维度表(long布局结果表)及汇总表/版本表的写入均持有evaObj.tableLock(Result.insertUploaded)
+    批次内存不足时对半拆分重试, 并通过planner缩小尚未执行的批次
+    配置chunkDays/shardFreq时每个批次再按交易日/自然年季月分块(Result.planChunks), 各块相互独立(可并行), 进度按因子数×块数计
+    某个批次(块)失败时继续执行其余批次(块), 结束后汇总抛出
+    manifest不为空时每个批次(块)写库完成后记录至运行清单(流式写库时在writer写完后记录), 并跳过清单中已完成的因子
+    """
+    def __init__(self, evaObj: Eva, sessionFactory: Callable[[], ddb.session] = None, concurrency: int = 1,
+                 planner: BatchPlanner = None, manifest: RunManifest = None):
+        self.evaObj: Eva = evaObj
+        self.planner: BatchPlanner = planner
+        self.sessionFactory: Callable[[], ddb.session] = sessionFactory
+        self.concurrency: int = max(int(concurrency or 1), 1) if sessionFactory is not None else 1
+        self._local = threading.local()
+        self.writer: ResultWriter = None    # 本地后端流式写库(streamWrite)
+        self.chunks: List[Dict] = [None]    # 分块评价的各块参数, [None]表示整段评价
+        self.failures: List[Tuple[List[str], Dict, Exception]] = []
+        self.manifest: RunManifest = manifest
+        self._deferred: List[Tuple[List[str], Dict, Tuple[int, int]]] = []    # 流式写库中尚未写完的批次(块)
+
+    def _worker(self) -> Eva:
+        """当前线程的评价对象(独立session, 配置与主对象一致)"""
+        if self.sessionFactory is None:
+            return self.evaObj
+        worker = getattr(self._local, "evaObj", None)
+        if worker is None:
+            worker = copy.copy(self.evaObj)
+            worker.session = self.sessionFactory()
+            worker.data = None
+            worker.initDef()    # InsertData等函数定义仅在当前session内有效
+            self._local.evaObj = worker
+        return worker
+
+    @staticmethod
+    def prepare(worker: Eva, factorList: List[str], incremental: bool = False, chunk: Dict = None) -> Dict:
+        """确定批次的数据范围(增量评价时按水位线, 分块评价时按块)并取数, 没有新数据时返回None"""
+        startDate, endDate, periodOffset, quantilePeriodOffset, watermark = worker.startDate, worker.endDate, 0, None, None
+        if incremental:
+            watermark = worker.getWatermark(factorList=factorList)
+        if chunk is not None:
+            if incremental and worker.chunkCovered(chunk=chunk, watermark=watermark, factorList=factorList):
+                return None
+            startDate, endDate = chunk["startDate"], chunk["endDate"]
+            periodOffset, quantilePeriodOffset = chunk["periodOffset"], chunk["quantilePeriodOffset"]
+            watermark = worker.chunkWatermark(chunk=chunk, factorList=factorList, watermark=watermark)
+        elif incremental:
+            startDate, periodOffset = worker.getIncrementalStart(watermark=watermark, factorList=factorList)
+            if startDate is None:   # 当前批次没有新数据
+                return None
+        worker.getData(startDate=startDate, endDate=endDate,
+                       factorList=factorList, symbolList=None,
+                       labelList=[worker.barRetLabelName] + worker.futRetLabelNames)
+        return {"factorList": factorList, "periodOffset": periodOffset, "watermark": watermark,
+                "quantilePeriodOffset": quantilePeriodOffset}
+
+    def fetch(self, factorList: List[str], incremental: bool = False, chunk: Dict = None) -> Dict:
+        """取数阶段: 返回本批次(块)的面板数据与增量/分块评价参数"""
+        worker = self._worker()
+        batch = self.prepare(worker, factorList, incremental, chunk)
+        if batch is not None:
+            batch["data"], worker.data = worker.data, None
+        return batch
+
+    def write(self, summary_res: pd.DataFrame, quantile_res: pd.DataFrame) -> None:
+        """写库阶段"""
+        worker = self._worker()
+        if worker.session is not None:
+            worker.insertResult(summary_res=summary_res, quantile_res=quantile_res)
+
+    def evaluate(self, factorList: List[str], incremental: bool = False, chunk: Dict = None) -> None:
+        """dolphindb后端: 在当前线程的session上完成整个批次(块)"""
+        worker = self._worker()
+        batch = self.prepare(worker, factorList, incremental, chunk)
+        rows = (0, 0)
+        if batch is not None:
+            rows = worker.eva(factorList=factorList, periodOffset=batch["periodOffset"], watermark=batch["watermark"],
+                              quantilePeriodOffset=batch["quantilePeriodOffset"])
+        self._checkpoint(factorList, chunk, rows)
+
+    def _pending(self, factorList: List[str], chunk: Dict) -> List[str]:
+        """批次(块)中尚未完成的因子(按运行清单)"""
+        if self.manifest is None:
+            return factorList
+        return self.manifest.pending(factorList, chunk)
+
+    def _checkpoint(self, factorList: List[str], chunk: Dict, rows: Tuple[int, int] = None) -> None:
+        """批次(块)写库完成后记录至运行清单, 流式写库时先暂存, 待writer写完后记录"""
+        if self.manifest is None:
+            return
+        if self.writer is not None:
+            self._deferred.append((factorList, chunk, rows))
+        else:
+            self.manifest.done(factorList, chunk, rows)
+
+    def _commit(self) -> None:
+        """writer已写完(flush/close)后记录暂存的批次(块)"""
+        deferred, self._deferred = self._deferred, []
+        for factorList, chunk, rows in deferred:
+            self.manifest.done(factorList, chunk, rows)
+
+    def _split(self, factorList: List[str]) -> List[List[str]]:
+        return self.planner.split(factorList) if self.planner is not None else [factorList]
+
+    def _retry(self, func: Callable[[List[str]], None], factorList: List[str], e: Exception) -> None:
+        """内存不足时将批次对半拆分后依次重试, 其余异常直接抛出"""
+        if not is_out_of_memory(e) or len(factorList) <= 1:
+            raise e
+        size = (len(factorList) + 1) // 2
+        if self.planner is not None:
+            size = self.planner.shrink(len(factorList))
+        print(f"Out of memory with {len(factorList)} factors, retrying with batches of {size}")
+        for subList in split_list(l=factorList, k=size):
+            func(subList)
+
+    def _evaluate(self, factorList: List[str], incremental: bool, bar: tqdm.tqdm, chunks: List[Dict] = None) -> None:
+        """dolphindb后端: 依次执行一个批次的各块(按当前批次上限切分, 内存不足时从失败的块起拆分重试)"""
+        chunks = self.chunks if chunks is None else chunks
+        for subList in self._split(factorList):
+            for i, chunk in enumerate(chunks):
+                pending = self._pending(subList, chunk)     # 各块分别过滤, 不影响后续块的因子列表
+                try:
+                    if pending:
+                        self.evaluate(pending, incremental, chunk)
+                    bar.update(len(subList))
+                except Exception as e:
+                    self._retry(lambda l: self._evaluate(l, incremental, bar, chunks[i:]), subList, e)
+                    break
+
+    def _runSync(self, factorList: List[str], incremental: bool, bar: tqdm.tqdm, chunks: List[Dict] = None) -> None:
+        """本地后端: 同步执行一个批次各块的取数 -> 计算 -> 写库(内存不足时从失败的块起拆分重试)"""
+        chunks = self.chunks if chunks is None else chunks
+        for subList in self._split(factorList):
+            for i, chunk in enumerate(chunks):
+                pending = self._pending(subList, chunk)     # 各块分别过滤, 不影响后续块的因子列表
+                try:
+                    if pending:
+                        self._runChunk(pending, incremental, chunk)
+                    bar.update(len(subList))
+                except Exception as e:
+                    self._retry(lambda l: self._runSync(l, incremental, bar, chunks[i:]), subList, e)
+                    break
+
+    def _runChunk(self, factorList: List[str], incremental: bool, chunk: Dict) -> None:
+        """本地后端: 一个批次(块)的取数 -> 计算 -> 写库"""
+        batch = self.fetch(factorList, incremental, chunk)
+        rows = (0, 0)
+        if batch is not None:
+            summary_res, quantile_res, rows = self._compute(batch)
+            del batch
+            if summary_res is not None:
+                self.write(summary_res, quantile_res)
+        self._checkpoint(factorList, chunk, rows)
+        if self.writer is not None and self.sessionFactory is None:   # 写线程与主线程共用session, 取下一批数据前需写完
+            self.writer.flush()
+            self._commit()
+
+    def run(self, factorBatches: List[List[str]], incremental: bool = False) -> None:
+        """运行所有批次(整个运行共用一个进度条, 按因子数×块数计)"""
+        evaObj = self.evaObj
+        self.chunks = evaObj.planChunks(evaObj.chunkDays, evaObj.shardFreq) if evaObj.chunkDays or evaObj.shardFreq else [None]
+        self.failures = []
+        self._deferred = []
+        total = sum(len(l) for l in factorBatches) * len(self.chunks)
+        with tqdm.tqdm(total=total, desc="Evaluating...") as bar:
+            if self.evaObj.backend == "dolphindb":
+                items = [(factorList, chunk) for factorList in factorBatches for chunk in self.chunks]
+                if self.sessionFactory is None:
+                    for factorList, chunk in items:
+                        try:
+                            self._evaluate(factorList, incremental, bar, [chunk])
+                        except Exception as e:
+                            self._fail(factorList, chunk, e)
+                else:
+                    with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+                        futures = {pool.submit(self._evaluate, factorList, incremental, bar, [chunk]): (factorList, chunk)
+                                   for factorList, chunk in items}
+                        for future in as_completed(futures):
+                            try:
+                                future.result()
+                            except Exception as e:
+                                self._fail(*futures[future], e)
+            else:
+                if self.evaObj.streamWrite and self.evaObj.session is not None:
+                    self.writer = ResultWriter(self.evaObj, sessionFactory=self.sessionFactory,
+                                               threadCount=self.evaObj.writerThreads, queueSize=self.evaObj.writerQueueSize)
+                try:
+                    self._runPipeline(factorBatches, incremental, bar)
+                finally:
+                    if self.writer is not None:
+                        writer, self.writer = self.writer, None
+                        writer.close()
+                if self._deferred:
+                    self._commit()
+        if self.failures:
+            raise RuntimeError(f"{len(self.failures)} of {len(factorBatches) * len(self.chunks)} batches failed, "
+                               f"first error: {self.failures[0][2]}") from self.failures[0][2]
+
+    def _fail(self, factorList: List[str], chunk: Dict, e: Exception) -> None:
+        """记录失败的批次(块), 其余批次(块)继续执行"""
+        span = f" [{chunk['startDate']:%Y-%m-%d} ~ {chunk['endDate']:%Y-%m-%d}]" if chunk is not None else ""
+        print(f"Batch of {len(factorList)} factors{span} failed: {e}")
+        self.failures.append((factorList, chunk, e))
+
+    def _compute(self, batch: Dict):
+        """计算阶段, 返回summary_res, quantile_res与结果行数; 流式写库时结果直接交给writer, 返回(None, None, 行数)"""
+        rows = [0, 0]
+
+        def sink(summary_res: pd.DataFrame, quantile_res: pd.DataFrame):
+            rows[0] += len(summary_res)
+            rows[1] += len(quantile_res)
+            self.writer.put(summary_res, quantile_res)
+        try:
+            summary_res, quantile_res = self.evaObj.computeLocal(data=batch["data"], factorList=batch["factorList"],
+                                                                 periodOffset=batch["periodOffset"], watermark=batch["watermark"],
+                                                                 sink=sink if self.writer is not None else None,
+                                                                 quantilePeriodOffset=batch["quantilePeriodOffset"])
+        finally:
+            if isinstance(batch["data"], DensePanel):   # 删除本批次(块)的内存映射目录
+                batch["data"].release()
+        if summary_res is not None:
+            rows = [len(summary_res), len(quantile_res)]
+        return summary_res, quantile_res, tuple(rows)
+
+    def _runPipeline(self, factorBatches: List[List[str]], incremental: bool, bar: tqdm.tqdm) -> None:
+        """
+        本地后端流水线: 最多预取concurrency个批次(块), 最多concurrency个写库任务未完成
+        批次在提交取数时才按当前上限切分; 取数或计算内存不足的批次(块)转为同步拆分重试
+        """
+        if self.sessionFactory is None:     # 单session不能跨线程共用
+            for factorList in factorBatches:
+                for chunk in self.chunks:
+                    try:
+                        self._runSync(factorList, incremental, bar, [chunk])
+                    except Exception as e:
+                        self._fail(factorList, chunk, e)
+            return
+        pending = iter(factorBatches)
+        queued = deque()
+        with ThreadPoolExecutor(max_workers=self.concurrency) as fetchPool, \
+                ThreadPoolExecutor(max_workers=self.concurrency) as writePool:
+            fetches, writes = deque(), deque()
+
+            def submitFetch():
+                while True:
+                    while not queued:
+                        factorList = next(pending, None)
+                        if factorList is None:
+                            return
+                        queued.extend((subList, chunk) for subList in self._split(factorList) for chunk in self.chunks)
+                    factorList, chunk = queued.popleft()
+                    todo = self._pending(factorList, chunk)
+                    bar.update(len(factorList) - len(todo))  # 已完成的因子直接计入进度
+                    if todo:
+                        fetches.append((todo, chunk, fetchPool.submit(self.fetch, todo, incremental, chunk)))
+                        return
+
+            for _ in range(self.concurrency):
+                submitFetch()
+            while fetches:
+                factorList, chunk, future = fetches.popleft()
+                submitFetch()
+                try:
+                    batch = future.result()
+                    if batch is None:
+                        self._checkpoint(factorList, chunk, (0, 0))
+                        bar.update(len(factorList))
+                        continue
+                    summary_res, quantile_res, rows = self._compute(batch)
+                    del batch
+                except Exception as e:
+                    try:
+                        self._retry(lambda l: self._runSync(l, incremental, bar, [chunk]), factorList, e)
+                    except Exception as err:
+                        self._fail(factorList, chunk, err)
+                    continue
+                if summary_res is None:     # 已由writer流式写库
+                    self._checkpoint(factorList, chunk, rows)
+                    bar.update(len(factorList))
+                    continue
+                while len(writes) >= self.concurrency:  # 写库背压
+                    self._written(*writes.popleft(), bar)
+                writes.append((factorList, chunk, rows, writePool.submit(self.write, summary_res, quantile_res)))
+            while writes:
+                self._written(*writes.popleft(), bar)
+
+    def _written(self, factorList: List[str], chunk: Dict, rows: Tuple[int, int], future, bar: tqdm.tqdm) -> None:
+        """等待异步写库完成并记录批次(块)"""
+        future.result()
+        self._checkpoint(factorList, chunk, rows)
+        bar.update(len(factorList))
@@ -1,7 +1,10 @@
-import numpy as np
+import os, shutil, hashlib, tempfile, contextlib
 import pandas as pd
 import dolphindb as ddb
-from typing import List, Dict
+from typing import List, Dict, Tuple, Union
+from src.entity.Cache import PanelCache
+from src.entity.Transfer import DataTransfer
+from src.backend.DensePanel import DensePanel
 
 class Source:
     def __init__(self, session: ddb.session):
@@ -29,6 +32,21 @@ class Source:
         self.combineTBName: str = ""
         self.resultTBName_Reg: str = ""
         self.resultTBName_Qua: str = ""
+        self.backend: str = "dolphindb"     # 评价后端: dolphindb(服务端计算) / numpy(本地计算)
+        self.data: Union[pd.DataFrame, DensePanel] = None  # 非dolphindb后端时的本地面板数据
+        self.cacheDir: str = None           # 本地面板缓存目录, 为空时不使用缓存
+        self.panelDir: str = None           # 本地后端的稠密面板(内存映射)目录, 为空时面板保留在内存中
+        self.panelDtype: str = "float64"    # 稠密面板存储精度: float64 / float32
+        self.resultTBName_Catalog: str = "factorCatalog"
+        self.resultTBName_Agg: str = "aggRes"
+        self.resultTBName_Version: str = "resultVersion"
+        self.resultTBName_Decay: str = "decayRes"
+        self.resultTBName_SweepReg: str = "sweepRegRes"
+        self.resultTBName_SweepQua: str = "sweepQuaRes"
+        self.resultTBName_SweepConfig: str = "sweepConfig"
+        self.catalog = None                 # FactorCatalog, 设置后因子列表查询走目录的内存索引
+        self.metrics = None                 # RunMetrics, 设置后记录各阶段的运行指标
+        self.transfer = None                # DataTransfer, 设置后大表下载走压缩/Arrow传输的session池
 
     def init(self, factorDict: Dict[str, str], labelDict: Dict[str, str], resultDict: Dict[str, str]):
         self.factorDBName = factorDict["dbName"]
@@ -48,11 +66,20 @@ class Source:
         self.resultDBName = resultDict["dbName"]
         self.resultTBName_Reg = resultDict["regTbName"]   # IC结果表
         self.resultTBName_Qua = resultDict["quaTbName"]   # 分层回测(Quantile BackTest 结果表)
+        self.resultTBName_Catalog = resultDict.get("catalogTbName", "factorCatalog")  # 因子目录表
+        self.resultTBName_Agg = resultDict.get("aggTbName", "aggRes")     # IC&RankIC年度汇总表
+        self.resultTBName_Version = resultDict.get("versionTbName", "resultVersion")  # 各因子结果版本(看板缓存失效)
+        self.resultTBName_Decay = resultDict.get("decayTbName", "decayRes")  # IC衰减年度汇总表
+        self.resultTBName_SweepReg = resultDict.get("sweepRegTbName", "sweepRegRes")  # 参数扫描: IC法&回归法结果(按configId)
+        self.resultTBName_SweepQua = resultDict.get("sweepQuaTbName", "sweepQuaRes")  # 参数扫描: 分层回测结果(按configId)
+        self.resultTBName_SweepConfig = resultDict.get("sweepConfigTbName", "sweepConfig")  # 参数扫描: configId -> 配置
 
     def getFactorList(self) -> List[str]:
         """
         获取当前库内所有因子列表
         """
+        if self.catalog is not None:
+            return self.catalog.factors()
         if self.factorCondition not in ["", None]:
             factorDF = self.session.run(f"""
                 select count(*) from loadTable("{self.factorDBName}", "{self.factorTBName}")
@@ -71,7 +98,48 @@ class Source:
         """
         确认输入的因子列表是否都在库内->返回在库内的因子列表
         """
-        return [i for i in factorList if i in self.getFactorList()]
+        factorSet = set(self.getFactorList())
+        return [i for i in factorList if i in factorSet]
+
+    def getTradeDates(self, startDate: pd.Timestamp, endDate: pd.Timestamp, labelList: List[str] = None) -> pd.DatetimeIndex:
+        """
+        获取标签库startDate~endDate之间的时间序列(即面板数据period编号所依据的时间序列)
+        labelList: 只统计这些标签(与getData取数的过滤条件一致), 为空时统计所有标签
+        """
+        labelFilter = f"{self.labelIndicatorCol} in {list(labelList)} and " if labelList else ""
+        realStartDate = pd.Timestamp(startDate).strftime("%Y.%m.%d")
+        realEndDate = pd.Timestamp(endDate).strftime("%Y.%m.%d")
+        dates = self.session.run(f"""
+            exec distinct({self.labelDateCol}) from loadTable("{self.labelDBName}","{self.labelTBName}")
+            where ({self.labelDateCol} between {realStartDate} and {realEndDate}) and {labelFilter}({self.labelCondition})
+        """.replace("and ()", ""))
+        return pd.DatetimeIndex(sorted(pd.to_datetime(dates)))
+
+    def stage(self, name: str, factorList: List[str] = None, **fields):
+        """运行指标的阶段记录(未配置metricsPath时不记录)"""
+        if self.metrics is None:
+            return contextlib.nullcontext({})
+        return self.metrics.stage(name, session=self.session, factorList=factorList, **fields)
+
+    def transferSession(self, stateless: bool = True):
+        """下载大表所用的session: 配置了传输层且查询不依赖主session中的变量时从池中借用, 否则为主session"""
+        if self.transfer is None or not stateless:
+            return contextlib.nullcontext(self.session)
+        return self.transfer.session()
+
+    def fetchGroups(self, groups: List[Tuple[str, Dict[str, str]]]) -> Dict[str, pd.DataFrame]:
+        """
+        执行相互独立的查询组并取回结果: groups为(script, 结果名 -> script中的变量名)的列表
+        配置了传输层时各组由session池并发执行, 否则在主session上合并为一个脚本执行
+        """
+        if self.transfer is not None:
+            return self.transfer.fetchGroups(groups)
+        script = "res_ = dict(STRING, ANY);"
+        for groupScript, names in groups:
+            script += groupScript + "".join(f'\nres_["{name}"] = {var};' for name, var in names.items())
+        resDict = self.session.run(script + "\nres_")
+        self.session.run("undef(`res_);")
+        return resDict
 
     def getData(self, startDate: pd.Timestamp = None,
                 endDate: pd.Timestamp = None,
@@ -79,71 +147,229 @@ class Source:
                 labelList: List[str] = None,
                 factorList: List[str] = None
                 ) -> None:
+        """获取完整的数据集(记录getData阶段的指标)"""
+        self.releaseData()     # 上一次取数的面板
+        with self.stage("getData", factorList=factorList) as record:
+            self._getData(startDate=startDate, endDate=endDate, symbolList=symbolList,
+                          labelList=labelList, factorList=factorList)
+            if self.metrics is not None:
+                if self.backend == "dolphindb":
+                    record["rowsOut"] = int(self.session.run(f"rows({self.dataObjName})"))
+                elif isinstance(self.data, pd.DataFrame):
+                    record["rowsOut"] = len(self.data)
+                    record["bytes"] = self.metrics.frameBytes(self.data)
+                else:
+                    record["rowsOut"] = int(self.data.rowMask.sum())
+
+    def _getData(self, startDate: pd.Timestamp = None,
+                 endDate: pd.Timestamp = None,
+                 symbolList: List[str] = None,
+                 labelList: List[str] = None,
+                 factorList: List[str] = None
+                 ) -> None:
         """获取完整的数据集 -> startDate & endDate -> 存入DolphinDB内存
         通过LabelSource进行获取
         """
-        realStartDate = pd.Timestamp(startDate).strftime("%Y.%m.%d")
-        realEndDate = pd.Timestamp(endDate).strftime("%Y.%m.%d")
-        if symbolList is None:
-            symbolList = []
-        self.session.upload({"symbolList": symbolList})
-        if labelList is None:
-            labelList = []
-        self.session.upload({"labelList": labelList})
-        if factorList is None:
-            factorList = []
-        self.session.upload({"factorList": factorList})
-        data = self.session.run(f"""
-            startDate = {realStartDate}
-            endDate = {realEndDate}            
-            /* 标签内存表 */
-            if (size(symbolList)==0 and size(labelList)==0){{
-                {self.dataObjName} = select value from loadTable("{self.labelDBName}","{self.labelTBName}") 
-                where {self.labelDateCol} between startDate and endDate and ({self.labelCondition})
-                pivot by {self.labelSymbolCol} as {self.dataSymbolCol}, {self.labelDateCol} as {self.dataDateCol}, {self.labelIndicatorCol}
-            }}
-            else if(size(symbolList)>0 and size(labelList)==0){{
-                {self.dataObjName} = select value from loadTable("{self.labelDBName}","{self.labelTBName}") 
-                where ({self.labelDateCol} between startDate and endDate) and {self.labelSymbolCol} in symbolList and ({self.labelCondition})
-                pivot by {self.labelSymbolCol} as {self.dataSymbolCol}, {self.labelDateCol} as {self.dataDateCol}, {self.labelIndicatorCol}
-            }}
-            else if(size(symbolList)==0 and size(labelList)>0){{
-                {self.dataObjName} = select value from loadTable("{self.labelDBName}","{self.labelTBName}") 
-                where ({self.labelDateCol} between startDate and endDate) and {self.labelIndicatorCol} in labelList and ({self.labelCondition})
-                pivot by {self.labelSymbolCol} as {self.dataSymbolCol}, {self.labelDateCol} as {self.dataDateCol}, {self.labelIndicatorCol}
-            }}
-            else{{
-                {self.dataObjName} = select value from loadTable("{self.labelDBName}","{self.labelTBName}") 
-                where ({self.labelDateCol} between startDate and endDate) and ({self.labelSymbolCol} in symbolList) and ({self.labelIndicatorCol} in labelList) and ({self.labelCondition}) 
-                pivot by {self.labelSymbolCol} as {self.dataSymbolCol}, {self.labelDateCol} as {self.dataDateCol}, {self.labelIndicatorCol}
-            }}
-
-            /* 因子内存表 */
-            if (size(symbolList)==0 and size(factorList)==0){{
-                factorDF = select value from loadTable("{self.factorDBName}","{self.factorTBName}") 
-                where {self.factorDateCol} between startDate and endDate and ({self.factorCondition})
-                pivot by {self.factorSymbolCol} as {self.dataSymbolCol}, {self.factorDateCol} as {self.dataDateCol}, {self.factorIndicatorCol}
-            }}
-            else if(size(symbolList)>0 and size(factorList)==0){{
-                factorDF = select value from loadTable("{self.factorDBName}","{self.factorTBName}") 
-                where ({self.factorDateCol} between startDate and endDate) and {self.factorSymbolCol} in symbolList and ({self.factorCondition})
-                pivot by {self.factorSymbolCol} as {self.dataSymbolCol}, {self.factorDateCol} as {self.dataDateCol}, {self.factorIndicatorCol}
-            }}
-            else if(size(symbolList)==0 and size(factorList)>0){{
-                factorDF = select value from loadTable("{self.factorDBName}","{self.factorTBName}") 
-                where ({self.factorDateCol} between startDate and endDate) and {self.factorIndicatorCol} in factorList and ({self.factorCondition})
-                pivot by {self.factorSymbolCol} as {self.dataSymbolCol}, {self.factorDateCol} as {self.dataDateCol}, {self.factorIndicatorCol}
-            }}
-            else{{
-                factorDF = select value from loadTable("{self.factorDBName}","{self.factorTBName}") 
-                where ({self.factorDateCol} between startDate and endDate) and ({self.factorSymbolCol} in symbolList) and ({self.factorIndicatorCol} in factorList) and ({self.factorCondition})
-                pivot by {self.factorSymbolCol} as {self.dataSymbolCol}, {self.factorDateCol} as {self.dataDateCol}, {self.factorIndicatorCol}
-            }}
-
-            /* 进行合并 */
-            matchingCols = ["{self.dataSymbolCol}", "{self.dataDateCol}"]
-            {self.dataObjName} = select * from lj({self.dataObjName}, factorDF, matchingCols);
-
-            /* 清理内存 */
-            undef(`factorDF);
-        """.replace("and ()", ""))
\ No newline at end of file
+        if self.cacheDir:   # 优先读取本地缓存
+            panel = self.getCachedData(startDate=startDate, endDate=endDate, symbolList=symbolList,
+                                       labelList=labelList, factorList=factorList)
+            if self.backend == "dolphindb":
+                self.session.upload({self.dataObjName: panel})
+            else:
+                self.data = self.toDensePanel(panel) if self.panelDir else panel
+            return
+        with self.transferSession(stateless=self.backend != "dolphindb") as session:   # 本地后端的面板不需要留在主session中
+            realStartDate = pd.Timestamp(startDate).strftime("%Y.%m.%d")
+            realEndDate = pd.Timestamp(endDate).strftime("%Y.%m.%d")
+            if symbolList is None:
+                symbolList = []
+            session.upload({"symbolList": symbolList})
+            if labelList is None:
+                labelList = []
+            session.upload({"labelList": labelList})
+            if factorList is None:
+                factorList = []
+            session.upload({"factorList": factorList})
+            session.run(f"""
+                startDate = {realStartDate}
+                endDate = {realEndDate}            
+                /* 标签内存表 */
+                if (size(symbolList)==0 and size(labelList)==0){{
+                    {self.dataObjName} = select value from loadTable("{self.labelDBName}","{self.labelTBName}") 
+                    where {self.labelDateCol} between startDate and endDate and ({self.labelCondition})
+                    pivot by {self.labelSymbolCol} as {self.dataSymbolCol}, {self.labelDateCol} as {self.dataDateCol}, {self.labelIndicatorCol}
+                }}
+                else if(size(symbolList)>0 and size(labelList)==0){{
+                    {self.dataObjName} = select value from loadTable("{self.labelDBName}","{self.labelTBName}") 
+                    where ({self.labelDateCol} between startDate and endDate) and {self.labelSymbolCol} in symbolList and ({self.labelCondition})
+                    pivot by {self.labelSymbolCol} as {self.dataSymbolCol}, {self.labelDateCol} as {self.dataDateCol}, {self.labelIndicatorCol}
+                }}
+                else if(size(symbolList)==0 and size(labelList)>0){{
+                    {self.dataObjName} = select value from loadTable("{self.labelDBName}","{self.labelTBName}") 
+                    where ({self.labelDateCol} between startDate and endDate) and {self.labelIndicatorCol} in labelList and ({self.labelCondition})
+                    pivot by {self.labelSymbolCol} as {self.dataSymbolCol}, {self.labelDateCol} as {self.dataDateCol}, {self.labelIndicatorCol}
+                }}
+                else{{
+                    {self.dataObjName} = select value from loadTable("{self.labelDBName}","{self.labelTBName}") 
+                    where ({self.labelDateCol} between startDate and endDate) and ({self.labelSymbolCol} in symbolList) and ({self.labelIndicatorCol} in labelList) and ({self.labelCondition}) 
+                    pivot by {self.labelSymbolCol} as {self.dataSymbolCol}, {self.labelDateCol} as {self.dataDateCol}, {self.labelIndicatorCol}
+                }}
+
+                /* 因子内存表 */
+                if (size(symbolList)==0 and size(factorList)==0){{
+                    factorDF = select value from loadTable("{self.factorDBName}","{self.factorTBName}") 
+                    where {self.factorDateCol} between startDate and endDate and ({self.factorCondition})
+                    pivot by {self.factorSymbolCol} as {self.dataSymbolCol}, {self.factorDateCol} as {self.dataDateCol}, {self.factorIndicatorCol}
+                }}
+                else if(size(symbolList)>0 and size(factorList)==0){{
+                    factorDF = select value from loadTable("{self.factorDBName}","{self.factorTBName}") 
+                    where ({self.factorDateCol} between startDate and endDate) and {self.factorSymbolCol} in symbolList and ({self.factorCondition})
+                    pivot by {self.factorSymbolCol} as {self.dataSymbolCol}, {self.factorDateCol} as {self.dataDateCol}, {self.factorIndicatorCol}
+                }}
+                else if(size(symbolList)==0 and size(factorList)>0){{
+                    factorDF = select value from loadTable("{self.factorDBName}","{self.factorTBName}") 
+                    where ({self.factorDateCol} between startDate and endDate) and {self.factorIndicatorCol} in factorList and ({self.factorCondition})
+                    pivot by {self.factorSymbolCol} as {self.dataSymbolCol}, {self.factorDateCol} as {self.dataDateCol}, {self.factorIndicatorCol}
+                }}
+                else{{
+                    factorDF = select value from loadTable("{self.factorDBName}","{self.factorTBName}") 
+                    where ({self.factorDateCol} between startDate and endDate) and ({self.factorSymbolCol} in symbolList) and ({self.factorIndicatorCol} in factorList) and ({self.factorCondition})
+                    pivot by {self.factorSymbolCol} as {self.dataSymbolCol}, {self.factorDateCol} as {self.dataDateCol}, {self.factorIndicatorCol}
+                }}
+
+                /* 进行合并 */
+                matchingCols = ["{self.dataSymbolCol}", "{self.dataDateCol}"]
+                {self.dataObjName} = select * from lj({self.dataObjName}, factorDF, matchingCols);
+
+                /* 清理内存 */
+                undef(`factorDF);
+            """.replace("and ()", ""))
+            if self.backend != "dolphindb":   # 本地后端: 将面板数据取回Python端
+                self.data = DataTransfer.toPandas(session.run(f"{self.dataObjName}"))
+                session.run(f"undef(`{self.dataObjName})")
+        if self.panelDir and self.backend != "dolphindb":
+            self.data = self.toDensePanel(self.data)
+
+    def setData(self, data: Union[pd.DataFrame, DensePanel]) -> None:
+        """直接设置本地面板数据(symbol, tradeDate, labels, factors), 用于无服务端的本地评价"""
+        self.data = data
+
+    def toDensePanel(self, data: pd.DataFrame) -> DensePanel:
+        """
+        长面板 -> panelDir下以内存映射存储的DensePanel(每个因子/标签一个文件)
+        每次取数写入独立的临时目录(不覆盖其他批次仍在映射的文件), 由面板所有, 用完后release删除
+        """
+        cols = [c for c in data.columns if c not in [self.dataSymbolCol, self.dataDateCol]]
+        times = pd.to_datetime(data[self.dataDateCol])
+        key = hashlib.sha1(",".join(cols + [str(times.min()), str(times.max())]).encode("utf-8")).hexdigest()[:16]
+        os.makedirs(self.panelDir, exist_ok=True)
+        path = tempfile.mkdtemp(prefix=f"{key}_", dir=self.panelDir)
+        try:
+            panel = DensePanel.fromFrame(data, idCol=self.dataSymbolCol, timeCol=self.dataDateCol, cols=cols,
+                                         dtype=self.panelDtype, path=path)
+        except BaseException:
+            shutil.rmtree(path, ignore_errors=True)
+            raise
+        panel.owned = True
+        return panel
+
+    def releaseData(self) -> None:
+        """释放取数时写入panelDir的临时面板并删除其目录(setData设置的数据不受影响)"""
+        if isinstance(self.data, DensePanel) and self.data.owned:
+            self.data.release()
+            self.data = None
+
+    def _sourceInfo(self, kind: str) -> Dict[str, str]:
+        """kind: factor/label -> 对应源表的配置"""
+        if kind == "factor":
+            return {"dbName": self.factorDBName, "tbName": self.factorTBName, "dateCol": self.factorDateCol,
+                    "symbolCol": self.factorSymbolCol, "indicatorCol": self.factorIndicatorCol,
+                    "valueCol": self.factorValueCol, "condition": self.factorCondition}
+        return {"dbName": self.labelDBName, "tbName": self.labelTBName, "dateCol": self.labelDateCol,
+                "symbolCol": self.labelSymbolCol, "indicatorCol": self.labelIndicatorCol,
+                "valueCol": self.labelValueCol, "condition": self.labelCondition}
+
+    def _sourceWhere(self, info: Dict[str, str], startDate: pd.Timestamp, endDate: pd.Timestamp,
+                     symbolList: List[str]) -> str:
+        """源表的过滤条件(symbolList/indicatorList_需提前上传)"""
+        where = [f"{info['dateCol']} between {pd.Timestamp(startDate).strftime('%Y.%m.%d')} and {pd.Timestamp(endDate).strftime('%Y.%m.%d')}",
+                 f"{info['indicatorCol']} in indicatorList_"]
+        if symbolList:
+            where.append(f"{info['symbolCol']} in symbolList")
+        if info["condition"] not in ["", None]:
+            where.append(f"({info['condition']})")
+        return " and ".join(where)
+
+    def getSourceStats(self, kind: str, indicatorList: List[str], startDate: pd.Timestamp,
+                       endDate: pd.Timestamp, symbolList: List[str] = None) -> pd.DataFrame:
+        """源表中各因子/标签在区间内的行数与最大日期(indicator, rows, maxDate)"""
+        info = self._sourceInfo(kind)
+        symbolList = symbolList or []
+        self.session.upload({"symbolList": symbolList, "indicatorList_": indicatorList})
+        where = self._sourceWhere(info, startDate, endDate, symbolList)
+        return self.session.run(f"""
+            select count(*) as rows, max({info['dateCol']}) as maxDate from loadTable("{info['dbName']}","{info['tbName']}")
+            where {where} group by {info['indicatorCol']} as indicator
+        """)
+
+    def getCachedData(self, startDate: pd.Timestamp, endDate: pd.Timestamp, symbolList: List[str] = None,
+                      labelList: List[str] = None, factorList: List[str] = None) -> pd.DataFrame:
+        """
+        通过本地缓存获取面板数据(与getData在服务端生成的dataObj_一致)
+        缓存按源表行数与最大日期判断是否失效, 缺失/失效的因子&标签一次性从数据库拉取后写入缓存
+        """
+        symbolList = symbolList or []
+        if not labelList:
+            info = self._sourceInfo("label")
+            labelList = self.session.run(f"""
+                exec distinct({info['indicatorCol']}) from loadTable("{info['dbName']}","{info['tbName']}")
+                where ({info['condition']})
+            """.replace("where ()", "")).tolist()
+        if not factorList:
+            factorList = self.getFactorList()
+        keys = [self.dataSymbolCol, self.dataDateCol]
+        labelDF = self._loadCached("label", labelList, startDate, endDate, symbolList)
+        factorDF = self._loadCached("factor", factorList, startDate, endDate, symbolList)
+        return labelDF.merge(factorDF, on=keys, how="left")   # 同getData: 以标签面板为左表进行lj
+
+    def _loadCached(self, kind: str, indicatorList: List[str], startDate: pd.Timestamp,
+                    endDate: pd.Timestamp, symbolList: List[str]) -> pd.DataFrame:
+        """按指标读取缓存并合并为宽表(symbol, tradeDate, 指标...)"""
+        keys = [self.dataSymbolCol, self.dataDateCol]
+        if not indicatorList:
+            return pd.DataFrame(columns=keys)
+        info = self._sourceInfo(kind)
+        cache = PanelCache(self.cacheDir)
+        key = PanelCache.makeKey(startDate, endDate, symbolList, info["condition"])
+        stampDF = self.getSourceStats(kind, indicatorList, startDate, endDate, symbolList)
+        where = self._sourceWhere(info, startDate, endDate, symbolList)
+        stamps = {row["indicator"]: {"rows": int(row["rows"]), "maxDate": pd.Timestamp(row["maxDate"]).strftime("%Y%m%d")}
+                  for _, row in stampDF.iterrows()}
+        frames, missing = {}, []
+        for indicator in indicatorList:
+            stamp = stamps.get(indicator, {"rows": 0, "maxDate": None})
+            frame = cache.load(info["dbName"], info["tbName"], indicator, key, stamp)
+            if frame is None:
+                missing.append(indicator)
+            else:
+                frames[indicator] = frame
+        if missing:
+            with self.transferSession() as session:
+                session.upload({"symbolList": symbolList, "indicatorList_": missing})
+                pivotDF = session.run(f"""
+                    select {info['valueCol']} from loadTable("{info['dbName']}","{info['tbName']}") where {where}
+                    pivot by {info['symbolCol']} as {self.dataSymbolCol}, {info['dateCol']} as {self.dataDateCol}, {info['indicatorCol']}
+                """)
+            pivotDF = DataTransfer.toPandas(pivotDF)
+            for indicator in missing:
+                if indicator in pivotDF.columns:
+                    frame = pivotDF[keys + [indicator]].dropna(subset=[indicator]).reset_index(drop=True)
+                else:
+                    frame = pd.DataFrame({self.dataSymbolCol: pd.Series(dtype=object),
+                                          self.dataDateCol: pd.Series(dtype="datetime64[ns]"),
+                                          indicator: pd.Series(dtype=float)})
+                cache.save(info["dbName"], info["tbName"], indicator, key,
+                           stamps.get(indicator, {"rows": 0, "maxDate": None}), frame)
+                frames[indicator] = frame
+        panel = pd.concat([frames[i].set_index(keys) for i in indicatorList], axis=1, join="outer")
+        return panel.reset_index()
@@ -0,0 +1,114 @@
+import threading, contextlib
+import pandas as pd
+import dolphindb as ddb
+from dolphindb.settings import PROTOCOL_DDB, PROTOCOL_ARROW
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Tuple
+
+PROTOCOLS = {"ddb": PROTOCOL_DDB, "arrow": PROTOCOL_ARROW}
+
+class DataTransfer:
+    """
+    数据传输层: 按传输配置新建的session池, 用于看板结果与本地后端面板等大表的下载
+    protocol: ddb(默认, compress=True时LZ4压缩传输) / arrow(列式传输, 需服务端formatArrow插件与pyarrow>=13, 不支持压缩)
+    Arrow表转为pandas时按列分块(split_blocks)并释放Arrow内存(self_destruct), 无空值的数值列零拷贝
+    size个session惰性创建, fetchGroups将相互独立的查询组分配到各session并发执行
+    """
+    def __init__(self, sessionConfig: Dict, protocol: str = "ddb", compress: bool = False, size: int = 1):
+        protocol = (protocol or "ddb").lower()
+        if protocol not in PROTOCOLS:
+            raise ValueError(f"transferProtocol must be one of {list(PROTOCOLS)}, got {protocol}")
+        if protocol == "arrow" and compress:
+            raise ValueError("the arrow protocol does not support compression")
+        self.sessionConfig: Dict = dict(sessionConfig)
+        self.protocol: str = protocol
+        self.compress: bool = bool(compress)
+        self.size: int = max(int(size or 1), 1)
+        self._idle: List[ddb.session] = []
+        self._created: int = 0
+        self._cond = threading.Condition()  # 归还或丢弃session时唤醒等待者
+
+    def _connect(self) -> ddb.session:
+        session = ddb.session(**self.sessionConfig, compress=self.compress, protocol=PROTOCOLS[self.protocol])
+        if self.protocol == "arrow":
+            session.run('try{ loadPlugin("formatArrow") }catch(ex){}')    # 插件已加载时忽略
+        return session
+
+    @contextlib.contextmanager
+    def session(self):
+        """借用一个session(池未满时新建, 否则等待归还; 等待期间有session被丢弃时由等待者重建)"""
+        with self._cond:
+            while not self._idle and self._created >= self.size:
+                self._cond.wait()
+            if self._idle:
+                session, create = self._idle.pop(), False
+            else:
+                self._created += 1
+                session, create = None, True
+        if create:
+            try:
+                session = self._connect()
+            except BaseException:
+                self._discard(None)
+                raise
+        try:
+            yield session
+        except BaseException:   # session状态未知, 丢弃后按需重建
+            self._discard(session)
+            raise
+        with self._cond:
+            self._idle.append(session)
+            self._cond.notify()
+
+    def _discard(self, session: ddb.session) -> None:
+        """丢弃session并唤醒一个等待者(由其新建session)"""
+        with self._cond:
+            self._created -= 1
+            self._cond.notify()
+        if session is not None:
+            try:
+                session.close()
+            except Exception:
+                pass
+
+    @staticmethod
+    def toPandas(data):
+        """Arrow表 -> DataFrame(时间列转为ns精度, 与ddb协议一致), 其余结果原样返回"""
+        if type(data).__module__.startswith("pyarrow"):
+            return data.to_pandas(split_blocks=True, self_destruct=True, date_as_object=False,
+                                  coerce_temporal_nanoseconds=True)
+        return data
+
+    def run(self, session: ddb.session, script: str, names: List[str]) -> Dict[str, pd.DataFrame]:
+        """在session上执行script并取回其中的变量names(arrow协议逐表下载), 之后清空session变量"""
+        try:
+            if self.protocol == "arrow":
+                session.run(script)
+                return {name: self.toPandas(session.run(name)) for name in names}
+            return session.run(script + f"\ndict({names}, [{','.join(names)}])")
+        finally:
+            session.run("undef all;")
+
+    def fetchGroups(self, groups: List[Tuple[str, Dict[str, str]]]) -> Dict[str, pd.DataFrame]:
+        """
+        并发执行相互独立的查询组: groups为(script, 结果名 -> script中的变量名)的列表
+        每组在一个session上执行, 组内的表共用script中的中间结果
+        """
+        def fetch(script: str, names: Dict[str, str]) -> Dict[str, pd.DataFrame]:
+            with self.session() as session:
+                res = self.run(session, script, list(names.values()))
+            return {name: res[var] for name, var in names.items()}
+        resDict = {}
+        with ThreadPoolExecutor(max_workers=min(self.size, max(len(groups), 1))) as pool:
+            for res in pool.map(lambda g: fetch(*g), groups):
+                resDict.update(res)
+        return resDict
+
+    def close(self) -> None:
+        """关闭池中空闲的session"""
+        with self._cond:
+            idle, self._idle = self._idle, []
+            self._created -= len(idle)
+            self._cond.notify_all()
+        for session in idle:
+            session.close()
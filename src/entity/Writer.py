@@ -0,0 +1,92 @@
+import copy, queue, threading, time
+import pandas as pd
+import dolphindb as ddb
+from typing import Callable, Dict, List
+from src.entity.Eva import Eva
+
+class ResultWriter:
+    """
+    流式结果写入: 计算端每产生一段结果就put进有界队列, threadCount个写线程异步写库
+    队列满时put阻塞(背压), 内存中最多保留queueSize段结果; close时等待写完并汇报行数与吞吐
+    wide布局的结果表(atomic=CHUNK分区表)并发写入, 汇总表/版本表及long布局的维度表串行写入
+    sessionFactory为空时只有一个写线程, 与主线程共用session(计算期间主线程不使用session)
+    """
+    def __init__(self, evaObj: Eva, sessionFactory: Callable[[], ddb.session] = None,
+                 threadCount: int = 1, queueSize: int = 4):
+        self.evaObj: Eva = evaObj
+        self.sessionFactory: Callable[[], ddb.session] = sessionFactory
+        self.threadCount: int = max(int(threadCount or 1), 1) if sessionFactory is not None else 1
+        self.queue: queue.Queue = queue.Queue(maxsize=max(int(queueSize or 1), 1))
+        self.rows: int = 0
+        self.errors: List[Exception] = []
+        self._statsLock = threading.Lock()
+        self._startTime = time.time()
+        self._threads = [threading.Thread(target=self._run, daemon=True) for _ in range(self.threadCount)]
+        for thread in self._threads:
+            thread.start()
+
+    def _worker(self) -> Eva:
+        """写线程的评价对象(独立session)"""
+        if self.sessionFactory is None:
+            return self.evaObj
+        worker = copy.copy(self.evaObj)
+        worker.session = self.sessionFactory()
+        worker.data = None
+        worker.initDef()
+        return worker
+
+    def put(self, summary_res: pd.DataFrame, quantile_res: pd.DataFrame) -> None:
+        """提交一段结果, 队列已满时阻塞; 写线程出错时立即抛出"""
+        if self.errors:
+            raise self.errors[0]
+        if len(summary_res) == 0 and len(quantile_res) == 0:
+            return
+        self.queue.put((summary_res, quantile_res))
+
+    def _run(self) -> None:
+        worker = None
+        while True:
+            item = self.queue.get()
+            try:
+                if item is None:
+                    return
+                if self.errors:     # 出错后丢弃剩余结果, 由put/close抛出异常
+                    continue
+                if worker is None:
+                    worker = self._worker()
+                self._write(worker, *item)
+            except Exception as e:
+                self.errors.append(e)
+            finally:
+                self.queue.task_done()
+
+    def _write(self, worker: Eva, summary_res: pd.DataFrame, quantile_res: pd.DataFrame) -> None:
+        session = worker.session
+        factorList = summary_res["factor"].unique().tolist() if len(summary_res) > 0 else None
+        with worker.stage("insert", factorList=factorList, rowsIn=len(summary_res) + len(quantile_res), stream=True) as record:
+            if worker.metrics is not None:
+                record["bytes"] = worker.metrics.frameBytes(summary_res, quantile_res)
+            session.upload({"summary_res": summary_res, "quantile_res": quantile_res})
+            worker.insertUploaded()     # 维度表的写入与批量评价的其他session共用evaObj.tableLock
+            session.run("undef(`summary_res`quantile_res`replaced_)")
+        with self._statsLock:
+            self.rows += len(summary_res) + len(quantile_res)
+
+    def flush(self) -> None:
+        """等待已提交的结果全部写完(与写线程共用session时, 主线程使用session前调用)"""
+        self.queue.join()
+        if self.errors:
+            raise self.errors[0]
+
+    def close(self) -> Dict[str, float]:
+        """等待队列写完并停止写线程, 返回写入行数与吞吐"""
+        for _ in self._threads:
+            self.queue.put(None)
+        for thread in self._threads:
+            thread.join()
+        if self.errors:
+            raise self.errors[0]
+        seconds = max(time.time() - self._startTime, 1e-9)
+        stats = {"rows": self.rows, "seconds": seconds, "rowsPerSecond": self.rows / seconds}
+        print(f"ResultWriter: {self.rows} rows in {seconds:.1f}s ({stats['rowsPerSecond']:.0f} rows/s)")
+        return stats
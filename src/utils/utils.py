@@ -2,4 +2,22 @@ from typing import List
 
 def split_list(l: List, k: int = 5) -> List[List]:
     """将列表进行切片, 长度不满的直接输出, 最终输出嵌套列表"""
-    return [l[i:i + k] for i in range(0, len(l), k)]
\ No newline at end of file
+    return [l[i:i + k] for i in range(0, len(l), k)]
+
+def parse_bytes(size) -> int:
+    """将内存大小配置(如 8GB / 512MB / 字节数)转换为字节数"""
+    if size is None or isinstance(size, (int, float)):
+        return int(size) if size is not None else None
+    text = str(size).strip().upper().replace(" ", "")
+    units = {"TB": 1024 ** 4, "GB": 1024 ** 3, "MB": 1024 ** 2, "KB": 1024, "B": 1}
+    for unit, scale in units.items():
+        if text.endswith(unit):
+            return int(float(text[:-len(unit)]) * scale)
+    return int(float(text))
+
+def is_out_of_memory(e: BaseException) -> bool:
+    """判断异常是否为内存不足(本地MemoryError或DolphinDB服务端的Out of memory)"""
+    if isinstance(e, MemoryError):
+        return True
+    msg = str(e).lower()
+    return "out of memory" in msg or "memory limit" in msg or "oom" in msg.split()
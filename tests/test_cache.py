@@ -0,0 +1,52 @@
+import os
+import pandas as pd
+import pytest
+
+from src.entity.Cache import PanelCache, ResultCache
+
+
+def test_panel_cache_roundtrip_and_stamp(tmp_path):
+    cache = PanelCache(str(tmp_path))
+    data = pd.DataFrame({"symbol": ["A", "B"], "tradeDate": pd.to_datetime(["2024-01-02"] * 2), "value": [1.0, None]})
+    cache.save("dfs://factor", "tb", "f0", "key", {"rows": 2}, data)
+    pd.testing.assert_frame_equal(cache.load("dfs://factor", "tb", "f0", "key", {"rows": 2}), data)
+    assert cache.load("dfs://factor", "tb", "f0", "key", {"rows": 3}) is None
+    assert sorted(f for _, _, files in os.walk(tmp_path) for f in files) == ["key.json", "key.parquet"]
+
+
+def test_panel_cache_failed_write_keeps_previous(tmp_path, monkeypatch):
+    cache = PanelCache(str(tmp_path))
+    data = pd.DataFrame({"value": [1.0, 2.0]})
+    cache.save("db", "tb", "f0", "key", {"rows": 2}, data)
+
+    def broken(self, path, **kwargs):
+        with open(path, "wb") as f:
+            f.write(b"partial")
+        raise OSError("disk full")
+    monkeypatch.setattr(pd.DataFrame, "to_parquet", broken)
+    with pytest.raises(OSError):
+        cache.save("db", "tb", "f0", "key", {"rows": 3}, pd.DataFrame({"value": [3.0, 4.0, 5.0]}))
+    monkeypatch.undo()
+    pd.testing.assert_frame_equal(cache.load("db", "tb", "f0", "key", {"rows": 2}), data)
+
+
+def test_result_cache_key_includes_version_time_and_config():
+    key = lambda version, config=None: ResultCache.makeKey("dfs://eva", "reg", "f0", 5, version, config)
+    assert key([3, "2024-01-01T00:00:00"]) != key([3, "2024-02-01T00:00:00"])     # dropDB后版本号重新计数
+    assert key([3, "2024-01-01T00:00:00"], {"quantile": 5}) != key([3, "2024-01-01T00:00:00"], {"quantile": 10})
+    assert key([3, "t"], {"quantile": 5, "returnIntervals": [1, 5]}) == key([3, "t"], {"returnIntervals": [1, 5], "quantile": 5})
+
+
+def test_summary_version_key_has_no_sum_collisions():
+    pytest.importorskip("dolphindb")
+    pytest.importorskip("streamlit")
+    from src.entity.Result import Result
+    evaObj = Result(None)
+    versions = {"a": {"f0": (1, "t0"), "f1": (2, "t0")}, "b": {"f0": (2, "t0"), "f1": (1, "t0")}}
+    keys = {}
+    for name, v in versions.items():
+        evaObj.getResultVersion = lambda v=v: v
+        keys[name] = evaObj.resultVersionKey()
+    assert keys["a"] != keys["b"]
+    evaObj.getResultVersion = lambda: versions["a"]
+    assert evaObj.resultVersionKey("f1") == [2, "t0"] and evaObj.resultVersionKey("f9") == [0, None]
@@ -0,0 +1,80 @@
+import types
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip("dolphindb")
+pytest.importorskip("streamlit")
+from src.entity.Catalog import FactorCatalog
+
+
+def scanFrame(data: pd.DataFrame, scanDates: pd.Series = None) -> pd.DataFrame:
+    """FactorCatalog._scan的pandas实现"""
+    df = data
+    if scanDates is not None and len(scanDates) > 0:
+        bound = df["factor"].map(scanDates)
+        df = df[bound.isna() | (df["tradeDate"] >= bound)]
+    t = df.groupby(["factor", "tradeDate"]).agg(cnt=("value", "size"), nonNullCnt=("value", "count")).reset_index()
+    t = t.sort_values(["factor", "tradeDate"])
+    return t.groupby("factor").agg(firstDate=("tradeDate", "min"), lastDate=("tradeDate", "max"), rows=("cnt", "sum"),
+                                   nonNull=("nonNullCnt", "sum"), symbols=("cnt", "max"),
+                                   tailRows=("cnt", "last"), tailNonNull=("nonNullCnt", "last")).reset_index()
+
+
+def makeCatalog(state: dict) -> FactorCatalog:
+    session = types.SimpleNamespace(existsTable=lambda dbUrl, tableName: False)
+    evaObj = types.SimpleNamespace(session=session, resultDBName="dfs://result", resultTBName_Catalog="factorCatalog")
+    catalog = FactorCatalog(evaObj)
+    catalog._scan = lambda scanDates=None: scanFrame(state["data"], scanDates)
+    catalog._evaTime = lambda factorList: pd.Series(pd.NaT, index=pd.Index(factorList, name="factor"), dtype="datetime64[ns]")
+    catalog.save = lambda: None
+    return catalog
+
+
+def rows(factor: str, dates: pd.DatetimeIndex, symbols: int, rng) -> pd.DataFrame:
+    df = pd.DataFrame([(factor, d, s) for d in dates for s in range(symbols)], columns=["factor", "tradeDate", "symbol"])
+    value = rng.normal(size=len(df))
+    value[rng.random(len(df)) < 0.2] = np.nan
+    return df.assign(value=value)
+
+
+def test_incremental_refresh_matches_full():
+    rng = np.random.default_rng(0)
+    dates = pd.date_range("2024-01-01", periods=8, freq="D")
+    state = {"data": pd.concat([rows("A", dates[:5], 4, rng), rows("B", dates[:3], 3, rng),
+                                rows("A", dates[4:5], 2, rng).assign(symbol=lambda d: d["symbol"] + 10)], ignore_index=True)}
+    catalog = makeCatalog(state)
+    catalog.refresh()
+    # A的边界日补全、B(落后于A)追加新日期及边界日数据、新增因子C
+    state["data"] = pd.concat([state["data"],
+                               rows("A", dates[4:5], 3, rng).assign(symbol=lambda d: d["symbol"] + 20),
+                               rows("A", dates[5:7], 4, rng),
+                               rows("B", dates[2:3], 2, rng).assign(symbol=lambda d: d["symbol"] + 10),
+                               rows("B", dates[3:6], 3, rng),
+                               rows("C", dates[1:4], 5, rng)], ignore_index=True)
+    incremental = catalog.refresh()
+    full = makeCatalog(state).refresh(full=True)
+    cols = ["firstDate", "lastDate", "rows", "nonNull", "symbols", "tailRows", "tailNonNull"]
+    pd.testing.assert_frame_equal(incremental[cols].sort_index(), full[cols].sort_index(), check_dtype=False)
+    assert incremental.loc["B", "rows"] == 3 * 6 + 2
+
+
+def test_pending_per_interval_watermark():
+    dates = pd.bdate_range("2024-01-01", periods=20)
+    last = dates[-1]
+    marks = {"A": {1: dates[19], 5: dates[15]},   # 长周期的水位线天然落后, 没有新数据
+             "B": {1: dates[18], 5: dates[15]},   # returnInterval=1有新数据
+             "C": {1: dates[19], 5: dates[14]},   # returnInterval=5有新的调仓周期
+             "D": {1: dates[19]}}                 # returnInterval=5尚未评价
+    watermark = pd.DataFrame([(f, h, t, t) for f, m in marks.items() for h, t in m.items()],
+                             columns=["factor", "returnInterval", "regTime", "quaTime"])
+    session = types.SimpleNamespace(existsTable=lambda dbUrl, tableName: False)
+    evaObj = types.SimpleNamespace(session=session, resultDBName="dfs://result", resultTBName_Catalog="factorCatalog",
+                                   returnIntervals=[1, 5], startDate=dates[0], endDate=last,
+                                   barRetLabelName="ret", futRetLabelNames=["ret1", "ret5"],
+                                   getWatermark=lambda factorList: watermark[watermark["factor"].isin(factorList)],
+                                   getTradeDates=lambda startDate, endDate, labelList=None: dates)
+    catalog = FactorCatalog(evaObj)
+    catalog.index = pd.DataFrame({"lastDate": [last] * 5}, index=pd.Index(["A", "B", "C", "D", "E"], name="factor"))
+    assert catalog.pending(["A", "B", "C", "D", "E"]) == ["B", "C", "D", "E"]
+    assert catalog._evaTime(["A", "E"]).tolist()[0] == dates[15]
@@ -0,0 +1,33 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip("dolphindb")
+from src.entity.Correlation import FactorCorrelation
+
+
+def test_block_corr_matches_pandas():
+    rng = np.random.default_rng(0)
+    T, N = 9, 15
+    base = rng.normal(size=(T, N, 1))
+    XA = base + rng.normal(size=(T, N, 3)) * 0.5
+    XB = base + rng.normal(size=(T, N, 2))
+    XA[rng.random(XA.shape) < 0.3] = np.nan
+    XB[rng.random(XB.shape) < 0.3] = np.nan
+    XB[4, :, 1] = 1.0   # 常数截面不计入
+    corrObj = FactorCorrelation.__new__(FactorCorrelation)
+    corrObj.minObs, corrObj.dateChunk = 5, 4
+    sumCorr, cnt = corrObj._blockCorr(XA, XB)
+    expectedSum, expectedCnt = np.zeros(sumCorr.shape), np.zeros(cnt.shape, dtype=int)
+    for t in range(T):
+        for i in range(XA.shape[2]):
+            for j in range(XB.shape[2]):
+                x, y = pd.Series(XA[t, :, i]), pd.Series(XB[t, :, j])
+                paired = x.notna() & y.notna()
+                with np.errstate(invalid="ignore", divide="ignore"):
+                    corr = x[paired].corr(y[paired])
+                if paired.sum() >= corrObj.minObs and np.isfinite(corr):
+                    expectedSum[i, j] += corr
+                    expectedCnt[i, j] += 1
+    np.testing.assert_array_equal(cnt, expectedCnt)
+    np.testing.assert_allclose(sumCorr, expectedSum, rtol=1e-10, atol=1e-12)
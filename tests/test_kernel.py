@@ -0,0 +1,81 @@
+import numpy as np
+import pandas as pd
+
+from src.backend.kernel import REG_INDICATORS, icDecay, quantileBuckets, quantileTurnover, rankAutoCorr, rollingRegStatsMulti
+
+
+def makePanel(T: int = 30, N: int = 25, F: int = 3, nanRatio: float = 0.15, seed: int = 0):
+    """(时间, 标的, 因子)的因子面板(含空值与并列值)及rowMask"""
+    rng = np.random.default_rng(seed)
+    XA = np.round(rng.normal(size=(T, N, F)), 1)
+    XA[rng.random(XA.shape) < nanRatio] = np.nan
+    rowMask = rng.random((T, N)) > 0.05
+    return XA, rowMask
+
+
+def test_quantile_turnover_matches_pandas():
+    XA, rowMask = makePanel()
+    quantiles = 5
+    rebalancePeriods, buckets = quantileBuckets(XA, rowMask, interval=3, quantiles=quantiles)
+    res = quantileTurnover(buckets, quantiles)
+    assert np.isnan(res[0]).all()
+    for i in range(1, len(rebalancePeriods)):
+        for f in range(XA.shape[2]):
+            cur, prev = pd.Series(buckets[i, :, f]), pd.Series(buckets[i - 1, :, f])
+            for k, q in enumerate([quantiles, 1]):
+                members = set(cur.index[cur == q])
+                expected = 1 - len(members & set(prev.index[prev == q])) / len(members) if members else np.nan
+                np.testing.assert_allclose(res[i, f, k], expected, equal_nan=True)
+
+
+def test_rank_autocorr_matches_pandas():
+    XA, rowMask = makePanel(seed=1)
+    rebalancePeriods = np.arange(2, XA.shape[0] + 1, 2)
+    res = rankAutoCorr(XA, rowMask, rebalancePeriods)
+    assert np.isnan(res[0]).all()
+    for i in range(1, len(rebalancePeriods)):
+        cur, prev = rebalancePeriods[i] - 1, rebalancePeriods[i - 1] - 1
+        for f in range(XA.shape[2]):
+            a = pd.Series(np.where(rowMask[cur], XA[cur, :, f], np.nan))
+            b = pd.Series(np.where(rowMask[prev], XA[prev, :, f], np.nan))
+            np.testing.assert_allclose(res[i, f], a.corr(b, method="spearman"), rtol=1e-10, equal_nan=True)
+
+
+def test_ic_decay_matches_pandas():
+    XA, rowMask = makePanel(T=20, N=12, F=2, seed=2)
+    rng = np.random.default_rng(3)
+    barRet = rng.normal(0, 0.02, XA.shape[:2])
+    barRet[rng.random(barRet.shape) < 0.1] = np.nan
+    horizons = [1, 3]
+    IC, RankIC = icDecay(XA, barRet, rowMask, horizons, dateChunk=7)
+    ret = pd.DataFrame(np.where(rowMask, barRet, np.nan))
+    for h, horizon in enumerate(horizons):
+        fwd = (1 + ret).rolling(horizon).apply(np.prod, raw=True).shift(-(horizon - 1)) - 1     # t起持有horizon根bar
+        for t in range(XA.shape[0]):
+            for f in range(XA.shape[2]):
+                x = pd.Series(np.where(rowMask[t], XA[t, :, f], np.nan))
+                y = fwd.iloc[t]
+                paired = x.notna() & y.notna()
+                expected = (x[paired].corr(y[paired]), x[paired].corr(y[paired], method="spearman")) if paired.sum() >= 3 else (np.nan, np.nan)
+                np.testing.assert_allclose(IC[h, t, f], expected[0], rtol=1e-8, atol=1e-12, equal_nan=True)
+                np.testing.assert_allclose(RankIC[h, t, f], expected[1], rtol=1e-8, atol=1e-12, equal_nan=True)
+
+
+def test_rolling_rank_ic_matches_pandas():
+    XA, rowMask = makePanel(T=24, N=10, F=3, seed=4)
+    rowMask[6:8] = False    # 没有样本的period
+    rng = np.random.default_rng(5)
+    Ys = [np.round(rng.normal(size=XA.shape[:2]), 1) for _ in range(2)]
+    Ys[0][rng.random(XA.shape[:2]) < 0.2] = np.nan
+    periodBounds, callBackPeriod = np.arange(0, XA.shape[0] + 1, 2), 3
+    stats, valid = rollingRegStatsMulti(XA, Ys, rowMask, periodBounds, callBackPeriod)
+    ric = REG_INDICATORS.index("RankIC")
+    for p in range(len(periodBounds) - 1):
+        start, end = periodBounds[max(p + 1 - callBackPeriod, 0)], periodBounds[p + 1]     # 窗口内全部样本的整体秩
+        mask = rowMask[start:end]
+        for k, Y in enumerate(Ys):
+            y = pd.Series(Y[start:end][mask])
+            for f in range(XA.shape[2]):
+                if valid[k, p, f]:
+                    x = pd.Series(XA[start:end, :, f][mask])
+                    np.testing.assert_allclose(stats[k, ric, p, f], x.corr(y, method="spearman"), rtol=1e-10)
@@ -0,0 +1,79 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.entity.Manifest import RunManifest
+
+
+def test_manifest_resume_per_chunk(tmp_path):
+    path = str(tmp_path / "manifest.jsonl")
+    chunks = [{"startDate": pd.Timestamp("2024-01-01"), "endDate": pd.Timestamp("2024-02-01")},
+              {"startDate": pd.Timestamp("2024-02-01"), "endDate": pd.Timestamp("2024-03-01")}]
+    manifest = RunManifest(path, config={"quantile": 5})
+    manifest.done(["f0", "f1"], chunks[0], (10, 5))
+    manifest.done(["f0"], chunks[1])
+    with open(path, "a", encoding="utf-8") as f:
+        f.write('{"runId": "broken')     # 中断时写了一半的末行
+
+    resumed = RunManifest(path, config={"quantile": 5}, resume=True)
+    assert resumed.runId == manifest.runId
+    assert resumed.pending(["f0", "f1", "f2"], chunks[0]) == ["f2"]
+    assert resumed.pending(["f0", "f1", "f2"], chunks[1]) == ["f1", "f2"]
+    assert resumed.pending(["f0"]) == ["f0"]
+    other = RunManifest(path, config={"quantile": 10}, resume=True)     # 配置改变后不沿用
+    assert other.runId != manifest.runId and other.pending(["f0"], chunks[0]) == ["f0"]
+    records = RunManifest.load(path)
+    assert records[records["stage"] == "run"]["resumed"].tolist() == [False, True, False]
+
+
+def test_runner_resume_across_chunks(tmp_path):
+    pytest.importorskip("dolphindb")
+    pytest.importorskip("streamlit")
+    from src.bench.Benchmark import makePanel, benchConfig
+    from src.FactorEva import FactorEva
+    from src.entity.Runner import BatchRunner
+
+    panel = makePanel(nSymbols=12, nDates=70, nFactors=3, returnIntervals=[1, 3], seed=1)
+    factors = ["factor0", "factor1", "factor2"]
+    failMonth = {"value": None}
+
+    class LocalEva(FactorEva):
+        def getTradeDates(self, startDate, endDate, labelList=None):
+            t = pd.DatetimeIndex(np.unique(panel["tradeDate"]))
+            return t[(t >= pd.Timestamp(startDate).normalize()) & (t <= pd.Timestamp(endDate).normalize())]
+
+        def getData(self, startDate=None, endDate=None, symbolList=None, labelList=None, factorList=None):
+            if failMonth["value"] is not None and pd.Timestamp(startDate).month == failMonth["value"]:
+                raise ValueError("source unavailable")
+            t = panel["tradeDate"]
+            self.data = panel[(t >= pd.Timestamp(startDate).normalize()) & (t <= pd.Timestamp(endDate).normalize())].reset_index(drop=True)
+
+    cfg = benchConfig("daily", [1, 3])
+    cfg.update(shardFreq="M", endDate="20991231", manifestPath=str(tmp_path / "manifest.jsonl"))
+
+    def run(resume: bool, config: dict):
+        evaObj = LocalEva(None)
+        evaObj.setConfig(config)
+        out = []
+        runner = BatchRunner(evaObj, manifest=evaObj.runManifest(resume=resume))
+        runner.write = lambda s, q: out.append((s, q))
+        try:
+            runner.run([factors[:2], factors[2:]])
+        except RuntimeError:
+            pass
+        return out
+
+    def combine(out):
+        s = pd.concat([o[0] for o in out]).sort_values(["factor", "returnInterval", "period", "indicator"]).reset_index(drop=True)
+        q = pd.concat([o[1] for o in out]).sort_values(["factor", "returnInterval", "period"]).reset_index(drop=True)
+        return s, q
+
+    expected = combine(run(False, dict(cfg, manifestPath=None)))
+    failMonth["value"] = 2
+    first = run(False, cfg)
+    failMonth["value"] = None
+    second = run(True, cfg)
+    assert first and second
+    for a, b in zip(expected, combine(first + second)):   # 续跑只补齐失败的块, 结果与不中断时一致且不重复
+        pd.testing.assert_frame_equal(a, b, check_dtype=False)
+    assert run(True, cfg) == []
@@ -0,0 +1,33 @@
+import types
+import pandas as pd
+import pytest
+
+pytest.importorskip("dolphindb")
+pytest.importorskip("streamlit")
+from src.entity.Planner import BatchPlanner
+
+
+def makeEvaObj(factorList, factorRows: int = 1000, panelRows: int = 1000):
+    stats = {"label": pd.DataFrame({"indicator": ["barRet", "ret1D"], "rows": [panelRows] * 2}),
+             "factor": pd.DataFrame({"indicator": factorList, "rows": [factorRows] * len(factorList)})}
+    return types.SimpleNamespace(barRetLabelName="barRet", futRetLabelNames=["ret1D"], returnIntervals=[1], quantile=5,
+                                 startDate=pd.Timestamp("2024-01-01"), endDate=pd.Timestamp("2024-12-31"),
+                                 getSourceStats=lambda kind, names, startDate, endDate: stats[kind],
+                                 getTradeDates=lambda startDate, endDate, labelList=None: pd.bdate_range(startDate, periods=10))
+
+
+def test_memory_budget_batches_are_not_capped_by_default():
+    factorList = [f"f{i}" for i in range(40)]
+    evaObj = makeEvaObj(factorList)
+    planner = BatchPlanner(memoryBudget=10 * 1024 ** 2, memoryCopies=1)
+    assert planner.maxBatchSize is None
+    assert [len(b) for b in planner.plan(evaObj, factorList)] == [40]
+    assert planner.split(factorList) == [factorList]
+    assert planner.shrink(40) == 20
+
+
+def test_explicit_max_batch_size_and_fixed_batches():
+    factorList = [f"f{i}" for i in range(25)]
+    evaObj = makeEvaObj(factorList)
+    assert [len(b) for b in BatchPlanner(memoryBudget=10 * 1024 ** 2, maxBatchSize=8).plan(evaObj, factorList)] == [8, 8, 8, 1]
+    assert [len(b) for b in BatchPlanner().plan(evaObj, factorList)] == [10, 10, 5]
@@ -0,0 +1,46 @@
+import copy
+import threading
+import time
+import pytest
+
+pytest.importorskip("dolphindb")
+pytest.importorskip("streamlit")
+from src.entity.Result import Result
+
+
+class RecordingSession:
+    """记录各脚本执行时是否持有写锁以及同时执行的维度表写入数"""
+    def __init__(self, state: dict, lock: threading.Lock):
+        self.state, self.lock = state, lock
+
+    def run(self, script: str):
+        dimension = "UpdateAgg" in script
+        with self.state["guard"]:
+            self.state["locked"].append((dimension, self.lock.locked()))
+            if dimension:
+                self.state["active"] += 1
+                self.state["maxActive"] = max(self.state["maxActive"], self.state["active"])
+        time.sleep(0.02)
+        if dimension:
+            with self.state["guard"]:
+                self.state["active"] -= 1
+
+
+@pytest.mark.parametrize("layout", ["long", "wide"])
+def test_insert_uploaded_serializes_dimension_writes(layout):
+    evaObj = Result(None)
+    evaObj.resultLayout = layout
+    state = {"guard": threading.Lock(), "locked": [], "active": 0, "maxActive": 0}
+    workers = []
+    for _ in range(4):     # BatchRunner的各session worker
+        worker = copy.copy(evaObj)
+        worker.session = RecordingSession(state, evaObj.tableLock)
+        workers.append(worker)
+    assert all(w.tableLock is evaObj.tableLock for w in workers)
+    threads = [threading.Thread(target=w.insertUploaded) for w in workers]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert state["maxActive"] == 1
+    assert all(locked for dimension, locked in state["locked"] if dimension)
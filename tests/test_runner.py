@@ -0,0 +1,119 @@
+import threading
+import time
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip("dolphindb")
+pytest.importorskip("streamlit")
+import src.entity.Runner as RunnerModule
+from src.bench.Benchmark import makePanel, benchConfig
+from src.FactorEva import FactorEva
+from src.entity.Runner import BatchRunner
+
+panel = makePanel(nSymbols=10, nDates=60, nFactors=4, returnIntervals=[1, 3], seed=2)
+factors = ["factor0", "factor1", "factor2", "factor3"]
+
+
+class LocalEva(FactorEva):
+    def getTradeDates(self, startDate, endDate, labelList=None):
+        t = pd.DatetimeIndex(np.unique(panel["tradeDate"]))
+        return t[(t >= pd.Timestamp(startDate).normalize()) & (t <= pd.Timestamp(endDate).normalize())]
+
+    def getData(self, startDate=None, endDate=None, symbolList=None, labelList=None, factorList=None):
+        t = panel["tradeDate"]
+        mask = (t >= pd.Timestamp(startDate).normalize()) & (t <= pd.Timestamp(endDate).normalize())
+        self.data = panel.loc[mask, ["symbol", "tradeDate"] + labelList + factorList].reset_index(drop=True)
+
+
+class FakeSession:
+    """记录上传的结果并统计同时执行的维度表写入数"""
+    def __init__(self, state: dict):
+        self.state = state
+        self.uploaded = {}
+
+    def upload(self, data: dict):
+        self.uploaded.update(data)
+
+    def run(self, script: str):
+        if "data=summary_res, replaced=replaced_" not in script:    # 仅统计维度表写入
+            return None
+        with self.state["guard"]:
+            self.state["active"] += 1
+            self.state["maxActive"] = max(self.state["maxActive"], self.state["active"])
+            self.state["written"].append(self.uploaded["summary_res"])
+        time.sleep(0.01)
+        with self.state["guard"]:
+            self.state["active"] -= 1
+
+    def close(self):
+        pass
+
+
+class FakeBar:
+    instances = []
+
+    def __init__(self, total=None, **kwargs):
+        self.total, self.n = total, 0
+        FakeBar.instances.append(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    def update(self, n=1):
+        self.n += n
+
+
+def sortResult(df: pd.DataFrame) -> pd.DataFrame:
+    return df.sort_values(["factor", "returnInterval", "period", "indicator"]).reset_index(drop=True)
+
+
+def test_pipeline_with_session_factory(monkeypatch):
+    monkeypatch.setattr(RunnerModule.tqdm, "tqdm", FakeBar)
+    cfg = benchConfig("daily", [1, 3])
+    cfg.update(shardFreq="M", endDate="20991231")
+    batches = [factors[:2], factors[2:]]
+
+    evaObj = LocalEva(None)
+    evaObj.setConfig(cfg)
+    expected = []
+    syncRunner = BatchRunner(evaObj)
+    syncRunner.write = lambda s, q: expected.append(s)
+    syncRunner.run(batches)
+
+    state = {"guard": threading.Lock(), "active": 0, "maxActive": 0, "written": []}
+    evaObj = LocalEva(None)
+    evaObj.setConfig(cfg)
+    runner = BatchRunner(evaObj, sessionFactory=lambda: FakeSession(state), concurrency=3)
+    runner.run(batches)
+    assert len(runner.chunks) >= 2 and not runner.failures
+    assert len(state["written"]) == len(batches) * len(runner.chunks)
+    assert state["maxActive"] == 1     # 各session的维度表写入串行
+    pd.testing.assert_frame_equal(sortResult(pd.concat(expected)), sortResult(pd.concat(state["written"])), check_dtype=False)
+    bar = FakeBar.instances[-1]
+    assert bar.n == bar.total == len(factors) * len(runner.chunks)
+
+
+class PanelEva(LocalEva):
+    """取数写入panelDir下的内存映射面板(同Source._getData)"""
+    def getData(self, startDate=None, endDate=None, symbolList=None, labelList=None, factorList=None):
+        self.releaseData()
+        super().getData(startDate, endDate, symbolList, labelList, factorList)
+        self.data = self.toDensePanel(self.data)
+
+
+def test_panel_dirs_released(tmp_path):
+    cfg = benchConfig("daily", [1, 3])
+    cfg.update(shardFreq="M", endDate="20991231", panelDir=str(tmp_path))
+    evaObj = PanelEva(None)
+    evaObj.setConfig(cfg)
+    written = []
+    runner = BatchRunner(evaObj, sessionFactory=lambda: FakeSession({"guard": threading.Lock(), "active": 0,
+                                                                       "maxActive": 0, "written": written}),
+                         concurrency=2)
+    runner.run([factors[:2], factors[2:]])
+    assert len(written) == 2 * len(runner.chunks) and not runner.failures
+    assert list(tmp_path.iterdir()) == []     # 各批次(块)的内存映射目录在计算完成后删除
@@ -0,0 +1,49 @@
+import threading
+import pytest
+
+pytest.importorskip("dolphindb")
+from src.entity.Transfer import DataTransfer
+
+
+class FakeSession:
+    def __init__(self):
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+def makeTransfer(size: int) -> DataTransfer:
+    transfer = DataTransfer({}, size=size)
+    transfer._connect = FakeSession
+    return transfer
+
+
+def test_waiter_recreates_after_discard():
+    transfer = makeTransfer(size=1)
+    borrowed, got = threading.Event(), []
+
+    def waiter():
+        with transfer.session() as session:
+            got.append(session)
+    with pytest.raises(RuntimeError):
+        with transfer.session() as first:
+            thread = threading.Thread(target=waiter, daemon=True)
+            thread.start()
+            borrowed.wait(0.1)      # 等待者阻塞在池满
+            raise RuntimeError("query failed")
+    thread.join(5)
+    assert not thread.is_alive()
+    assert first.closed and got and got[0] is not first and not got[0].closed
+    assert transfer._created == 1 and transfer._idle == [got[0]]
+
+
+def test_pool_reuses_and_close():
+    transfer = makeTransfer(size=2)
+    with transfer.session() as a:
+        pass
+    with transfer.session() as b:
+        pass
+    assert a is b and transfer._created == 1
+    transfer.close()
+    assert a.closed and transfer._created == 0 and transfer._idle == []